@@ -0,0 +1,46 @@
+"""add cycle_user_stats table and cycle_logs (cycle_user_id, start_date) index
+
+Revision ID: 20261018_cycle_stats
+Revises: 20260215_pnd_notif
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_cycle_stats'
+down_revision = '20260215_pnd_notif'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    # Databases where scripts/add_cycle_user_stats.py already ran have both
+    if not inspector.has_table('cycle_user_stats'):
+        op.create_table('cycle_user_stats',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('cycle_user_id', sa.Integer(), nullable=False),
+            sa.Column('total_cycles', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('last_start_date', sa.Date(), nullable=True),
+            sa.Column('cycle_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('cycle_sum', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('cycle_sum_sq', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('cycle_histogram', sa.JSON(), nullable=False, server_default='{}'),
+            sa.Column('period_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('period_sum', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('period_sum_sq', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['cycle_user_id'], ['cycle_users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_cycle_user_stats_id'), 'cycle_user_stats', ['id'], unique=False)
+        op.create_index(op.f('ix_cycle_user_stats_cycle_user_id'), 'cycle_user_stats', ['cycle_user_id'], unique=True)
+    if 'ix_cycle_logs_cycle_user_id_start_date' not in {ix['name'] for ix in inspector.get_indexes('cycle_logs')}:
+        op.create_index('ix_cycle_logs_cycle_user_id_start_date', 'cycle_logs', ['cycle_user_id', 'start_date'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_cycle_logs_cycle_user_id_start_date', table_name='cycle_logs')
+    op.drop_index(op.f('ix_cycle_user_stats_cycle_user_id'), table_name='cycle_user_stats')
+    op.drop_index(op.f('ix_cycle_user_stats_id'), table_name='cycle_user_stats')
+    op.drop_table('cycle_user_stats')
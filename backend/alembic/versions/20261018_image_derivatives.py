@@ -0,0 +1,46 @@
+"""add image_derivatives table
+
+Revision ID: 20261018_img_derivs
+Revises: 20261018_cycle_stats
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_img_derivs'
+down_revision = '20261018_cycle_stats'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Databases where scripts/add_image_derivatives.py already created it
+    if sa.inspect(op.get_bind()).has_table('image_derivatives'):
+        return
+    op.create_table('image_derivatives',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('doctor_id', sa.Integer(), nullable=True),
+        sa.Column('source_url', sa.String(), nullable=False),
+        sa.Column('crop_key', sa.String(), nullable=False, server_default=''),
+        sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('variants', sa.JSON(), nullable=True),
+        sa.Column('placeholder', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_url', 'crop_key', name='uq_image_derivatives_source_crop')
+    )
+    op.create_index(op.f('ix_image_derivatives_id'), 'image_derivatives', ['id'], unique=False)
+    op.create_index(op.f('ix_image_derivatives_doctor_id'), 'image_derivatives', ['doctor_id'], unique=False)
+    op.create_index(op.f('ix_image_derivatives_source_url'), 'image_derivatives', ['source_url'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_image_derivatives_source_url'), table_name='image_derivatives')
+    op.drop_index(op.f('ix_image_derivatives_doctor_id'), table_name='image_derivatives')
+    op.drop_index(op.f('ix_image_derivatives_id'), table_name='image_derivatives')
+    op.drop_table('image_derivatives')
@@ -0,0 +1,44 @@
+"""image_derivatives.doctor_id: SET NULL instead of CASCADE
+
+Revision ID: 20261018_img_deriv_fk
+Revises: 20261018_media_blobs
+Create Date: 2026-10-18 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_img_deriv_fk'
+down_revision = '20261018_media_blobs'
+branch_labels = None
+depends_on = None
+
+
+def _doctor_fk():
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys('image_derivatives'):
+        if fk['constrained_columns'] == ['doctor_id']:
+            return fk
+    return None
+
+
+def _replace_doctor_fk(ondelete: str):
+    fk = _doctor_fk()
+    if fk is not None and (fk.get('options') or {}).get('ondelete', '').upper() == ondelete:
+        return
+    with op.batch_alter_table('image_derivatives') as batch_op:
+        if fk is not None:
+            batch_op.drop_constraint(fk['name'], type_='foreignkey')
+        batch_op.create_foreign_key(
+            'image_derivatives_doctor_id_fkey', 'doctors', ['doctor_id'], ['id'], ondelete=ondelete
+        )
+
+
+def upgrade() -> None:
+    # Rows are shared across tenants (content-addressed blobs): deleting a
+    # doctor must not delete variants other doctors still serve
+    _replace_doctor_fk('SET NULL')
+
+
+def downgrade() -> None:
+    _replace_doctor_fk('CASCADE')
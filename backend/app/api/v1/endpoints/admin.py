@@ -21,6 +21,9 @@ from app.schemas.admin import (
 )
 
 from app.api.v1.endpoints.auth import get_current_admin_user
+from app.core.module_cache import module_cache_stats
+from app.core.preconsultation_templates import template_cache_stats
+from app.db.pool import pool_stats
 from app.db.models.doctor import Doctor
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -339,4 +342,34 @@ def delete_existing_module(
     success = delete_module(db, module_id=module_id)
     if not success:
         raise HTTPException(status_code=404, detail="Module not found")
-    return {"message": "Module deleted successfully"}
\ No newline at end of file
+    return {"message": "Module deleted successfully"}
+
+
+@router.get("/cache/modules")
+def read_module_cache_stats(
+    current_admin: Doctor = Depends(get_current_admin_user)
+):
+    """
+    Hit/miss counters of this process's tenant module entitlement cache.
+    """
+    return module_cache_stats()
+
+
+@router.get("/cache/preconsultation-templates")
+def read_preconsultation_template_cache_stats(
+    current_admin: Doctor = Depends(get_current_admin_user)
+):
+    """
+    Hit/miss counters of this process's compiled preconsultation template cache.
+    """
+    return template_cache_stats()
+
+
+@router.get("/db/pool")
+def read_db_pool_stats(
+    current_admin: Doctor = Depends(get_current_admin_user)
+):
+    """
+    Connection pool metrics of this API process (checkout waits, timeouts, overflow).
+    """
+    return pool_stats()
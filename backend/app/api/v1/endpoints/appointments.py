@@ -2,14 +2,16 @@
 Appointment endpoints for managing appointments.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Annotated, List
 
-from app.db.base import get_db
+from app.db.base import get_async_db, get_db
 from app.db.models.doctor import Doctor
 from app.db.models.appointment import Appointment
 from app.schemas.appointment import AppointmentCreate, AppointmentInDB, AppointmentUpdate
-from app.api.v1.endpoints.auth import get_current_user
+from app.api.v1.endpoints.auth import get_current_user, get_current_user_async
 from app.tasks.email_tasks import send_appointment_notification_email, send_appointment_status_update, send_preconsulta_completed_notification
 from app.services.summary_generator import ClinicalSummaryGenerator
 import json
@@ -20,14 +22,14 @@ router = APIRouter()
 @router.post("/public", response_model=AppointmentInDB, status_code=status.HTTP_201_CREATED)
 async def create_public_appointment(
     appointment_data: AppointmentCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new appointment (public endpoint for patients).
     Patients can create appointments without authentication.
     """
     # Verify that the doctor exists
-    doctor = db.query(Doctor).filter(Doctor.id == appointment_data.doctor_id).first()
+    doctor = await db.get(Doctor, appointment_data.doctor_id)
     if not doctor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -42,8 +44,8 @@ async def create_public_appointment(
     
     db_appointment = Appointment(**appointment_data.model_dump())
     db.add(db_appointment)
-    db.commit()
-    db.refresh(db_appointment)
+    await db.commit()
+    await db.refresh(db_appointment)
     
     # Send notification email to doctor
     try:
@@ -92,15 +94,15 @@ async def create_appointment(
 
 @router.get("/", response_model=List[AppointmentInDB])
 async def get_appointments(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get all appointments for the current doctor.
     """
-    appointments = db.query(Appointment).filter(
-        Appointment.doctor_id == current_user.id
-    ).all()
+    appointments = (await db.execute(
+        select(Appointment).where(Appointment.doctor_id == current_user.id)
+    )).scalars().all()
     
     return appointments
 
@@ -275,10 +277,10 @@ async def submit_preconsulta(
             try:
                 # ADAPTING DATA FOR GENERATOR
                 formatted_answers = []
-                # fetch questions to map keys to text
-                from app.crud import preconsultation as crud_preconsulta
-                all_questions = crud_preconsulta.get_questions(db, doctor_id=appointment.doctor_id, limit=200)
-                q_map = {str(q.id): q for q in all_questions}
+                # questions, id map and narrative summarizer of the doctor's current template
+                from app.core.preconsultation_templates import get_compiled_template
+                template = get_compiled_template(db, appointment.doctor_id)
+                q_map = template.questions_by_id
                 
                 readable_map = {}
                 formatted_answers = []
@@ -289,7 +291,7 @@ async def submit_preconsulta(
                     q_text = ""
                     qid = key
                     if key in q_map:
-                        q_text = q_map[key].text
+                        q_text = q_map[key]["text"]
                         # Build readable map (Snapshotted text)
                         if q_text:
                             readable_map[q_text] = val
@@ -302,18 +304,10 @@ async def submit_preconsulta(
                     })
 
                 # Pass template_data to enable Narrative Generator
-                template_data = []
-                for q in all_questions:
-                    template_data.append({
-                        "id": q.id,
-                        "text": q.text,
-                        "type": q.type,
-                        "category": q.category,
-                        "options": q.options,
-                        "order": q.order
-                    })
-
-                summary_data = ClinicalSummaryGenerator.generate(appointment, formatted_answers, template_data=template_data)
+                summary_data = ClinicalSummaryGenerator.generate(
+                    appointment, formatted_answers,
+                    template_data=template.template_data, summarizer=template.summarizer
+                )
                 summary_html = summary_data.get('full_narrative_html')
 
                 # SAVE GENERATED SUMMARIES TO ANSWERS JSON
@@ -3,14 +3,17 @@ Authentication endpoints for login, registration, and OAuth.
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import Annotated, Union
 import re
 import unicodedata
 import uuid
 from pydantic import BaseModel
 
-from app.db.base import get_db
+from app.db.base import get_async_db, get_db
 from app.db.models.doctor import Doctor
 from app.schemas.doctor import DoctorCreate, DoctorInDB
 import secrets
@@ -59,13 +62,23 @@ def get_user_by_slug(db: Session, slug: str) -> Doctor | None:
     return db.query(Doctor).filter(Doctor.slug_url == slug).first()
 
 
+async def get_user_by_email_async(db: AsyncSession, email: str) -> Doctor | None:
+    """Get a doctor by email (async session)."""
+    return (await db.execute(select(Doctor).where(Doctor.email == email).limit(1))).scalar_one_or_none()
+
+
+async def get_user_by_slug_async(db: AsyncSession, slug: str) -> Doctor | None:
+    """Get a doctor by slug (async session)."""
+    return (await db.execute(select(Doctor).where(Doctor.slug_url == slug).limit(1))).scalar_one_or_none()
+
+
 
 
 
 @router.post("/register", response_model=DoctorInDB, status_code=status.HTTP_201_CREATED)
 async def register(
     doctor_data: DoctorCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Register a new doctor account.
@@ -74,7 +87,7 @@ async def register(
     Generates a unique slug_url from the doctor's name.
     """
     # Check if email already exists
-    existing_doctor = get_user_by_email(db, doctor_data.email)
+    existing_doctor = await get_user_by_email_async(db, doctor_data.email)
     if existing_doctor:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -85,17 +98,17 @@ async def register(
     slug = doctor_data.slug_url or generate_slug_from_name(doctor_data.nombre_completo)
     
     # Check if slug already exists
-    existing_slug = get_user_by_slug(db, slug)
+    existing_slug = await get_user_by_slug_async(db, slug)
     if existing_slug:
         # Append a number if slug exists
         counter = 1
         original_slug = slug
-        while get_user_by_slug(db, slug):
+        while await get_user_by_slug_async(db, slug):
             slug = f"{original_slug}-{counter}"
             counter += 1
     
-    # Create new doctor
-    hashed_password = hash_password(doctor_data.password)
+    # Create new doctor (bcrypt is CPU-bound: keep it off the event loop)
+    hashed_password = await run_in_threadpool(hash_password, doctor_data.password)
     db_doctor = Doctor(
         email=doctor_data.email,
         password_hash=hashed_password,
@@ -111,12 +124,10 @@ async def register(
     )
     
     db.add(db_doctor)
-    db.commit()
-    db.refresh(db_doctor)
-    
-    # Commit initial doctor creation
-    db.commit()
-    db.refresh(db_doctor)
+    await db.commit()
+    # Load everything DoctorInDB serializes now: nothing lazy-loads in async code
+    await db.refresh(db_doctor)
+    await db.refresh(db_doctor, ["certifications"])
     
     # Async: Apply Mariel Herrera template
     try:
@@ -141,7 +152,7 @@ async def register(
 @router.post("/token", response_model=Token)
 async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Login endpoint that returns a JWT access token.
@@ -150,7 +161,7 @@ async def login(
     """
     # Get user by email
     pass
-    doctor = get_user_by_email(db, form_data.username)  # form_data.username is the email
+    doctor = await get_user_by_email_async(db, form_data.username)  # form_data.username is the email
     
     if not doctor:
         pass
@@ -161,7 +172,7 @@ async def login(
         )
     
     # Verify password
-    if not verify_password(form_data.password, doctor.password_hash):
+    if not await run_in_threadpool(verify_password, form_data.password, doctor.password_hash):
         pass
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -443,35 +454,45 @@ async def guest_login(
     return {"access_token": access_token, "token_type": "bearer", "user": {"id": guest_id, "name": name}}
 
 
-async def get_current_user(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _guest_from_token(payload: dict) -> GuestUser:
+    # Guests are not in the DB, just in the token
+    return GuestUser(
+        id=payload.get("user_id"),
+        email=payload.get("sub"),
+        role="guest",
+        tenant_id=payload.get("tenant_id"),
+        nombre_completo=payload.get("name")
+    )
+
+
+def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     db: Session = Depends(get_db)
 ) -> Doctor | GuestUser:
     """
     Dependency to get the current authenticated user (Doctor or Guest) from JWT token.
+
+    The Doctor is attached to the endpoint's sync Session (endpoints update and
+    commit it), so this is a plain def: FastAPI runs it in the threadpool instead
+    of blocking the event loop. Endpoints on get_async_db use get_current_user_async.
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    credentials_exception = _credentials_exception()
     
     try:
         payload = verify_access_token(token)
         if payload is None:
             raise credentials_exception
             
-        role = payload.get("role")
-        
-        if role == "guest":
-            # Return a Guest User object (not from DB, just from Token)
-            return GuestUser(
-                id=payload.get("user_id"),
-                email=payload.get("sub"),
-                role="guest",
-                tenant_id=payload.get("tenant_id"),
-                nombre_completo=payload.get("name")
-            )
+        if payload.get("role") == "guest":
+            return _guest_from_token(payload)
             
         # Regular Doctor/Admin Logic
         email: str = payload.get("sub")
@@ -488,6 +509,41 @@ async def get_current_user(
         raise credentials_exception
 
 
+async def get_current_user_async(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: AsyncSession = Depends(get_async_db)
+) -> Doctor | GuestUser:
+    """
+    get_current_user for endpoints on get_async_db: the Doctor belongs to the
+    request's AsyncSession.
+    """
+    credentials_exception = _credentials_exception()
+    
+    try:
+        payload = verify_access_token(token)
+        if payload is None:
+            raise credentials_exception
+            
+        if payload.get("role") == "guest":
+            return _guest_from_token(payload)
+            
+        email: str = payload.get("sub")
+        if email is None:
+            raise credentials_exception
+        
+        doctor = await get_user_by_email_async(db, email)
+        if doctor is None:
+            raise credentials_exception
+        # End the lookup's transaction: the pooled connection must not sit idle
+        # in it while an upload streams in (attributes stay loaded, see AsyncSessionLocal)
+        await db.commit()
+        
+        return doctor
+        
+    except Exception:
+        raise credentials_exception
+
+
 @router.get("/me", response_model=DoctorInDB)
 async def read_users_me(
     current_user: Annotated[Doctor, Depends(get_current_user)]
@@ -1,9 +1,9 @@
 import os
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query, Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 from app.schemas.consultation import ConsultationCreate, ConsultationUpdate
-from app.utils.pdf_generator import generate_medical_report, generate_summary_report
 from app.db.base import get_db
 from app.db.models.consultation import Consultation
 from app.db.models.appointment import Appointment
@@ -11,6 +11,9 @@ from app.core.config import settings
 from app.api.v1.endpoints.auth import get_current_user
 from app.db.models.doctor import Doctor
 from app.services.consultation_service import ConsultationService
+from app.services import clinical_export, consultation_pdf
+from app.tasks import pdf_tasks
+from app.utils import pdf_cache
 
 router = APIRouter()
 
@@ -168,6 +171,9 @@ def update_consultation(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating consultation: {str(e)}")
 
+    # The next download renders (and caches) a fresh summary
+    pdf_cache.invalidate_consultation_pdf(db_consultation)
+
     return {"status": "success", "message": "Consultation updated", "consultation": db_consultation}
 
 @router.delete("/{consultation_id}")
@@ -181,11 +187,13 @@ def delete_consultation(
     
     db.delete(consultation)
     db.commit()
+    pdf_cache.invalidate_consultation_pdf(consultation)
     return {"status": "success", "message": "Consultation deleted"}
 
 @router.get("/{id}/pdf")
 def get_consultation_pdf(
     id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     consultation = db.query(Consultation).filter(Consultation.id == id).first()
@@ -193,17 +201,21 @@ def get_consultation_pdf(
         raise HTTPException(status_code=404, detail="Consultation not found")
 
     # Map DB model to dictionary expected by PDF generator
-    # Map DB model to dictionary expected by PDF generator
-    data = _map_consultation_to_data(consultation)
+    data = consultation_pdf.summary_report_data(consultation)
+    key = consultation_pdf.report_key(db, pdf_cache.SUMMARY, consultation)
 
-    # Generate PDF (Summary Report)
-    pdf_buffer = generate_summary_report(data, consultation.doctor_id, db)
-    
-    return Response(content=pdf_buffer.getvalue(), media_type="application/pdf")
+    # Generate PDF (Summary Report), or reuse the cached rendering
+    response = _pdf_response(
+        request, key,
+        lambda: consultation_pdf.render_report(pdf_cache.SUMMARY, data, consultation.doctor_id, db)
+    )
+    pdf_cache.remember_summary(db, consultation, key)
+    return response
 
 @router.get("/{id}/history_pdf")
 def get_consultation_history_pdf(
     id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     # Get the requested consultation to extract patient info
@@ -211,52 +223,83 @@ def get_consultation_history_pdf(
     if not consultation:
         raise HTTPException(status_code=404, detail="Consultation not found")
 
-    # Fetch ALL consultations for this patient (same CI and doctor)
-    all_consultations = db.query(Consultation).filter(
-        Consultation.patient_ci == consultation.patient_ci,
-        Consultation.doctor_id == consultation.doctor_id
-    ).order_by(Consultation.created_at.asc()).all()  # ASC = oldest first
+    # Medical History with ALL consultations of this patient
+    key = consultation_pdf.report_key(db, pdf_cache.HISTORY, consultation)
 
-    # Use the MOST RECENT consultation for preconsultation data (demographics)
-    latest = all_consultations[-1] if all_consultations else consultation
-    
-    # Map preconsultation data from latest consultation
-    data = {
-        "full_name": latest.patient_name,
-        "ci": latest.patient_ci,
-        "age": latest.patient_age,
-        "phone": latest.patient_phone,
-        "reason_for_visit": latest.reason_for_visit,
-        "family_history_mother": latest.family_history_mother,
-        "family_history_father": latest.family_history_father,
-        "personal_history": latest.personal_history,
-        "supplements": latest.supplements,
-        "surgical_history": latest.surgical_history,
-        "summary_gyn_obstetric": latest.obstetric_history_summary,
-        "summary_functional_exam": latest.functional_exam_summary,
-        "summary_habits": latest.habits_summary,
-        "history_number": latest.history_number,
-        "address": "", 
-        "occupation": "",
-        
-        # Add ALL consultations for cumulative display
-        "all_consultations": [
-            {
-                "created_at": c.created_at,
-                "physical_exam": c.physical_exam,
-                "ultrasound": c.ultrasound,
-                "diagnosis": c.diagnosis,
-                "plan": c.plan,
-                "observations": c.observations,
-            }
-            for c in all_consultations
-        ]
-    }
+    if consultation_pdf.is_long_history(db, consultation):
+        # Rendered incrementally to a file and streamed back, never held in memory
+        return _pdf_file_response(
+            request, key,
+            lambda: consultation_pdf.stream_history_to_store(db, consultation, key)
+        )
 
-    # Generate PDF (Medical History with ALL consultations)
-    pdf_buffer = generate_medical_report(data, consultation.doctor_id, db)
-    
-    return Response(content=pdf_buffer.getvalue(), media_type="application/pdf")
+    # Generate PDF, or reuse the cached rendering
+    data = consultation_pdf.history_report_data(db, consultation)
+    return _pdf_response(
+        request, key,
+        lambda: consultation_pdf.render_report(pdf_cache.HISTORY, data, consultation.doctor_id, db)
+    )
+
+@router.post("/{id}/pdf-jobs", status_code=status.HTTP_202_ACCEPTED)
+def create_consultation_pdf_job(
+    id: int,
+    kind: str = Query(pdf_cache.SUMMARY, description="summary | history"),
+    db: Session = Depends(get_db)
+):
+    """
+    Render a consultation PDF off-request. Poll GET /pdf-jobs/{job_id} and
+    fetch the file from its download_url once the status is "done".
+    """
+    if kind not in (pdf_cache.SUMMARY, pdf_cache.HISTORY):
+        raise HTTPException(status_code=400, detail="kind must be 'summary' or 'history'")
+    consultation = db.query(Consultation).filter(Consultation.id == id).first()
+    if not consultation:
+        raise HTTPException(status_code=404, detail="Consultation not found")
+
+    return pdf_tasks.submit_render_job(db, kind, consultation)
+
+@router.get("/pdf-jobs/{job_id}")
+def get_consultation_pdf_job(job_id: str):
+    job = pdf_tasks.get_job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="PDF job not found")
+    return job
+
+@router.get("/pdf-jobs/{job_id}/download")
+def download_consultation_pdf_job(job_id: str, request: Request):
+    job = pdf_tasks.get_job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="PDF job not found")
+    if job["status"] != pdf_tasks.DONE:
+        raise HTTPException(status_code=409, detail=f"PDF job is {job['status']}")
+
+    # Stored artifacts are served as-is; a purged one is never re-rendered here
+    return _pdf_response(request, job["key"])
+
+@router.post("/exports", status_code=status.HTTP_202_ACCEPTED)
+def create_clinical_export(current_user: Doctor = Depends(get_current_user)):
+    """
+    Export every patient history (PDF) and all consultations (CSV) of the
+    current doctor as one ZIP. Poll GET /exports/{export_id} for progress.
+    """
+    return clinical_export.start_export(current_user.id)
+
+@router.get("/exports/{export_id}")
+def get_clinical_export(export_id: str, current_user: Doctor = Depends(get_current_user)):
+    export = clinical_export.read_status(current_user.id, export_id)
+    if export is None:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if export["status"] == clinical_export.DONE:
+        export["download_url"] = clinical_export.download_url(current_user.id, export_id)
+    return export
+
+@router.get("/exports/{export_id}/download")
+def download_clinical_export(export_id: str, doctor_id: int, expires: int, signature: str):
+    """Signed link handed out by GET /exports/{export_id} (local storage only)."""
+    path = clinical_export.verify_download(doctor_id, export_id, expires, signature)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Export not found or link expired")
+    return FileResponse(path, media_type="application/zip", filename=f"gynsys_export_{export_id[:8]}.zip")
 
 from pydantic import BaseModel, EmailStr
 
@@ -274,49 +317,56 @@ def send_consultation_email(
     if not consultation:
         raise HTTPException(status_code=404, detail="Consultation not found")
 
-    # Generate PDF in-memory to avoid self-request deadlock
-    data = _map_consultation_to_data(consultation)
-    pdf_buffer = generate_summary_report(data, consultation.doctor_id, db)
-    pdf_bytes = pdf_buffer.getvalue()
-
     # URL for the report (still needed for the button)
     report_url = f"/api/v1/consultations/{consultation.id}/pdf"
-    
-    # Import task here to avoid circular imports if any
-    from app.tasks.email_tasks import send_consultation_report_email
-    
-    background_tasks.add_task(
-        send_consultation_report_email, 
-        email=email_data.email, 
-        patient_name=consultation.patient_name, 
-        report_url=report_url,
-        pdf_bytes=pdf_bytes
-    )
-    
-    return {"status": "success", "message": "Email queued"}
 
-def _map_consultation_to_data(consultation):
-    return {
-        "full_name": consultation.patient_name,
-        "ci": consultation.patient_ci,
-        "age": consultation.patient_age,
-        "phone": consultation.patient_phone,
-        "reason_for_visit": consultation.reason_for_visit,
-        "family_history_mother": consultation.family_history_mother,
-        "family_history_father": consultation.family_history_father,
-        "personal_history": consultation.personal_history,
-        "supplements": consultation.supplements,
-        "surgical_history": consultation.surgical_history,
-        "summary_gyn_obstetric": consultation.obstetric_history_summary,
-        "summary_functional_exam": consultation.functional_exam_summary,
-        "summary_habits": consultation.habits_summary,
-        "admin_physical_exam": consultation.physical_exam,
-        "admin_ultrasound": consultation.ultrasound,
-        "admin_diagnosis": consultation.diagnosis,
-        "admin_plan": consultation.plan,
-        "admin_observations": consultation.observations,
-        "history_number": consultation.history_number,
-        "address": "", 
-        "occupation": "",
-        "created_at": consultation.created_at,
-    }
+    # Rendered off-request; the email attaches the finished artifact
+    job = pdf_tasks.queue_report_email(db, consultation, email_data.email, report_url, background_tasks)
+
+    return {"status": "success", "message": "Email queued", "job_id": job["job_id"]}
+
+def _pdf_headers(key: str) -> dict:
+    return {"ETag": pdf_cache.etag_for(key), "Cache-Control": "private, no-cache"}
+
+def _not_modified(request: Request, headers: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    return headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]
+
+def _pdf_response(request: Request, key: str, render=None) -> Response:
+    """
+    Serve a cached PDF with its ETag; 304 when the client already has it.
+    Without `render` only an already stored file is served.
+    """
+    headers = _pdf_headers(key)
+    if _not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if render is None:
+        content = pdf_cache.read_cached_pdf(key)
+        if content is None:
+            raise HTTPException(status_code=410, detail="PDF artifact no longer available")
+    else:
+        content = pdf_cache.get_or_render(key, render)
+    return Response(content=content, media_type="application/pdf", headers=headers)
+
+def _pdf_file_response(request: Request, key: str, render_to_store) -> Response:
+    """
+    Like _pdf_response for big documents: render_to_store() writes the file
+    (returning a temporary path when it could not be stored) and the bytes
+    are sent from disk or the object store in chunks.
+    """
+    headers = _pdf_headers(key)
+    if _not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if not pdf_cache.has_cached_pdf(key):
+        temp_path = render_to_store()
+        if temp_path:
+            return FileResponse(
+                temp_path, media_type="application/pdf", headers=headers,
+                background=BackgroundTask(os.unlink, temp_path)
+            )
+
+    path = pdf_cache.cached_pdf_path(key)
+    if path:
+        return FileResponse(path, media_type="application/pdf", headers=headers)
+    return StreamingResponse(pdf_cache.iter_cached_pdf(key), media_type="application/pdf", headers=headers)
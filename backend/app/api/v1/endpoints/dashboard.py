@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.db.base import get_db
 from app.api.v1.endpoints.auth import get_current_user
+from app.core.visitor_counter import get_visitor_counter
 from app.db.models.doctor import Doctor
 from app.db.models.endometriosis_result import EndometriosisResult
 from app.db.models.cycle_user import CycleUser
@@ -30,8 +31,8 @@ def get_dashboard_stats(
         CycleUser.doctor_id == current_user.id
     ).count()
 
-    # 3. Visitor Count
-    visitor_count = current_user.visitor_count
+    # 3. Visitor Count (stored total + views not yet flushed)
+    visitor_count = current_user.visitor_count + get_visitor_counter().pending(current_user.id)
 
     # 4. Appointments this month (Existing metric, confirming logic)
     today = datetime.now()
@@ -1,12 +1,13 @@
 """
 Gallery endpoints for managing doctor's gallery images.
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Annotated, List
-from sqlalchemy import asc
+from sqlalchemy import asc, select
 
-from app.db.base import get_db
+from app.db.base import get_async_db, get_db
 from app.db.models.doctor import Doctor
 from app.db.models.gallery import GalleryImage
 from app.schemas.gallery import (
@@ -16,7 +17,10 @@ from app.schemas.gallery import (
     GalleryImagePublic
 )
 from app.api.v1.endpoints.auth import get_current_user
-from app.api.v1.endpoints.uploads import validate_image
+from app.api.v1.endpoints.uploads import FILE_UPLOAD_BODY
+from app.services.image_derivatives import VariantIndex, derivatives_query
+from app.services.media_store import receive_media, release_image
+from app.tasks.image_tasks import schedule_derivatives
 from pathlib import Path
 from app.core.config import settings
 
@@ -31,33 +35,47 @@ router = APIRouter()
 @router.get("/public/{doctor_slug}", response_model=List[GalleryImagePublic])
 async def get_public_gallery(
     doctor_slug: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get all active gallery images for a doctor (public endpoint).
     """
-    doctor = db.query(Doctor).filter(Doctor.slug_url == doctor_slug).first()
-    if not doctor:
+    doctor_id = (await db.execute(
+        select(Doctor.id).where(Doctor.slug_url == doctor_slug).limit(1)
+    )).scalar_one_or_none()
+    if doctor_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Doctor not found"
         )
     
-    gallery_images = db.query(GalleryImage).filter(
-        GalleryImage.doctor_id == doctor.id,
-        GalleryImage.is_active == True
-    ).order_by(
-        asc(GalleryImage.display_order),
-        asc(GalleryImage.created_at)
-    ).all()
+    gallery_images = (await db.execute(
+        select(GalleryImage).where(
+            GalleryImage.doctor_id == doctor_id,
+            GalleryImage.is_active == True
+        ).order_by(
+            asc(GalleryImage.display_order),
+            asc(GalleryImage.created_at)
+        )
+    )).scalars().all()
+
+    # Resized variants, one query for the whole gallery
+    variants = VariantIndex((await db.execute(
+        derivatives_query(image.image_url for image in gallery_images)
+    )).scalars())
+    public_images = []
+    for image in gallery_images:
+        public_image = GalleryImagePublic.model_validate(image)
+        public_image.variants = variants.get(image.image_url, image.crop)
+        public_images.append(public_image)
     
-    return gallery_images
+    return public_images
 
 
-@router.post("/upload", response_model=GalleryImageInDB, status_code=status.HTTP_201_CREATED)
+@router.post("/upload", response_model=GalleryImageInDB, status_code=status.HTTP_201_CREATED, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_gallery_image(
+    request: Request,
     current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
     title: str = None,
     description: str = None,
     db: Session = Depends(get_db)
@@ -65,47 +83,22 @@ async def upload_gallery_image(
     """
     Upload a new gallery image.
     """
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Save file to gallery directory
-    from datetime import datetime
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_extension = Path(file.filename).suffix
-    filename = f"{current_user.id}_gallery_{timestamp}{file_extension}"
-    file_path = GALLERY_DIR / filename
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        import shutil
-        shutil.copyfileobj(file.file, buffer)
-    
-    image_url = f"/uploads/gallery/{filename}"
+    doctor_id = current_user.id
+    # End the auth lookup's transaction so no pooled connection is held while the body streams in
+    db.commit()
+    # Streamed to disk; size and type are checked as the bytes arrive
+    image_url = (await receive_media(request, GALLERY_DIR, doctor_id, "gallery")).url
     
     # Get max display_order
     max_order = db.query(GalleryImage).filter(
-        GalleryImage.doctor_id == current_user.id
+        GalleryImage.doctor_id == doctor_id
     ).order_by(GalleryImage.display_order.desc()).first()
     
     next_order = (max_order.display_order + 1) if max_order else 0
     
     # Create gallery image record
     db_gallery_image = GalleryImage(
-        doctor_id=current_user.id,
+        doctor_id=doctor_id,
         image_url=image_url,
         title=title,
         description=description,
@@ -114,6 +107,7 @@ async def upload_gallery_image(
     db.add(db_gallery_image)
     db.commit()
     db.refresh(db_gallery_image)
+    schedule_derivatives(doctor_id, image_url)
     
     return db_gallery_image
 
@@ -154,13 +148,21 @@ async def update_gallery_image(
             detail="Gallery image not found"
         )
     
+    old_url, old_crop = gallery_image.image_url, gallery_image.crop
+
     # Update fields
     update_data = gallery_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(gallery_image, field, value)
     
+    # Variants are cut from the crop: rebuild them when it (or the image) changes
+    rebuild = gallery_image.image_url != old_url or gallery_image.crop != old_crop
+    if rebuild:
+        release_image(db, old_url, old_crop)
     db.commit()
     db.refresh(gallery_image)
+    if rebuild:
+        schedule_derivatives(current_user.id, gallery_image.image_url, gallery_image.crop)
     
     return gallery_image
 
@@ -192,11 +194,11 @@ async def debug_gallery_image(
         "featured": gallery_image.featured
     }
 
-@router.put("/{gallery_id}/image", response_model=GalleryImageInDB)
+@router.put("/{gallery_id}/image", response_model=GalleryImageInDB, openapi_extra=FILE_UPLOAD_BODY)
 async def replace_gallery_image(
     gallery_id: int,
+    request: Request,
     current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
     """
@@ -213,48 +215,21 @@ async def replace_gallery_image(
             detail="Gallery image not found"
         )
     
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Delete old image file if it exists
-    if gallery_image.image_url:
-        old_image_path = UPLOAD_DIR / gallery_image.image_url.lstrip('/uploads/')
-        if old_image_path.exists():
-            try:
-                old_image_path.unlink()
-            except Exception as e:
-                pass
-    
-    # Save new file
-    from datetime import datetime
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_extension = Path(file.filename).suffix
-    filename = f"{current_user.id}_gallery_{timestamp}{file_extension}"
-    file_path = GALLERY_DIR / filename
+    doctor_id = current_user.id
+    # No pooled connection held while the body streams in (objects reload afterwards)
+    db.commit()
+    # Streamed to disk first: a rejected upload leaves the current image in place
+    image_url = (await receive_media(request, GALLERY_DIR, doctor_id, "gallery")).url
     
-    with open(file_path, "wb") as buffer:
-        import shutil
-        shutil.copyfileobj(file.file, buffer)
+    # Old image file and variants: deleted now, or by the media store collector once unreferenced
+    release_image(db, gallery_image.image_url, all_crops=True)
     
     # Update image_url
-    gallery_image.image_url = f"/uploads/gallery/{filename}"
+    gallery_image.image_url = image_url
     
     db.commit()
     db.refresh(gallery_image)
+    schedule_derivatives(doctor_id, gallery_image.image_url, gallery_image.crop)
     
     return gallery_image
 
@@ -279,6 +254,7 @@ async def delete_gallery_image(
             detail="Gallery image not found"
         )
     
+    release_image(db, gallery_image.image_url, all_crops=True)
     db.delete(gallery_image)
     db.commit()
     
@@ -22,15 +22,20 @@ def get_public_settings(
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     
+    return get_public_settings_for_doctor(db, doctor.id)
+
+
+def get_public_settings_for_doctor(db: Session, doctor_id: int):
+    """Stored settings for a doctor, or the public defaults when none exist."""
     settings = db.query(OnlineConsultationSettings).filter(
-        OnlineConsultationSettings.doctor_id == doctor.id
+        OnlineConsultationSettings.doctor_id == doctor_id
     ).first()
     
     # If no settings exist, return defaults
     if not settings:
         return schemas.OnlineConsultationSettings(
             id=0,
-            doctor_id=doctor.id,
+            doctor_id=doctor_id,
             first_consultation_price=50.0,
             followup_price=40.0,
             currency="USD",
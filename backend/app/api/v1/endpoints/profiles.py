@@ -1,12 +1,15 @@
 """
 Public profile endpoints for doctor profiles.
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 
 from app.db.base import get_db
 from app.db.models.doctor import Doctor
 from app.schemas.doctor import DoctorPublic
+from app.core.public_bundle import get_public_bundle
+from app.core.visitor_counter import record_visit
+from app.services.image_derivatives import load_variant_index
 
 router = APIRouter()
 
@@ -32,11 +35,41 @@ def get_doctor_profile(
             detail="Doctor profile not found"
         )
     
-    # Increment visitor count
-    try:
-        doctor.visitor_count += 1
-        db.commit()
-    except Exception:
-        db.rollback()
+    # Increment visitor count (buffered, flushed periodically)
+    record_visit(doctor.id)
     
-    return doctor
\ No newline at end of file
+    profile = DoctorPublic.model_validate(doctor)
+    variants = load_variant_index(db, [doctor.logo_url, doctor.photo_url])
+    profile.logo_variants = variants.get(doctor.logo_url)
+    profile.photo_variants = variants.get(doctor.photo_url)
+    return profile
+
+
+@router.get("/{slug}/bundle")
+def get_doctor_public_bundle(
+    slug: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Everything a public tenant page needs in one cached response:
+    profile, gallery, testimonials, FAQs, services, locations,
+    recommendations, blog posts, mega menu and online consultation settings.
+    Supports If-None-Match; counts the visit like the profile endpoint.
+    """
+    # A cache hit never checks out a DB connection
+    bundle = get_public_bundle(db, slug)
+    if bundle is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Doctor profile not found"
+        )
+
+    doctor_id, payload, etag = bundle
+    record_visit(doctor_id)
+
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=0, must-revalidate"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
\ No newline at end of file
@@ -95,7 +95,8 @@ async def test_push_notification(
             body=request.body,
             icon=request.icon,
             badge=request.badge,
-            data=request.data or {}
+            data=request.data or {},
+            db=db
         )
         
         return {
@@ -188,7 +189,8 @@ async def test_all_notification_types(
                 title=notification["title"],
                 body=notification["body"],
                 icon=notification["icon"],
-                data=notification["data"]
+                data=notification["data"],
+                db=db
             )
             results.append({
                 "notification_number": idx,
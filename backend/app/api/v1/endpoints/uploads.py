@@ -1,18 +1,28 @@
 """
 File upload endpoints for doctor logos and photos.
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from typing import Annotated
-import os
-import shutil
 from pathlib import Path
-from datetime import datetime
 
-from app.db.base import get_db
+from app.db.base import get_async_db
 from app.db.models.doctor import Doctor
-from app.api.v1.endpoints.auth import get_current_user
+from app.db.models.gallery import GalleryImage
+from app.api.v1.endpoints.auth import get_current_user_async
 from app.core.config import settings
+from app.utils.pdf_assets import invalidate_doctor_assets
+from app.services import direct_uploads
+from app.services.media_store import receive_media
+from app.tasks.image_tasks import schedule_derivatives
+from app.utils.upload_stream import IMAGE_TYPES, VIDEO_TYPES, StoredUpload, receive_upload
+from app.utils import upload_sessions
+from app.schemas.upload import (
+    DirectUploadComplete, DirectUploadCreate, DirectUploadTicket, UploadSessionComplete, UploadSessionCreate,
+    UploadSessionStatus,
+)
 
 router = APIRouter()
 
@@ -37,97 +47,42 @@ SIGNATURE_DIR.mkdir(exist_ok=True)
 VIDEO_DIR.mkdir(exist_ok=True)
 
 
-ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/jpg", "image/png", "image/webp"]
-ALLOWED_VIDEO_TYPES = ["video/mp4", "video/webm", "video/mov", "video/quicktime"]
+# Request body of the streaming endpoints, for the OpenAPI docs (they read the form themselves)
+FILE_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object", "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    }
+}
 
 
-def validate_image(file: UploadFile) -> bool:
-    """Validate that the uploaded file is an image."""
-    return file.content_type in ALLOWED_IMAGE_TYPES
+async def receive_image(request: Request, directory: Path, doctor_id: int, file_type: str) -> StoredUpload:
+    """Stream an image upload into the media store, then queue resized WebP/AVIF variants for public pages."""
+    stored = await receive_media(request, directory, doctor_id, file_type)
+    schedule_derivatives(doctor_id, stored.url)
+    return stored
 
 
-def save_uploaded_file(file: UploadFile, directory: Path, doctor_id: int, file_type: str) -> str:
-    """
-    Save uploaded file and return the relative URL.
-    
-    Args:
-        file: Uploaded file
-        directory: Directory to save the file (e.g., UPLOAD_DIR / "testimonials")
-        doctor_id: ID of the doctor
-        file_type: Type of file (logo, photo, or testimonial)
-        
-    Returns:
-        Relative URL path to the saved file (e.g., "/uploads/testimonials/filename.jpg")
-    """
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_extension = Path(file.filename).suffix
-    filename = f"{doctor_id}_{file_type}_{timestamp}{file_extension}"
-    file_path = directory / filename
-    
-    # Ensure directory exists
-    directory.mkdir(parents=True, exist_ok=True)
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Verify file was saved
-    if not file_path.exists():
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to save file"
-        )
-    
-    # Get the relative path from UPLOAD_DIR
-    # file_path is absolute, UPLOAD_DIR is absolute, so relative_to should work
-    try:
-        relative_path = file_path.relative_to(UPLOAD_DIR)
-        url_path = f"/uploads/{relative_path.as_posix()}"
-        # Debug log
-        pass
-        return url_path
-    except ValueError:
-        # Fallback: construct path manually based on directory name
-        dir_name = directory.name  # "testimonials", "logos", "photos", etc.
-        url_path = f"/uploads/{dir_name}/{filename}"
-        pass
-        return url_path
-
-
-@router.post("/logo", status_code=status.HTTP_200_OK)
+@router.post("/logo", status_code=status.HTTP_200_OK, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_logo(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload doctor logo.
     """
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Save file
-    logo_url = save_uploaded_file(file, LOGO_DIR, current_user.id, "logo")
+    # Streamed to disk; size and type are checked as the bytes arrive
+    logo_url = (await receive_image(request, LOGO_DIR, current_user.id, "logo")).url
     
     # Update doctor record
     current_user.logo_url = logo_url
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    invalidate_doctor_assets(current_user.id)
     
     return {
         "message": "Logo uploaded successfully",
@@ -135,39 +90,22 @@ async def upload_logo(
     }
 
 
-@router.post("/photo", status_code=status.HTTP_200_OK)
+@router.post("/photo", status_code=status.HTTP_200_OK, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_photo(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload doctor profile photo.
     """
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Save file
-    photo_url = save_uploaded_file(file, PHOTO_DIR, current_user.id, "photo")
+    # Streamed to disk; size and type are checked as the bytes arrive
+    photo_url = (await receive_image(request, PHOTO_DIR, current_user.id, "photo")).url
     
     # Update doctor record
     current_user.photo_url = photo_url
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     
     return {
         "message": "Photo uploaded successfully",
@@ -175,76 +113,104 @@ async def upload_photo(
     }
 
 
-@router.post("/video", status_code=status.HTTP_200_OK)
+@router.post("/video", status_code=status.HTTP_200_OK, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_video(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload marketing video for online consultations.
     """
-    # Validate video type
-    if file.content_type not in ALLOWED_VIDEO_TYPES:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only MP4, WebM, and MOV videos are allowed."
-        )
-    
-    # Check file size (50MB for videos)
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    MAX_VIDEO_SIZE = 50 * 1024 * 1024  # 50MB
-    if file_size > MAX_VIDEO_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is 50MB"
-        )
-    
-    # Save file
-    video_url = save_uploaded_file(file, VIDEO_DIR, current_user.id, "video")
+    # Streamed to disk; size (MAX_VIDEO_UPLOAD_SIZE) and type are checked as the bytes arrive
+    stored = await receive_upload(request, VIDEO_DIR, current_user.id, "video", VIDEO_TYPES)
     
     return {
         "message": "Video uploaded successfully",
-        "video_url": video_url
+        "video_url": stored.url,
+        "size": stored.size,
+        "sha256": stored.sha256
     }
 
 
-@router.post("/location-photo", status_code=status.HTTP_200_OK)
+@router.post("/video/sessions", response_model=UploadSessionStatus, status_code=status.HTTP_201_CREATED)
+async def create_video_upload_session(
+    session_in: UploadSessionCreate,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)]
+):
+    """
+    Start a resumable video upload. PUT the bytes in pieces to
+    /video/sessions/{upload_id}?offset=N, then POST .../complete.
+    """
+    return upload_sessions.create_session(current_user.id, "video", session_in.size, session_in.filename)
+
+
+@router.get("/video/sessions/{upload_id}", response_model=UploadSessionStatus)
+async def get_video_upload_session(
+    upload_id: str,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)]
+):
+    """
+    Current offset of a resumable upload (where to continue after a dropped connection).
+    """
+    return upload_sessions.get_session(current_user.id, upload_id)
+
+
+@router.put("/video/sessions/{upload_id}", response_model=UploadSessionStatus)
+async def upload_video_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)]
+):
+    """
+    Append the raw request body at `offset`, which must equal the session's
+    current offset (409 with the right one otherwise).
+    """
+    return await upload_sessions.append_chunk(request, current_user.id, upload_id, offset)
+
+
+@router.post("/video/sessions/{upload_id}/complete", status_code=status.HTTP_200_OK)
+async def complete_video_upload_session(
+    upload_id: str,
+    complete_in: UploadSessionComplete,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)]
+):
+    """
+    Finish a resumable upload; same response as POST /video.
+    """
+    stored = await upload_sessions.complete_session(current_user.id, upload_id, VIDEO_DIR, complete_in.sha256)
+    return {
+        "message": "Video uploaded successfully",
+        "video_url": stored.url,
+        "size": stored.size,
+        "sha256": stored.sha256
+    }
+
+
+@router.delete("/video/sessions/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_video_upload_session(
+    upload_id: str,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)]
+):
+    """
+    Abandon a resumable upload and delete what was received.
+    """
+    upload_sessions.abort_session(current_user.id, upload_id)
+    return None
+
+
+@router.post("/location-photo", status_code=status.HTTP_200_OK, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_location_photo(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload location photo.
     """
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Save file
-    # We reuse PHOTO_DIR or create a new one. Let's use PHOTO_DIR for now but without updating the user profile.
-    # Or better, create a LOCATION_DIR.
-    # For simplicity and to match existing patterns, let's just save it to PHOTO_DIR but NOT update the user.
-    # Actually, let's use a specific prefix or just rely on the filename.
-    
-    photo_url = save_uploaded_file(file, PHOTO_DIR, current_user.id, "location")
+    # Streamed to disk; size and type are checked as the bytes arrive
+    photo_url = (await receive_image(request, PHOTO_DIR, current_user.id, "location")).url
     
     # DO NOT update doctor record
     
@@ -254,35 +220,18 @@ async def upload_location_photo(
     }
 
 
-@router.post("/testimonial-photo", status_code=status.HTTP_200_OK)
+@router.post("/testimonial-photo", status_code=status.HTTP_200_OK, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_testimonial_photo(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload testimonial patient photo.
     Returns the URL to be used when updating a testimonial.
     """
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Save file
-    photo_url = save_uploaded_file(file, TESTIMONIAL_DIR, current_user.id, "testimonial")
+    # Streamed to disk; size and type are checked as the bytes arrive
+    photo_url = (await receive_image(request, TESTIMONIAL_DIR, current_user.id, "testimonial")).url
     
     return {
         "message": "Testimonial photo uploaded successfully",
@@ -290,35 +239,18 @@ async def upload_testimonial_photo(
     }
 
 
-@router.post("/blog-cover", status_code=status.HTTP_200_OK)
+@router.post("/blog-cover", status_code=status.HTTP_200_OK, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_blog_cover(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload blog post cover image.
     Returns the URL to be used when creating/updating a blog post.
     """
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Save file
-    cover_url = save_uploaded_file(file, BLOG_DIR, current_user.id, "blog_cover")
+    # Streamed to disk; size and type are checked as the bytes arrive
+    cover_url = (await receive_image(request, BLOG_DIR, current_user.id, "blog_cover")).url
     
     return {
         "message": "Blog cover image uploaded successfully",
@@ -327,35 +259,18 @@ async def upload_blog_cover(
     }
 
 
-@router.post("/service-image", status_code=status.HTTP_200_OK)
+@router.post("/service-image", status_code=status.HTTP_200_OK, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_service_image(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload service image.
     Returns the URL to be used when creating/updating a service.
     """
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Save file
-    image_url = save_uploaded_file(file, SERVICES_DIR, current_user.id, "service")
+    # Streamed to disk; size and type are checked as the bytes arrive
+    image_url = (await receive_image(request, SERVICES_DIR, current_user.id, "service")).url
     
     return {
         "message": "Service image uploaded successfully",
@@ -363,35 +278,18 @@ async def upload_service_image(
     }
 
 
-@router.post("/recommendation-image", status_code=status.HTTP_200_OK)
+@router.post("/recommendation-image", status_code=status.HTTP_200_OK, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_recommendation_image(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload recommendation product image.
     Returns the URL to be used when creating/updating a recommendation.
     """
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Save file to services directory (reuse for recommendations)
-    image_url = save_uploaded_file(file, SERVICES_DIR, current_user.id, "recommendation")
+    # Streamed to disk; size and type are checked as the bytes arrive
+    image_url = (await receive_image(request, SERVICES_DIR, current_user.id, "recommendation")).url
     
     return {
         "message": "Recommendation image uploaded successfully",
@@ -400,34 +298,17 @@ async def upload_recommendation_image(
 
 
 
-@router.post("/certification-logo", status_code=status.HTTP_200_OK)
+@router.post("/certification-logo", status_code=status.HTTP_200_OK, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_certification_logo(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload certification logo.
     """
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Save file
-    logo_url = save_uploaded_file(file, LOGO_DIR, current_user.id, "cert")
+    # Streamed to disk; size and type are checked as the bytes arrive
+    logo_url = (await receive_image(request, LOGO_DIR, current_user.id, "cert")).url
     
     return {
         "message": "Certification logo uploaded successfully",
@@ -436,34 +317,18 @@ async def upload_certification_logo(
     }
 
 
-@router.post("/signature", status_code=status.HTTP_200_OK)
+@router.post("/signature", status_code=status.HTTP_200_OK, openapi_extra=FILE_UPLOAD_BODY)
 async def upload_signature(
-    current_user: Annotated[Doctor, Depends(get_current_user)],
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload doctor signature.
     """
-    if not validate_image(file):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
-        )
-    
-    # Check file size
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-        )
-    
-    # Save file
-    signature_url = save_uploaded_file(file, SIGNATURE_DIR, current_user.id, "signature")
+    # Streamed to disk; size and type are checked as the bytes arrive
+    signature_url = (await receive_media(request, SIGNATURE_DIR, current_user.id, "signature")).url
+    invalidate_doctor_assets(current_user.id)
     
     return {
         "message": "Signature uploaded successfully",
@@ -471,3 +336,92 @@ async def upload_signature(
     }
 
 
+# Direct (presigned) uploads: kind -> (where it is stored, accepted types)
+DIRECT_UPLOAD_KINDS = {
+    "logo": (LOGO_DIR, IMAGE_TYPES),
+    "photo": (PHOTO_DIR, IMAGE_TYPES),
+    "location": (PHOTO_DIR, IMAGE_TYPES),
+    "testimonial": (TESTIMONIAL_DIR, IMAGE_TYPES),
+    "blog_cover": (BLOG_DIR, IMAGE_TYPES),
+    "service": (SERVICES_DIR, IMAGE_TYPES),
+    "recommendation": (SERVICES_DIR, IMAGE_TYPES),
+    "cert": (LOGO_DIR, IMAGE_TYPES),
+    "signature": (SIGNATURE_DIR, IMAGE_TYPES),
+    "gallery": (GALLERY_DIR, IMAGE_TYPES),
+    "video": (VIDEO_DIR, VIDEO_TYPES),
+}
+
+
+def direct_upload_kind(kind: str):
+    if kind not in DIRECT_UPLOAD_KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown upload kind. Use one of: {', '.join(DIRECT_UPLOAD_KINDS)}"
+        )
+    return DIRECT_UPLOAD_KINDS[kind]
+
+
+@router.post("/direct", response_model=DirectUploadTicket, status_code=status.HTTP_201_CREATED)
+async def create_direct_upload(
+    upload_in: DirectUploadCreate,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)]
+):
+    """
+    Start an upload that goes straight to the media bucket (MEDIA_STORAGE_BACKEND="minio"):
+    PUT the file to upload_url, then POST the token to /direct/complete.
+    """
+    _, allowed_types = direct_upload_kind(upload_in.kind)
+    return await run_in_threadpool(
+        direct_uploads.start_direct_upload, current_user.id, upload_in.kind, allowed_types,
+        upload_in.size, upload_in.content_type, upload_in.filename
+    )
+
+
+@router.post("/direct/complete", status_code=status.HTTP_200_OK)
+async def complete_direct_upload(
+    complete_in: DirectUploadComplete,
+    current_user: Annotated[Doctor, Depends(get_current_user_async)],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Check the uploaded object (size, type, optional SHA-256) and register it
+    like the matching streaming endpoint does (logo/photo saved on the profile,
+    gallery entry created, variants queued).
+    """
+    claims = direct_uploads.read_direct_upload(current_user.id, complete_in.token)
+    kind = claims["kind"]
+    directory, allowed_types = direct_upload_kind(kind)
+    stored = await run_in_threadpool(
+        direct_uploads.complete_direct_upload, claims, directory, allowed_types, complete_in.sha256
+    )
+
+    response = {
+        "message": "Upload completed successfully",
+        "kind": kind,
+        "url": stored.url,
+        "size": stored.size,
+        "sha256": stored.sha256
+    }
+    if kind == "logo":
+        current_user.logo_url = stored.url
+    elif kind == "photo":
+        current_user.photo_url = stored.url
+    elif kind == "gallery":
+        max_order = (await db.execute(
+            select(func.max(GalleryImage.display_order)).where(GalleryImage.doctor_id == current_user.id)
+        )).scalar()
+        gallery_image = GalleryImage(
+            doctor_id=current_user.id,
+            image_url=stored.url,
+            display_order=(max_order + 1) if max_order is not None else 0
+        )
+        db.add(gallery_image)
+    await db.commit()
+    if kind == "gallery":
+        response["gallery_image_id"] = gallery_image.id
+
+    if kind in ("logo", "signature"):
+        invalidate_doctor_assets(current_user.id)
+    if allowed_types is IMAGE_TYPES and kind != "signature":
+        schedule_derivatives(current_user.id, stored.url)
+    return response
@@ -16,6 +16,7 @@ from app.schemas.doctor import (
     ModuleSimple
 )
 from app.core.security import hash_password
+from app.core.module_cache import invalidate_tenant_modules
 from app.api.v1.endpoints.auth import get_current_user
 
 router = APIRouter()
@@ -174,6 +175,8 @@ async def update_current_user(
                    db.add(new_tm)
 
     db.commit()
+    if doctor_update.enabled_modules is not None:
+        invalidate_tenant_modules(current_user.id, db)
     db.refresh(current_user)
     
     # Re-calculate modules_status for response
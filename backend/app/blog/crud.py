@@ -2,6 +2,7 @@ import re
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from app.blog.models import BlogPost, Comment, BlogPostSEO
+from app.db.models.service import Service
 from app.blog.schemas import BlogPostCreate, BlogPostUpdate, CommentCreate
 
 def slugify(text: str) -> str:
@@ -22,6 +23,26 @@ def get_posts_by_doctor(db: Session, doctor_id: int, skip: int = 0, limit: int =
 def get_published_posts_by_doctor(db: Session, doctor_id: int, skip: int = 0, limit: int = 100):
     return db.query(BlogPost).filter(BlogPost.doctor_id == doctor_id, BlogPost.is_published == True).offset(skip).limit(limit).all()
 
+def get_public_posts_by_doctor(db: Session, doctor_id: int, skip: int = 0, limit: int = 100):
+    """Published posts flagged with is_service_content when a Service links to them."""
+    posts = get_published_posts_by_doctor(db, doctor_id=doctor_id, skip=skip, limit=limit)
+    
+    # Get all service blog slugs for this doctor
+    service_slugs = [
+        slug for (slug,) in db.query(Service.blog_slug)
+        .filter(Service.doctor_id == doctor_id, Service.blog_slug.isnot(None))
+        .all()
+    ]
+    
+    # Mark posts that are service content
+    for post in posts:
+        if post.slug in service_slugs:
+            post.is_service_content = True
+        else:
+            post.is_service_content = False
+            
+    return posts
+
 def create_post(db: Session, post: BlogPostCreate, doctor_id: int):
     slug = slugify(post.title)
     # Ensure unique slug
@@ -45,23 +45,7 @@ def read_doctor_posts(
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     
-    posts = crud.get_published_posts_by_doctor(db, doctor_id=doctor.id, skip=skip, limit=limit)
-    
-    # Get all service blog slugs for this doctor
-    service_slugs = [
-        slug for (slug,) in db.query(Service.blog_slug)
-        .filter(Service.doctor_id == doctor.id, Service.blog_slug.isnot(None))
-        .all()
-    ]
-    
-    # Mark posts that are service content
-    for post in posts:
-        if post.slug in service_slugs:
-            post.is_service_content = True
-        else:
-            post.is_service_content = False
-            
-    return posts
+    return crud.get_public_posts_by_doctor(db, doctor_id=doctor.id, skip=skip, limit=limit)
 
 @router.get("/public/post/{slug}", response_model=schemas.BlogPostResponse)
 def read_post_public(
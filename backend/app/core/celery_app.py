@@ -2,7 +2,7 @@
 from celery import Celery
 from app.core.config import settings
 
-celery_app = Celery("gynsys", broker=settings.CELERY_BROKER_URL)
+celery_app = Celery("gynsys", broker=settings.CELERY_BROKER_URL, backend=settings.CELERY_RESULT_BACKEND)
 
 celery_app.conf.update(
     task_serializer="json",
@@ -23,6 +23,14 @@ celery_app.conf.beat_schedule = {
         "task": "app.tasks.notification_sender.process_notification_queue",
         "schedule": crontab(minute='*/10'),
     },
+    "collect-media-garbage": {
+        "task": "app.tasks.media_tasks.collect_media_garbage",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "purge-clinical-exports": {
+        "task": "app.tasks.export_tasks.purge_clinical_exports",
+        "schedule": crontab(minute=15),
+    },
 }
 # Auto-discover tasks and ensure modules are loaded
 celery_app.autodiscover_tasks(['app'])
@@ -30,7 +38,51 @@ celery_app.autodiscover_tasks(['app'])
 # Explicitly import task modules to ensure they register their tasks with the app instance
 try:
     import app.tasks.email_tasks
+    import app.tasks.pdf_tasks
+    import app.tasks.image_tasks
+    import app.tasks.media_tasks
+    import app.tasks.export_tasks
     import app.tasks.notification_processor
     import app.tasks.notification_sender
 except ImportError:
     pass
+
+
+from celery.signals import task_postrun, task_prerun, worker_process_init
+
+
+@worker_process_init.connect
+def reset_db_pools(**kwargs):
+    """Prefork children must not reuse connections pooled in the parent."""
+    from app.db.base import async_engine, engine
+
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+
+@task_postrun.connect
+def log_db_pool_stats(**kwargs):
+    from app.db.pool import maybe_log_pool_stats
+
+    maybe_log_pool_stats()
+
+
+# SQL profiling: one profile per task run (tokens by task id, prerun and postrun run in the same thread)
+_sql_profiles = {}
+
+
+@task_prerun.connect
+def start_sql_profile(task_id=None, task=None, **kwargs):
+    if settings.SQL_PROFILING_ENABLED:
+        from app.db.profiling import start_profile
+
+        _sql_profiles[task_id] = start_profile(f"task {task.name}")
+
+
+@task_postrun.connect
+def finish_sql_profile(task_id=None, **kwargs):
+    token = _sql_profiles.pop(task_id, None)
+    if token is not None:
+        from app.db.profiling import finish_profile
+
+        finish_profile(token)
@@ -15,6 +15,27 @@ class Settings(BaseSettings):
     # Database
     # DATABASE_URL: str = "sqlite:///./gynsys.db"
     DATABASE_URL: str = "postgresql://postgres:gyn13409534@db:5432/gynsys"
+    ASYNC_DATABASE_URL: Optional[str] = None  # Defaults to DATABASE_URL with the asyncpg/aiosqlite driver
+
+    # Connection pools (Postgres), sized per process role: api, worker, beat, script
+    DB_POOL_ROLE: str = "auto"  # "auto" guesses from the command line (uvicorn / celery worker / celery beat)
+    DB_POOL_SIZE_API: int = 10
+    DB_MAX_OVERFLOW_API: int = 10
+    DB_POOL_SIZE_WORKER: int = 2  # Prefork children run one task at a time
+    DB_MAX_OVERFLOW_WORKER: int = 2
+    DB_POOL_SIZE_BEAT: int = 1
+    DB_MAX_OVERFLOW_BEAT: int = 0
+    DB_POOL_SIZE_SCRIPT: int = 2
+    DB_MAX_OVERFLOW_SCRIPT: int = 3
+    DB_POOL_TIMEOUT: int = 10  # Seconds to wait for a connection before failing the request
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True  # Detect connections killed by a Postgres restart before using them
+    DB_PGBOUNCER_MODE: bool = False  # Behind PgBouncer transaction pooling: no app-side pool, no prepared statements
+    DB_POOL_STATS_LOG_SECONDS: int = 300  # Celery workers log pool metrics this often (0 = never)
+
+    # SQL profiling per HTTP request / Celery task (Server-Timing header, N+1 warnings in the logs)
+    SQL_PROFILING_ENABLED: bool = False
+    SQL_PROFILING_N_PLUS_ONE_THRESHOLD: int = 5  # Same statement this many times in one request = probable N+1
 
     # JWT Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
@@ -76,9 +97,74 @@ class Settings(BaseSettings):
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
 
+    # Daily notification evaluation
+    NOTIFICATION_BULK_EVALUATION: bool = True  # Prefetch per tenant instead of per-user queries
+    NOTIFICATION_BULK_BATCH_SIZE: int = 500  # PendingNotification rows per INSERT
+    NOTIFICATION_FANOUT_ENABLED: bool = False  # Shard the run across Celery workers (needs a result backend)
+    NOTIFICATION_SHARD_SIZE: int = 1000  # CycleUsers per shard
+
+    # Notification queue delivery
+    NOTIFICATION_BATCH_DELIVERY: bool = True  # Claim/deliver/record in batches (safe with several workers)
+    NOTIFICATION_DELIVERY_BATCH_SIZE: int = 100
+    NOTIFICATION_MAX_BATCHES_PER_RUN: int = 20
+    NOTIFICATION_CLAIM_TIMEOUT_MINUTES: int = 15  # Reclaim rows stuck in "sending" after a worker crash
+
+    # Tenant module entitlements cache
+    MODULE_CACHE_TTL_SECONDS: int = 60
+    MODULE_CACHE_REDIS_ENABLED: bool = False  # Share entries (and invalidations) through REDIS_URL
+    MODULE_CACHE_LOCAL_TTL_SECONDS: int = 5  # In-process copy lifetime when Redis is enabled
+
+    # Public doctor page bundle
+    PUBLIC_BUNDLE_TTL_SECONDS: int = 300
+    PUBLIC_BUNDLE_REDIS_ENABLED: bool = False  # Share bundles (and invalidations) through REDIS_URL
+    PUBLIC_BUNDLE_LOCAL_TTL_SECONDS: int = 5  # In-process copy lifetime when Redis is enabled
+    VISITOR_COUNT_REDIS_ENABLED: bool = False  # Buffer page views in Redis instead of process memory
+    VISITOR_FLUSH_INTERVAL_SECONDS: int = 60
+
+    # Compiled preconsultation templates (questions, lookup maps, summarizer)
+    PRECONSULTATION_CACHE_TTL_SECONDS: int = 300  # Staleness bound for other processes without Redis
+    PRECONSULTATION_CACHE_REDIS_ENABLED: bool = False  # Share version stamps through REDIS_URL
+
     # File Upload
     UPLOAD_DIR: str = "./uploads"
     MAX_UPLOAD_SIZE: int = 5 * 1024 * 1024  # 5MB
+    MAX_VIDEO_UPLOAD_SIZE: int = 50 * 1024 * 1024  # 50MB, single request or resumable session
+    UPLOAD_PARTIAL_DIR: str = "./upload_partial"  # Resumable sessions in progress (keep outside UPLOAD_DIR)
+    UPLOAD_SESSION_TTL_HOURS: int = 24  # Abandoned resumable sessions are deleted after this
+
+    # Where uploads live; records keep "/uploads/<key>" URLs either way (scripts/migrate_media_storage.py moves them)
+    MEDIA_STORAGE_BACKEND: str = "local"  # "local" (UPLOAD_DIR) or "minio" (MEDIA_STORAGE_BUCKET, /uploads redirects there)
+    MEDIA_STORAGE_BUCKET: str = "gynsys-media"  # Public-read; shared with chat media under other prefixes
+    MEDIA_STORAGE_CACHE_DIR: str = "./media_cache"  # "minio": local copies of objects the server reads (PDF logos)
+    DIRECT_UPLOAD_TTL_SECONDS: int = 900  # Presigned PUT URLs and their completion tokens
+    MEDIA_CACHE_MAX_AGE_SECONDS: int = 3600  # Browser/CDN freshness of uploads that may change; media/ and derived/ are immutable
+
+    # Content-addressed media store (UPLOAD_DIR/media): identical image uploads are stored once
+    MEDIA_STORE_ENABLED: bool = True  # False: images go to the per-kind folders under per-upload names
+    MEDIA_GC_GRACE_HOURS: int = 24  # Unreferenced blobs are kept this long (uploads not yet saved on a record)
+
+    # Resized WebP/AVIF variants of uploaded images, built off-request
+    IMAGE_DERIVATIVES_ENABLED: bool = True
+    IMAGE_DERIVATIVE_BACKEND: str = "process"  # "process" (pool in the API process) or "celery" (workers need UPLOAD_DIR or "minio" storage)
+    IMAGE_DERIVATIVE_WORKERS: int = 1
+    IMAGE_DERIVATIVE_WIDTHS: List[int] = [320, 640, 1280]  # Never upscaled past the (cropped) original
+    IMAGE_DERIVATIVE_FORMATS: List[str] = ["avif", "webp"]  # Formats this Pillow build can't encode are skipped
+
+    # Rendered consultation PDFs
+    PDF_CACHE_ENABLED: bool = True
+    PDF_CACHE_BACKEND: str = "local"  # "local" (PDF_CACHE_DIR) or "minio" (PDF_CACHE_BUCKET)
+    PDF_CACHE_DIR: str = "./pdf_cache"  # Keep outside UPLOAD_DIR, which is served publicly
+    PDF_CACHE_BUCKET: str = "gynsys-pdf-cache"
+    PDF_ASSET_CACHE_SIZE: int = 256  # Decoded logos/signatures kept per process (LRU)
+    PDF_ASSET_DPI: int = 200  # Resolution logos/signatures are downscaled to
+    PDF_RENDER_BACKEND: str = "process"  # "process" (pool in the API process) or "celery" (needs a shared PDF store)
+    PDF_RENDER_WORKERS: int = 2
+    PDF_RENDER_TIMEOUT: int = 120  # Seconds an email waits for its PDF before sending the link only
+    PDF_HISTORY_STREAM_THRESHOLD: int = 30  # Longer histories are rendered incrementally to a file
+    PDF_HISTORY_YIELD_PER: int = 50  # Consultations fetched per round trip while streaming
+    PDF_EXPORT_CONCURRENCY: int = 1  # Exports running at once per API process (histories render on the PDF_RENDER_WORKERS pool); more get 429
+    PDF_EXPORT_LINK_TTL_SECONDS: int = 24 * 3600  # Lifetime of an export's download link
+    PDF_EXPORT_RETENTION_HOURS: int = 24  # Export ZIPs and progress files are deleted after this
 
     # Data Encryption
     ENCRYPTION_KEY: str = "r4Pn0YDQH7obBlPFuPHzWj_hEWLotrVUHonpkba_fn8="
@@ -90,6 +176,10 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str = "tu_contraseña_de_aplicacion"
     EMAILS_FROM_EMAIL: str = "no-reply@gynsys.com"
     EMAILS_FROM_NAME: str = "GynSys Notificaciones"
+    SMTP_USE_TLS: bool = True  # STARTTLS after connecting
+    SMTP_TIMEOUT: int = 30
+    SMTP_POOL_SIZE: int = 2  # Authenticated sessions kept open per worker process
+    SMTP_POOL_MAX_IDLE_SECONDS: int = 120  # Drop sessions idle longer than this
     
     # MinIO / S3
     MINIO_ENDPOINT: str = "minio:9000" # Internal Docker URL
@@ -102,6 +192,8 @@ class Settings(BaseSettings):
     VAPID_PRIVATE_KEY: Optional[str] = None
     VAPID_PUBLIC_KEY: Optional[str] = None
     VAPID_CLAIM_EMAIL: str = "admin@gynsys.com"
+    PUSH_MAX_WORKERS: int = 16  # Concurrent push sends per process
+    PUSH_TIMEOUT: int = 10
     
     class Config:
         # Check both local .env and Render's secret path
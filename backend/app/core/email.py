@@ -1,10 +1,11 @@
 import logging
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import List, Optional
 from pydantic import EmailStr
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.core.smtp_pool import get_smtp_pool
 
 logger = logging.getLogger(__name__)
 
@@ -25,15 +26,8 @@ async def send_email(
         part = MIMEText(html_content, "html")
         message.attach(part)
 
-        # Connect to SMTP server
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-            server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.sendmail(
-                settings.EMAILS_FROM_EMAIL,
-                email_to,
-                message.as_string()
-            )
+        # Reuse a pooled SMTP session (blocking I/O off the event loop)
+        await run_in_threadpool(get_smtp_pool().send, message)
             
         logger.info(f"Email sent successfully to {email_to}")
         return True
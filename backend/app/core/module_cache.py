@@ -0,0 +1,189 @@
+"""
+Cache of enabled module codes per tenant.
+
+Lookups go through three layers, cheapest first:
+  1. the request's Session (db.info), so one request never asks twice
+  2. process memory with a TTL
+  3. Redis (optional, MODULE_CACHE_REDIS_ENABLED), shared by API and workers
+and only then hit the Module/TenantModule join.
+
+Writers (app.crud.admin, the doctor profile update) call
+invalidate_tenant_modules after committing. Without Redis other processes
+may serve a stale set for up to MODULE_CACHE_TTL_SECONDS; with Redis the
+in-process layer only lives MODULE_CACHE_LOCAL_TTL_SECONDS.
+"""
+import json
+import logging
+import threading
+import time
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "gynsys:tenant_modules:{}"
+SESSION_KEY = "enabled_module_codes"
+
+
+class ModuleEntitlementCache:
+    def __init__(self, ttl_seconds: int, redis_client=None, local_ttl_seconds: Optional[int] = None):
+        self.redis = redis_client
+        self.ttl = ttl_seconds
+        # Local copies of Redis data only live briefly so invalidations propagate
+        self.local_ttl = local_ttl_seconds if redis_client is not None and local_ttl_seconds is not None else ttl_seconds
+
+        self._entries: Dict[int, Tuple[FrozenSet[str], float]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0, "redis_errors": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, db: Session, tenant_id: int) -> FrozenSet[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry and entry[1] > now:
+                self.counters["hits"] += 1
+                return entry[0]
+
+        codes = self._redis_get(tenant_id)
+        if codes is not None:
+            self._count("redis_hits")
+        else:
+            self._count("misses")
+            codes = load_enabled_module_codes(db, tenant_id)
+            self._redis_set(tenant_id, codes)
+
+        with self._lock:
+            self._entries[tenant_id] = (codes, now + self.local_ttl)
+        return codes
+
+    def invalidate(self, tenant_id: Optional[int] = None):
+        """Forget one tenant, or every tenant when tenant_id is None."""
+        with self._lock:
+            if tenant_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(tenant_id, None)
+            self.counters["invalidations"] += 1
+
+        if self.redis is None:
+            return
+        try:
+            if tenant_id is None:
+                keys = list(self.redis.scan_iter(REDIS_KEY.format("*")))
+                if keys:
+                    self.redis.delete(*keys)
+            else:
+                self.redis.delete(REDIS_KEY.format(tenant_id))
+        except Exception as e:
+            self._count("redis_errors")
+            logger.warning(f"Module cache: Redis invalidation failed for tenant {tenant_id}: {e}")
+
+    def _redis_get(self, tenant_id: int) -> Optional[FrozenSet[str]]:
+        if self.redis is None:
+            return None
+        try:
+            raw = self.redis.get(REDIS_KEY.format(tenant_id))
+        except Exception as e:
+            self._count("redis_errors")
+            logger.warning(f"Module cache: Redis read failed, using DB: {e}")
+            return None
+        return frozenset(json.loads(raw)) if raw is not None else None
+
+    def _redis_set(self, tenant_id: int, codes: FrozenSet[str]):
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(REDIS_KEY.format(tenant_id), json.dumps(sorted(codes)), ex=self.ttl)
+        except Exception as e:
+            self._count("redis_errors")
+            logger.warning(f"Module cache: Redis write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["redis_hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": size,
+            "hit_ratio": round((counters["hits"] + counters["redis_hits"]) / lookups, 4) if lookups else None,
+            "ttl_seconds": self.ttl,
+            "local_ttl_seconds": self.local_ttl,
+            "redis": self.redis is not None,
+        }
+
+
+def load_enabled_module_codes(db: Session, tenant_id: int) -> FrozenSet[str]:
+    """Uncached lookup: codes of modules enabled for the tenant."""
+    from app.db.models.module import Module
+    from app.db.models.tenant_module import TenantModule
+
+    rows = db.query(Module.code).join(
+        TenantModule,
+        TenantModule.module_id == Module.id
+    ).filter(
+        TenantModule.tenant_id == tenant_id,
+        TenantModule.is_enabled == True
+    ).all()
+    return frozenset(code for (code,) in rows)
+
+
+_cache: Optional[ModuleEntitlementCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_module_cache() -> ModuleEntitlementCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            redis_client = None
+            if settings.MODULE_CACHE_REDIS_ENABLED:
+                try:
+                    import redis
+                    redis_client = redis.Redis.from_url(
+                        settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+                    )
+                except Exception as e:
+                    logger.warning(f"Module cache: Redis unavailable, using process memory only: {e}")
+            _cache = ModuleEntitlementCache(
+                settings.MODULE_CACHE_TTL_SECONDS,
+                redis_client=redis_client,
+                local_ttl_seconds=settings.MODULE_CACHE_LOCAL_TTL_SECONDS,
+            )
+        return _cache
+
+
+def get_enabled_module_codes(db: Session, tenant_id: int) -> FrozenSet[str]:
+    """Enabled module codes for a tenant as a frozenset (O(1) membership checks)."""
+    per_request = db.info.setdefault(SESSION_KEY, {})
+    codes = per_request.get(tenant_id)
+    if codes is None:
+        codes = get_module_cache().get(db, tenant_id)
+        per_request[tenant_id] = codes
+    return codes
+
+
+def invalidate_tenant_modules(tenant_id: Optional[int] = None, db: Optional[Session] = None):
+    """Drop cached entitlements after a committed change (tenant_id=None: all tenants)."""
+    if db is not None:
+        if tenant_id is None:
+            db.info.pop(SESSION_KEY, None)
+        else:
+            db.info.get(SESSION_KEY, {}).pop(tenant_id, None)
+    get_module_cache().invalidate(tenant_id)
+
+    # The public page bundle embeds enabled_modules; drop it too so it isn't
+    # rebuilt from a stale set between the commit and this call.
+    from app.core.public_bundle import invalidate_public_bundle
+    invalidate_public_bundle(tenant_id)
+
+
+def module_cache_stats() -> dict:
+    return get_module_cache().stats()
@@ -0,0 +1,173 @@
+"""
+Compiled preconsultation templates per doctor.
+
+Submitting a preconsulta needs the doctor's questions as template_data, an
+id -> question map and a NarrativePreconsultaSummarizer (which indexes the
+question texts and orders). All of that only changes when the doctor edits
+the questionnaire, so it is built once per template version and reused.
+
+Each doctor has a version stamp that the question CRUD functions bump after
+committing; a compiled template is served only while its version is current.
+With PRECONSULTATION_CACHE_REDIS_ENABLED the stamp lives in Redis, so a bump
+in one process retires every process' copy on its next lookup. Without Redis
+other processes may serve a stale template for up to
+PRECONSULTATION_CACHE_TTL_SECONDS.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_VERSION_KEY = "gynsys:preconsultation_template:version:{}"
+
+# Same cap submit_preconsulta has always used
+MAX_QUESTIONS = 200
+
+
+@dataclass
+class CompiledTemplate:
+    doctor_id: int
+    version: int
+    template_data: List[dict]
+    questions_by_id: Dict[str, dict]
+    summarizer: object  # NarrativePreconsultaSummarizer, shared read-only
+
+
+def compile_template(db: Session, doctor_id: int, version: int) -> CompiledTemplate:
+    """Uncached: load the doctor's questions and build every lookup structure."""
+    from app.crud import preconsultation as crud_preconsultation
+    from app.services.summary_generator import NarrativePreconsultaSummarizer
+
+    questions = crud_preconsultation.get_questions(db, doctor_id=doctor_id, limit=MAX_QUESTIONS)
+    template_data = [
+        {
+            "id": q.id,
+            "text": q.text,
+            "type": q.type,
+            "category": q.category,
+            "options": q.options,
+            "order": q.order,
+        }
+        for q in questions
+    ]
+    return CompiledTemplate(
+        doctor_id=doctor_id,
+        version=version,
+        template_data=template_data,
+        questions_by_id={str(q["id"]): q for q in template_data},
+        summarizer=NarrativePreconsultaSummarizer(template_data),
+    )
+
+
+class PreconsultationTemplateCache:
+    def __init__(self, ttl_seconds: int, redis_client=None):
+        self.redis = redis_client
+        self.ttl = ttl_seconds
+
+        self._entries: Dict[int, tuple] = {}  # doctor_id -> (CompiledTemplate, expires_at)
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0, "redis_errors": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def current_version(self, doctor_id: int) -> int:
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(REDIS_VERSION_KEY.format(doctor_id))
+                return int(raw) if raw is not None else 0
+            except Exception as e:
+                self._count("redis_errors")
+                logger.warning(f"Preconsultation template cache: Redis read failed, using local version: {e}")
+        with self._lock:
+            return self._versions.get(doctor_id, 0)
+
+    def get(self, db: Session, doctor_id: int) -> CompiledTemplate:
+        # Read the stamp before loading: a bump during the load retires this copy
+        version = self.current_version(doctor_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(doctor_id)
+            if entry and entry[0].version == version and (self.redis is not None or entry[1] > now):
+                self.counters["hits"] += 1
+                return entry[0]
+            self.counters["misses"] += 1
+
+        compiled = compile_template(db, doctor_id, version)
+        with self._lock:
+            self._entries[doctor_id] = (compiled, now + self.ttl)
+        return compiled
+
+    def bump(self, doctor_id: int):
+        """The doctor's questions changed: new version, drop the compiled copy."""
+        with self._lock:
+            self._versions[doctor_id] = self._versions.get(doctor_id, 0) + 1
+            self._entries.pop(doctor_id, None)
+            self.counters["invalidations"] += 1
+
+        if self.redis is None:
+            return
+        try:
+            self.redis.incr(REDIS_VERSION_KEY.format(doctor_id))
+        except Exception as e:
+            self._count("redis_errors")
+            logger.warning(f"Preconsultation template cache: Redis version bump failed for doctor {doctor_id}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": size,
+            "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else None,
+            "ttl_seconds": self.ttl,
+            "redis": self.redis is not None,
+        }
+
+
+_cache: Optional[PreconsultationTemplateCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_template_cache() -> PreconsultationTemplateCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            redis_client = None
+            if settings.PRECONSULTATION_CACHE_REDIS_ENABLED:
+                try:
+                    import redis
+                    redis_client = redis.Redis.from_url(
+                        settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+                    )
+                except Exception as e:
+                    logger.warning(f"Preconsultation template cache: Redis unavailable, using process memory only: {e}")
+            _cache = PreconsultationTemplateCache(
+                settings.PRECONSULTATION_CACHE_TTL_SECONDS, redis_client=redis_client
+            )
+        return _cache
+
+
+def get_compiled_template(db: Session, doctor_id: int) -> CompiledTemplate:
+    return get_template_cache().get(db, doctor_id)
+
+
+def bump_template_version(doctor_id: Optional[int]):
+    """Call after committing a change to the doctor's preconsultation questions."""
+    if doctor_id is not None:
+        get_template_cache().bump(doctor_id)
+
+
+def template_cache_stats() -> dict:
+    return get_template_cache().stats()
@@ -0,0 +1,326 @@
+"""
+Precomputed public landing-page bundle per doctor slug.
+
+The bundle holds everything a tenant page loads (profile, gallery,
+testimonials, FAQs, services, locations, recommendations, blog posts, mega
+menu, online consultation settings), serialized once with the same schemas
+as the individual public endpoints. Entries live in process memory and,
+when PUBLIC_BUNDLE_REDIS_ENABLED, in Redis; each carries a content ETag.
+
+Invalidation is automatic: a Session hook collects the doctor ids touched
+by any flush of the content models below and drops their entries after
+commit, so no endpoint has to remember to do it.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import asc, desc, event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "gynsys:public_bundle:{}"
+REDIS_SLUG_KEY = "gynsys:public_bundle:slug:{}"
+SESSION_KEY = "public_bundle_dirty"
+
+# Model class name -> attribute holding the doctor id. "*" drops every entry.
+WATCHED_MODELS = {
+    "Doctor": "id",
+    "DoctorCertification": "doctor_id",
+    "Location": "doctor_id",
+    "GalleryImage": "doctor_id",
+    "ImageDerivative": "doctor_id",
+    "Testimonial": "doctor_id",
+    "FAQ": "doctor_id",
+    "Service": "doctor_id",
+    "BlogPost": "doctor_id",
+    "Recommendation": "tenant_id",
+    "RecommendationCategory": "tenant_id",
+    "OnlineConsultationSettings": "doctor_id",
+    "TenantModule": "tenant_id",
+    "Module": "*",
+}
+
+# Doctor columns that never show up in the bundle
+IGNORED_DOCTOR_CHANGES = {
+    "visitor_count", "password_hash", "reset_password_token", "reset_password_expires", "updated_at",
+}
+
+
+def build_public_bundle(db: Session, doctor) -> dict:
+    """Serialize every public section for `doctor` (JSON-ready dict)."""
+    from app.db.models.faq import FAQ
+    from app.db.models.gallery import GalleryImage
+    from app.db.models.location import Location
+    from app.db.models.recommendation import Recommendation, RecommendationCategory
+    from app.db.models.testimonial import Testimonial
+    from app.blog import crud as blog_crud, schemas as blog_schemas
+    from app.blog.models import BlogPost
+    from app.crud import service as crud_service
+    from app.schemas import location as location_schemas, recommendation as recommendation_schemas
+    from app.schemas import online_consultation as online_schemas
+    from app.schemas.doctor import DoctorPublic
+    from app.schemas.faq import FAQPublic
+    from app.schemas.gallery import GalleryImagePublic
+    from app.schemas.service import Service as ServiceSchema
+    from app.schemas.testimonial import TestimonialPublic
+    from app.api.v1.endpoints.online_consultation import get_public_settings_for_doctor
+    from app.services.image_derivatives import load_variant_index
+
+    def dump(schema, items):
+        return [schema.model_validate(item).model_dump(mode="json") for item in items]
+
+    gallery = db.query(GalleryImage).filter(
+        GalleryImage.doctor_id == doctor.id,
+        GalleryImage.is_active == True
+    ).order_by(asc(GalleryImage.display_order), asc(GalleryImage.created_at)).all()
+
+    testimonials = db.query(Testimonial).filter(
+        Testimonial.doctor_id == doctor.id,
+        Testimonial.is_approved == True
+    ).order_by(desc(Testimonial.is_featured), desc(Testimonial.created_at)).all()
+
+    faqs = db.query(FAQ).filter(
+        FAQ.doctor_id == doctor.id
+    ).order_by(FAQ.display_order.asc(), FAQ.created_at.asc()).all()
+
+    locations = db.query(Location).filter(Location.doctor_id == doctor.id, Location.is_active == True).all()
+
+    recommendations = db.query(Recommendation).filter(
+        Recommendation.tenant_id == doctor.id,
+        Recommendation.is_active == True
+    ).order_by(Recommendation.id.desc()).all()
+    categories = db.query(RecommendationCategory).filter(RecommendationCategory.tenant_id == doctor.id).all()
+
+    menu = db.query(BlogPost).filter(
+        BlogPost.doctor_id == doctor.id,
+        BlogPost.is_published == True,
+        BlogPost.is_in_menu == True
+    ).order_by(BlogPost.menu_weight.desc()).all()
+
+    online_settings = get_public_settings_for_doctor(db, doctor.id)
+
+    # Resized variants of the profile images and the gallery, in one query
+    variants = load_variant_index(db, [doctor.logo_url, doctor.photo_url] + [image.image_url for image in gallery])
+    profile = DoctorPublic.model_validate(doctor)
+    profile.logo_variants = variants.get(doctor.logo_url)
+    profile.photo_variants = variants.get(doctor.photo_url)
+    public_gallery = []
+    for image in gallery:
+        public_image = GalleryImagePublic.model_validate(image)
+        public_image.variants = variants.get(image.image_url, image.crop)
+        public_gallery.append(public_image.model_dump(mode="json"))
+
+    return {
+        "profile": profile.model_dump(mode="json"),
+        "gallery": public_gallery,
+        "testimonials": dump(TestimonialPublic, testimonials),
+        "faqs": dump(FAQPublic, faqs),
+        "services": dump(ServiceSchema, crud_service.get_active_services_by_doctor(db, doctor_id=doctor.id)),
+        "locations": dump(location_schemas.Location, locations),
+        "recommendations": dump(recommendation_schemas.Recommendation, recommendations),
+        "recommendation_categories": dump(recommendation_schemas.Category, categories),
+        "blog_posts": dump(blog_schemas.BlogPostResponse, blog_crud.get_public_posts_by_doctor(db, doctor_id=doctor.id)),
+        "mega_menu": dump(blog_schemas.MegaMenuItem, menu),
+        "online_consultation": online_schemas.OnlineConsultationSettings.model_validate(online_settings).model_dump(mode="json"),
+    }
+
+
+class PublicBundleCache:
+    """slug -> (doctor_id, payload bytes, etag), in memory with a TTL and optionally in Redis."""
+
+    def __init__(self, ttl_seconds: int, redis_client=None, local_ttl_seconds: Optional[int] = None):
+        self.redis = redis_client
+        self.ttl = ttl_seconds
+        self.local_ttl = local_ttl_seconds if redis_client is not None and local_ttl_seconds is not None else ttl_seconds
+
+        self._entries: Dict[str, Tuple[int, bytes, str, float]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0}
+        # Bumped on every invalidation so a bundle built from pre-commit data is not stored
+        self.generation = 0
+
+    def get(self, slug: str) -> Optional[Tuple[int, bytes, str]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry and entry[3] > now:
+                self.counters["hits"] += 1
+                return entry[:3]
+
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(REDIS_KEY.format(slug))
+            except Exception as e:
+                logger.warning(f"Public bundle cache: Redis read failed: {e}")
+                raw = None
+            if raw is not None:
+                doctor_id, etag, payload = raw.split(b"\n", 2)
+                entry = (int(doctor_id), payload, etag.decode())
+                with self._lock:
+                    self.counters["redis_hits"] += 1
+                    self._entries[slug] = entry + (now + self.local_ttl,)
+                return entry
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, slug: str, doctor_id: int, payload: bytes, etag: str, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[slug] = (doctor_id, payload, etag, time.monotonic() + self.local_ttl)
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.set(REDIS_KEY.format(slug), f"{doctor_id}\n{etag}\n".encode() + payload, ex=self.ttl)
+                pipe.set(REDIS_SLUG_KEY.format(doctor_id), slug, ex=self.ttl)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Public bundle cache: Redis write failed: {e}")
+
+    def invalidate(self, doctor_id: Optional[int] = None):
+        """Drop a doctor's entry (whatever its slug), or everything when doctor_id is None."""
+        with self._lock:
+            self.counters["invalidations"] += 1
+            self.generation += 1
+            if doctor_id is None:
+                self._entries.clear()
+            else:
+                for slug in [s for s, entry in self._entries.items() if entry[0] == doctor_id]:
+                    del self._entries[slug]
+
+        if self.redis is None:
+            return
+        try:
+            if doctor_id is None:
+                keys = list(self.redis.scan_iter(REDIS_KEY.format("*")))
+                if keys:
+                    self.redis.delete(*keys)
+            else:
+                slug = self.redis.get(REDIS_SLUG_KEY.format(doctor_id))
+                if slug is not None:
+                    self.redis.delete(REDIS_KEY.format(slug.decode()), REDIS_SLUG_KEY.format(doctor_id))
+        except Exception as e:
+            logger.warning(f"Public bundle cache: Redis invalidation failed for doctor {doctor_id}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "entries": len(self._entries), "redis": self.redis is not None}
+
+
+_cache: Optional[PublicBundleCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_public_bundle_cache() -> PublicBundleCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            redis_client = None
+            if settings.PUBLIC_BUNDLE_REDIS_ENABLED:
+                try:
+                    import redis
+                    redis_client = redis.Redis.from_url(
+                        settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+                    )
+                except Exception as e:
+                    logger.warning(f"Public bundle cache: Redis unavailable, using process memory only: {e}")
+            _cache = PublicBundleCache(
+                settings.PUBLIC_BUNDLE_TTL_SECONDS,
+                redis_client=redis_client,
+                local_ttl_seconds=settings.PUBLIC_BUNDLE_LOCAL_TTL_SECONDS,
+            )
+        return _cache
+
+
+def get_public_bundle(db: Session, slug: str) -> Optional[Tuple[int, bytes, str]]:
+    """
+    (doctor_id, JSON payload, ETag) for an active doctor's slug, or None.
+    Built on a miss; later calls cost no queries.
+    """
+    cache = get_public_bundle_cache()
+    cached = cache.get(slug)
+    if cached is not None:
+        return cached
+
+    from app.db.models.doctor import Doctor
+
+    generation = cache.generation
+    doctor = db.query(Doctor).filter(Doctor.slug_url == slug).first()
+    if not doctor or not doctor.is_active:
+        return None
+
+    payload = json.dumps(build_public_bundle(db, doctor), separators=(",", ":"), sort_keys=True).encode()
+    etag = f'"{hashlib.sha256(payload).hexdigest()[:32]}"'
+    cache.put(slug, doctor.id, payload, etag, generation)
+    return doctor.id, payload, etag
+
+
+def invalidate_public_bundle(doctor_id: Optional[int] = None):
+    get_public_bundle_cache().invalidate(doctor_id)
+
+
+def _touched_doctor_ids(session: Session) -> set:
+    from sqlalchemy import inspect as sa_inspect
+
+    touched = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        name = type(obj).__name__
+        if name == "BlogPostSEO":
+            # Only knows its post; fall back to dropping everything if the post isn't loaded
+            touched.add(_post_owner(session, obj.post_id) or "*")
+            continue
+        attr = WATCHED_MODELS.get(name)
+        if attr is None:
+            continue
+        if attr == "*":
+            touched.add("*")
+            continue
+        if name == "Doctor" and obj in session.dirty:
+            changed = {a.key for a in sa_inspect(obj).attrs if a.history.has_changes()}
+            if changed and changed <= IGNORED_DOCTOR_CHANGES:
+                continue
+        doctor_id = getattr(obj, attr, None)
+        if doctor_id:
+            touched.add(doctor_id)
+    return touched
+
+
+def _post_owner(session: Session, post_id: int) -> Optional[int]:
+    from app.blog.models import BlogPost
+
+    post = session.identity_map.get(BlogPost.__mapper__.identity_key_from_primary_key((post_id,)))
+    return post.doctor_id if post is not None else None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_public_bundle_changes(session, flush_context):
+    touched = _touched_doctor_ids(session)
+    if touched:
+        session.info.setdefault(SESSION_KEY, set()).update(touched)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    touched = session.info.pop(SESSION_KEY, None)
+    if not touched:
+        return
+    if "*" in touched:
+        invalidate_public_bundle()
+        return
+    for doctor_id in touched:
+        invalidate_public_bundle(doctor_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop(SESSION_KEY, None)
+
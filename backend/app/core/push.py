@@ -1,37 +1,184 @@
-import json
-from pywebpush import webpush, WebPushException
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from py_vapid import Vapid
+from pywebpush import WebPusher
+from requests.adapters import HTTPAdapter
+from sqlalchemy import delete
+
 from app.core.config import settings
+from app.db.models.push_subscription import PushSubscription
+
+logger = logging.getLogger(__name__)
+
+# Delivery outcomes returned by WebPushEngine
+DELIVERED = "delivered"
+EXPIRED = "expired"
+FAILED = "failed"
+
+VAPID_TOKEN_LIFETIME = 12 * 60 * 60  # Max allowed by push services is 24h
+VAPID_RENEW_MARGIN = 30 * 60  # Re-sign this long before exp
+
 
 def send_web_push(subscription_info: dict, message_body: str, ttl: int = 86400):
     """
     Send a Web Push notification to a user.
-    
+
     Args:
         subscription_info: Dictionary containing endpoint and keys (from CycleUser.push_subscription)
         message_body: String content (usually JSON) to send.
         ttl: Time to live in seconds.
-        
+
     Returns:
         (bool, str): (Success, Error Message if any)
     """
-    if not settings.VAPID_PRIVATE_KEY or not settings.VAPID_CLAIM_EMAIL:
+    engine = get_push_engine()
+    if engine is None:
         return False, "VAPID configuration missing"
 
-    try:
-        webpush(
-            subscription_info=subscription_info,
-            data=message_body,
-            vapid_private_key=settings.VAPID_PRIVATE_KEY,
-            vapid_claims={
-                "sub": f"mailto:{settings.VAPID_CLAIM_EMAIL}"
-            },
-            ttl=ttl
-        )
+    status, error = engine.send(subscription_info, message_body, ttl=ttl)
+    if status == DELIVERED:
         return True, None
-    except WebPushException as ex:
-        # Handle expired subscriptions (410 Gone) or other errors
-        if ex.response.status_code == 410:
-             return False, "Subscription expired"
-        return False, f"WebPush Error: {ex.message}"
-    except Exception as e:
-        return False, str(e)
+    if status == EXPIRED:
+        return False, "Subscription expired"
+    return False, f"WebPush Error: {error}"
+
+
+class WebPushEngine:
+    """
+    Concurrent Web Push sender.
+
+    - The VAPID key is parsed once and the signed Authorization header is
+      cached per push-service origin until shortly before its `exp`.
+    - One keep-alive requests.Session per origin, so FCM/Mozilla/Apple
+      connections (and their TLS handshakes) are reused across sends.
+    - send_many encrypts and posts payloads for many subscriptions from a
+      bounded thread pool.
+    """
+
+    def __init__(self, private_key: str, claim_email: str, max_workers: int = 16, timeout: int = 10):
+        self.vapid = Vapid.from_string(private_key=private_key)
+        self.claim_sub = f"mailto:{claim_email}"
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.pid = os.getpid()
+
+        self._vapid_headers: Dict[str, Tuple[dict, int]] = {}
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def origin(endpoint: str) -> str:
+        url = urlparse(endpoint)
+        return f"{url.scheme}://{url.netloc}"
+
+    def vapid_headers(self, origin: str) -> dict:
+        """Signed VAPID headers for `origin`, re-signed only when close to expiry."""
+        now = int(time.time())
+        with self._lock:
+            cached = self._vapid_headers.get(origin)
+            if cached and cached[1] - VAPID_RENEW_MARGIN > now:
+                return dict(cached[0])
+
+            exp = now + VAPID_TOKEN_LIFETIME
+            headers = self.vapid.sign({"sub": self.claim_sub, "aud": origin, "exp": exp})
+            self._vapid_headers[origin] = (headers, exp)
+            return dict(headers)
+
+    def session(self, origin: str) -> requests.Session:
+        with self._lock:
+            session = self._sessions.get(origin)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[origin] = session
+            return session
+
+    def send(self, subscription_info: dict, data: str, ttl: int = 0) -> Tuple[str, Optional[str]]:
+        """
+        Encrypt and send one payload.
+        Returns (DELIVERED | EXPIRED | FAILED, error message).
+        """
+        try:
+            origin = self.origin(subscription_info["endpoint"])
+            response = WebPusher(
+                subscription_info, requests_session=self.session(origin)
+            ).send(
+                data,
+                headers=self.vapid_headers(origin),
+                ttl=ttl,
+                content_encoding="aes128gcm",
+                timeout=self.timeout,
+            )
+        except Exception as e:
+            return FAILED, str(e)
+
+        if response.status_code <= 202:
+            return DELIVERED, None
+        if response.status_code in [404, 410]:
+            return EXPIRED, f"{response.status_code} {response.reason}"
+        return FAILED, f"Push failed: {response.status_code} {response.reason}"
+
+    def send_many(self, jobs: List[Tuple[dict, str]], ttl: int = 0) -> List[Tuple[str, Optional[str]]]:
+        """
+        Send (subscription_info, data) jobs concurrently.
+        Results come back in the same order as `jobs`.
+        """
+        if not jobs:
+            return []
+        if len(jobs) == 1:
+            return [self.send(jobs[0][0], jobs[0][1], ttl)]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+            return list(pool.map(lambda job: self.send(job[0], job[1], ttl), jobs))
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
+
+
+_engine: Optional[WebPushEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_push_engine() -> Optional[WebPushEngine]:
+    """
+    Process-wide engine built from settings, or None when VAPID is not configured.
+    Re-created after a fork so Celery prefork children never share sockets.
+    """
+    global _engine
+    if not settings.VAPID_PRIVATE_KEY or not settings.VAPID_CLAIM_EMAIL:
+        return None
+    with _engine_lock:
+        if _engine is None or _engine.pid != os.getpid():
+            _engine = WebPushEngine(
+                settings.VAPID_PRIVATE_KEY,
+                settings.VAPID_CLAIM_EMAIL,
+                max_workers=settings.PUSH_MAX_WORKERS,
+                timeout=settings.PUSH_TIMEOUT,
+            )
+        return _engine
+
+
+def to_subscription_info(sub) -> dict:
+    """pywebpush subscription dict from a PushSubscription row (or a dict with the same keys)."""
+    if isinstance(sub, dict):
+        return {"endpoint": sub["endpoint"], "keys": {"p256dh": sub["p256dh"], "auth": sub["auth"]}}
+    return {"endpoint": sub.endpoint, "keys": {"p256dh": sub.p256dh, "auth": sub.auth}}
+
+
+def delete_expired_subscriptions(db, subscription_ids: list):
+    """Remove 404/410 subscriptions in a single DELETE."""
+    if not subscription_ids:
+        return
+    db.execute(delete(PushSubscription).where(PushSubscription.id.in_(subscription_ids)))
+    db.commit()
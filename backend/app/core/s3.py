@@ -16,10 +16,19 @@ def get_s3_client():
         region_name="us-east-1" # MinIO default
     )
 
-def ensure_bucket_exists():
-    """Ensure the media bucket exists and has public-read policy for chat media."""
+def public_endpoint_url(url: str) -> str:
+    """Presigned URLs are signed for the internal endpoint; point them at the one browsers reach."""
+    # Hack: If the generated URL uses the internal docker hostname (minio:9000),
+    # replace it with localhost:9000 or the Public Endpoint setting.
+    if "minio:9000" in url and settings.MINIO_PUBLIC_ENDPOINT:
+         url = url.replace("http://minio:9000", settings.MINIO_PUBLIC_ENDPOINT)
+         url = url.replace("minio:9000", settings.MINIO_PUBLIC_ENDPOINT.replace("http://", ""))
+    return url
+
+def ensure_bucket_exists(bucket_name: str = None):
+    """Ensure the media bucket exists and has public-read policy for chat media and uploads."""
     s3 = get_s3_client()
-    bucket_name = settings.MINIO_BUCKET
+    bucket_name = bucket_name or settings.MINIO_BUCKET
     
     try:
         s3.head_bucket(Bucket=bucket_name)
@@ -79,27 +88,25 @@ def create_presigned_upload(object_name: str, content_type: str = None):
             ExpiresIn=3600
         )
         
-        # Hack: If the generated URL uses the internal docker hostname (minio:9000), 
-        # replace it with localhost:9000 or the Public Endpoint setting.
-        if "minio:9000" in url and settings.MINIO_PUBLIC_ENDPOINT:
-             url = url.replace("http://minio:9000", settings.MINIO_PUBLIC_ENDPOINT)
-             url = url.replace("minio:9000", settings.MINIO_PUBLIC_ENDPOINT.replace("http://", ""))
-             
-        return url
+        return public_endpoint_url(url)
     except Exception as e:
         logger.error(f"Error generating presigned URL: {e}")
         return None
 
-def create_presigned_get(object_name: str):
+def create_presigned_get(object_name: str, bucket: str = None, expires_in: int = 3600 * 24, filename: str = None):
     """
     Generate a presigned URL to read a file.
+    bucket defaults to the media bucket; filename sets the download name.
     """
     s3 = get_s3_client()
     try:
+        params = {'Bucket': bucket or settings.MINIO_BUCKET, 'Key': object_name}
+        if filename:
+            params['ResponseContentDisposition'] = f'attachment; filename="{filename}"'
         url = s3.generate_presigned_url(
             'get_object',
-            Params={'Bucket': settings.MINIO_BUCKET, 'Key': object_name},
-            ExpiresIn=3600 * 24 # 24 hours
+            Params=params,
+            ExpiresIn=expires_in # 24 hours by default
         )
         # Similar Hack for hostname replacement
         if "minio:9000" in url and settings.MINIO_PUBLIC_ENDPOINT:
@@ -0,0 +1,177 @@
+"""
+Per-process pool of authenticated SMTP sessions.
+
+Opening an SMTP session costs a TCP connect, EHLO, a STARTTLS handshake and
+AUTH before a single message goes out. The pool keeps a few sessions open,
+checks them with NOOP before reuse and reconnects transparently when the
+server has dropped them.
+"""
+import atexit
+import logging
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+from email.message import Message
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPConnectionPool:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        use_tls: bool = True,
+        max_size: int = 2,
+        max_idle_seconds: int = 120,
+        timeout: int = 30,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.timeout = timeout
+
+        self._idle = deque()  # (connection, last_used)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            conn.starttls()
+        if self.user:
+            conn.login(self.user, self.password)
+        return conn
+
+    @staticmethod
+    def _close(conn: smtplib.SMTP):
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _is_alive(self, conn: smtplib.SMTP) -> bool:
+        try:
+            return conn.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            if time.monotonic() - last_used > self.max_idle_seconds or not self._is_alive(conn):
+                self._close(conn)
+                continue
+            return conn
+        return self._connect()
+
+    def _checkin(self, conn: smtplib.SMTP):
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def send(self, msg: Message):
+        """Send one message, reconnecting once if the session was dropped; raises on failure."""
+        error = self.send_many([msg])[0][1]
+        if error:
+            raise error
+
+    def send_many(self, messages: List[Message]) -> List[Tuple[bool, Optional[Exception]]]:
+        """
+        Send several messages through a single borrowed session.
+        Returns one (ok, exception) pair per message. A dropped session is
+        re-opened once per message; a rejected recipient or message fails
+        only that message. If no session can be opened at all, the rest of
+        the batch fails at once instead of waiting out a timeout per message.
+        """
+        results = []
+        self._slots.acquire()
+        conn = None
+        try:
+            for msg in messages:
+                for attempt in range(2):
+                    if conn is None:
+                        try:
+                            conn = self._checkout()
+                        except Exception as e:
+                            logger.error(f"SMTP connect to {self.host}:{self.port} failed: {e}")
+                            results.extend([(False, e)] * (len(messages) - len(results)))
+                            return results
+                    try:
+                        conn.send_message(msg)
+                        results.append((True, None))
+                        break
+                    except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as e:
+                        self._close(conn)
+                        conn = None
+                        if attempt:
+                            results.append((False, e))
+                    except smtplib.SMTPException as e:
+                        # Recipient/message level rejection: the session stays usable
+                        results.append((False, e))
+                        break
+                    except OSError as e:
+                        # Socket error mid-send (SMTPException is an OSError too, hence last)
+                        self._close(conn)
+                        conn = None
+                        if attempt:
+                            results.append((False, e))
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+            self._slots.release()
+        return results
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._close(conn)
+
+
+_pool: Optional[SMTPConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    """
+    Pool for the current process, built from settings.
+    Re-created after a fork so Celery prefork children never share sockets.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = SMTPConnectionPool(
+                settings.SMTP_HOST,
+                settings.SMTP_PORT,
+                user=settings.SMTP_USER,
+                password=settings.SMTP_PASSWORD,
+                use_tls=settings.SMTP_USE_TLS,
+                max_size=settings.SMTP_POOL_SIZE,
+                max_idle_seconds=settings.SMTP_POOL_MAX_IDLE_SECONDS,
+                timeout=settings.SMTP_TIMEOUT,
+            )
+        return _pool
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None and _pool.pid == os.getpid():
+        _pool.close_all()
@@ -0,0 +1,144 @@
+"""
+Buffered profile visitor counts.
+
+Public page views only bump a counter (process memory, or a Redis hash when
+VISITOR_COUNT_REDIS_ENABLED so every API worker shares it).
+visitor_flush_scheduler writes the accumulated deltas to doctors.visitor_count
+every VISITOR_FLUSH_INTERVAL_SECONDS with one UPDATE per doctor, instead of a
+row-locking UPDATE + COMMIT per view.
+"""
+import asyncio
+import logging
+import threading
+import uuid
+from collections import Counter
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, update
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "gynsys:visitor_counts"
+
+
+class VisitorCounter:
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._pending = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, doctor_id: int):
+        if self.redis is not None:
+            try:
+                self.redis.hincrby(REDIS_KEY, doctor_id, 1)
+                return
+            except Exception as e:
+                logger.warning(f"Visitor counter: Redis unavailable, buffering in memory: {e}")
+        with self._lock:
+            self._pending[doctor_id] += 1
+
+    def _drain(self) -> Dict[int, int]:
+        with self._lock:
+            counts, self._pending = dict(self._pending), Counter()
+
+        if self.redis is not None:
+            # RENAME is atomic: visits recorded meanwhile go to a fresh hash
+            drain_key = f"{REDIS_KEY}:flush:{uuid.uuid4().hex}"
+            try:
+                self.redis.rename(REDIS_KEY, drain_key)
+                for doctor_id, count in self.redis.hgetall(drain_key).items():
+                    counts[int(doctor_id)] = counts.get(int(doctor_id), 0) + int(count)
+                self.redis.delete(drain_key)
+            except Exception as e:
+                # "no such key" simply means nothing was recorded
+                if "no such key" not in str(e).lower():
+                    logger.warning(f"Visitor counter: Redis drain failed: {e}")
+        return counts
+
+    def _restore(self, counts: Dict[int, int]):
+        with self._lock:
+            self._pending.update(counts)
+
+    def flush(self, db) -> int:
+        """Add buffered visits to doctors.visitor_count. Returns visits written."""
+        from app.db.models.doctor import Doctor
+
+        counts = self._drain()
+        if not counts:
+            return 0
+
+        stmt = (
+            update(Doctor.__table__)
+            .where(Doctor.__table__.c.id == bindparam("doctor_id"))
+            .values(visitor_count=Doctor.__table__.c.visitor_count + bindparam("visits"))
+        )
+        try:
+            db.execute(stmt, [{"doctor_id": k, "visits": v} for k, v in counts.items()])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            # Keep them for the next round rather than losing page views
+            self._restore(counts)
+            logger.error(f"Visitor counter: flush failed: {e}")
+            return 0
+        return sum(counts.values())
+
+    def pending(self, doctor_id: int) -> int:
+        """Visits not yet flushed (this process, plus Redis when enabled)."""
+        with self._lock:
+            count = self._pending.get(doctor_id, 0)
+        if self.redis is not None:
+            try:
+                count += int(self.redis.hget(REDIS_KEY, doctor_id) or 0)
+            except Exception:
+                pass
+        return count
+
+
+_counter: Optional[VisitorCounter] = None
+_counter_lock = threading.Lock()
+
+
+def get_visitor_counter() -> VisitorCounter:
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            redis_client = None
+            if settings.VISITOR_COUNT_REDIS_ENABLED:
+                try:
+                    import redis
+                    redis_client = redis.Redis.from_url(
+                        settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5
+                    )
+                except Exception as e:
+                    logger.warning(f"Visitor counter: Redis unavailable, using process memory: {e}")
+            _counter = VisitorCounter(redis_client)
+        return _counter
+
+
+def record_visit(doctor_id: int):
+    get_visitor_counter().record(doctor_id)
+
+
+def flush_visitor_counts() -> int:
+    from app.db.base import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return get_visitor_counter().flush(db)
+    finally:
+        db.close()
+
+
+async def visitor_flush_scheduler(interval_seconds: int = 60):
+    """Periodically flush buffered visits (runs inside the API process)."""
+    logger.info(f"Visitor count flush scheduled every {interval_seconds}s")
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await loop.run_in_executor(None, flush_visitor_counts)
+        except Exception as e:
+            logger.error(f"Visitor count flush error: {e}")
@@ -8,6 +8,6 @@ from .admin import (
     # Module operations
     get_module, get_module_by_code, get_modules, create_module, update_module, delete_module,
     # Tenant-Module operations
-    get_tenant_modules, get_enabled_tenant_modules, enable_tenant_module,
+    get_tenant_modules, get_enabled_tenant_modules, get_enabled_tenant_module_codes, enable_tenant_module,
     disable_tenant_module, update_tenant_modules
 )
\ No newline at end of file
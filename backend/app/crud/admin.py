@@ -5,6 +5,7 @@ from typing import List, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from app.db.models import Doctor, Plan, Module, TenantModule, FAQ, Testimonial, GalleryImage
+from app.core.module_cache import get_enabled_module_codes, invalidate_tenant_modules
 from app.schemas.admin import (
     TenantCreate, TenantUpdate, TenantStatusUpdate,
     PlanCreate, PlanUpdate,
@@ -240,6 +241,7 @@ def update_tenant_status(db: Session, tenant_id: int, status_update: TenantStatu
             db_tenant.is_active = False
             
         db.commit()
+        invalidate_tenant_modules(tenant_id, db)
         db.refresh(db_tenant)
     return db_tenant
 
@@ -249,6 +251,7 @@ def delete_tenant(db: Session, tenant_id: int) -> bool:
     if db_tenant:
         db.delete(db_tenant)
         db.commit()
+        invalidate_tenant_modules(tenant_id, db)
         return True
     return False
 
@@ -324,6 +327,8 @@ def update_module(db: Session, module_id: int, module_update: ModuleUpdate) -> O
         for field, value in update_data.items():
             setattr(db_module, field, value)
         db.commit()
+        # A renamed code changes every tenant's set
+        invalidate_tenant_modules(db=db)
         db.refresh(db_module)
     return db_module
 
@@ -333,6 +338,7 @@ def delete_module(db: Session, module_id: int) -> bool:
     if db_module:
         db.delete(db_module)
         db.commit()
+        invalidate_tenant_modules(db=db)
         return True
     return False
 
@@ -342,6 +348,11 @@ def get_tenant_modules(db: Session, tenant_id: int) -> List[TenantModule]:
     return db.query(TenantModule).filter(TenantModule.tenant_id == tenant_id).all()
 
 
+def get_enabled_tenant_module_codes(db: Session, tenant_id: int) -> frozenset:
+    """Codes of the tenant's enabled modules, served from the entitlement cache."""
+    return get_enabled_module_codes(db, tenant_id)
+
+
 def get_enabled_tenant_modules(db: Session, tenant_id: int) -> List[Module]:
     """Get all enabled modules for a tenant."""
     return (
@@ -362,6 +373,7 @@ def enable_tenant_module(db: Session, tenant_id: int, module_id: int) -> TenantM
     if existing:
         existing.is_enabled = True
         db.commit()
+        invalidate_tenant_modules(tenant_id, db)
         db.refresh(existing)
         return existing
     else:
@@ -372,6 +384,7 @@ def enable_tenant_module(db: Session, tenant_id: int, module_id: int) -> TenantM
         )
         db.add(tenant_module)
         db.commit()
+        invalidate_tenant_modules(tenant_id, db)
         db.refresh(tenant_module)
         return tenant_module
 
@@ -385,6 +398,7 @@ def disable_tenant_module(db: Session, tenant_id: int, module_id: int) -> bool:
     if tenant_module:
         tenant_module.is_enabled = False
         db.commit()
+        invalidate_tenant_modules(tenant_id, db)
         return True
     return False
 
@@ -409,6 +423,8 @@ def update_tenant_modules(db: Session, tenant_id: int, module_updates: List[dict
         if tenant_module:
             updated_modules.append(tenant_module)
 
+    # enable/disable already invalidated per module; covers an empty update list too
+    invalidate_tenant_modules(tenant_id, db)
     return updated_modules
 
 
@@ -1,5 +1,6 @@
 from typing import List, Optional
 from sqlalchemy.orm import Session
+from app.core.preconsultation_templates import bump_template_version
 from app.db.models.preconsultation import PreconsultationQuestion
 from app.schemas.preconsultation import PreconsultationQuestionCreate, PreconsultationQuestionUpdate
 
@@ -15,6 +16,7 @@ def create_question(db: Session, question: PreconsultationQuestionCreate, doctor
     db.add(db_question)
     db.commit()
     db.refresh(db_question)
+    bump_template_version(doctor_id)
     return db_question
 
 def update_question(db: Session, question_id: str, question: PreconsultationQuestionUpdate):
@@ -22,6 +24,7 @@ def update_question(db: Session, question_id: str, question: PreconsultationQues
     if not db_question:
         return None
     
+    previous_doctor_id = db_question.doctor_id
     update_data = question.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_question, key, value)
@@ -29,16 +32,22 @@ def update_question(db: Session, question_id: str, question: PreconsultationQues
     db.add(db_question)
     db.commit()
     db.refresh(db_question)
+    bump_template_version(db_question.doctor_id)
+    if previous_doctor_id != db_question.doctor_id:
+        bump_template_version(previous_doctor_id)
     return db_question
 
 def delete_question(db: Session, question_id: str):
     db_question = get_question(db, question_id)
     if db_question:
+        doctor_id = db_question.doctor_id
         db.delete(db_question)
         db.commit()
+        bump_template_version(doctor_id)
     return db_question
 
 def delete_all_questions(db: Session, doctor_id: int):
     num_deleted = db.query(PreconsultationQuestion).filter(PreconsultationQuestion.doctor_id == doctor_id).delete()
     db.commit()
+    bump_template_version(doctor_id)
     return num_deleted
@@ -1,9 +1,21 @@
 #logic.py
 from datetime import date, timedelta
+from typing import Iterator
 
-def calculate_predictions(last_period_start: date, cycle_length: int = 28, period_length: int = 5) -> dict:
+import numpy as np
+
+PHASES = ("menstrual", "follicular", "ovulation", "luteal")
+PREGNANCY_PROBABILITIES = ("low", "medium", "high")
+
+DATE_FIELDS = (
+    "next_period_start", "next_period_end", "ovulation_date",
+    "fertile_window_start", "fertile_window_end",
+)
+
+def calculate_predictions(last_period_start: date, cycle_length: int = 28, period_length: int = 5,
+                          today: date = None) -> dict:
     """Calculate menstrual predictions based on last period"""
-    today = date.today()
+    today = today or date.today()
     
     # Calculate cycle day
     days_since_start = (today - last_period_start).days
@@ -77,3 +89,87 @@ def calculate_predictions(last_period_start: date, cycle_length: int = 28, perio
         "cycle_day": cycle_day,
         "phase": phase
     }
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _as_day_array(values) -> np.ndarray:
+    """datetime64[D] array from dates; goes through ordinals, ~20x faster than np.asarray on date objects."""
+    if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+        return values.astype("datetime64[D]")
+    ordinals = np.fromiter((d.toordinal() for d in values), dtype=np.int64)
+    return (ordinals - EPOCH_ORDINAL).astype("datetime64[D]")
+
+
+def calculate_predictions_batch(last_period_starts, cycle_lengths=28, period_lengths=5,
+                                today: date = None) -> dict:
+    """
+    Vectorized calculate_predictions for a whole cohort.
+
+    Takes array-likes of last period start dates and cycle/period lengths
+    (scalars are broadcast) and returns a dict of NumPy arrays, element-wise
+    identical to the scalar function:
+    - date fields as datetime64[D]
+    - cycle_day as int64
+    - phase as int8 codes into PHASES
+    - pregnancy_probability as int8 codes into PREGNANCY_PROBABILITIES
+    """
+    today = np.datetime64(today or date.today(), "D")
+    starts = _as_day_array(last_period_starts)
+    cycle, period = np.broadcast_arrays(
+        np.asarray(cycle_lengths, dtype=np.int64),
+        np.asarray(period_lengths, dtype=np.int64),
+    )
+    cycle = np.broadcast_to(cycle, starts.shape)
+    period = np.broadcast_to(period, starts.shape)
+    one_day = np.timedelta64(1, "D")
+
+    # NumPy // and % floor like Python, so future start dates behave the same
+    days_since_start = (today - starts).astype(np.int64)
+    cycle_day = days_since_start % cycle + 1
+    cycles_passed = days_since_start // cycle
+
+    next_period_start = starts + (cycles_passed + 1) * cycle * one_day
+    # Same guard as the scalar version
+    next_period_start = np.where(
+        next_period_start <= today, starts + (cycles_passed + 2) * cycle * one_day, next_period_start
+    )
+    next_period_end = next_period_start + (period - 1) * one_day
+
+    ovulation_date = next_period_start - 14 * one_day
+    fertile_window_start = ovulation_date - 5 * one_day
+    fertile_window_end = ovulation_date + one_day
+
+    phase = np.select(
+        [cycle_day <= period, cycle_day <= cycle - 14, cycle_day <= cycle - 12],
+        [0, 1, 2],
+        default=3,
+    ).astype(np.int8)
+
+    days_to_ovulation = np.abs((ovulation_date - today).astype(np.int64))
+    pregnancy_probability = np.select(
+        [days_to_ovulation <= 1, days_to_ovulation <= 3], [2, 1], default=0
+    ).astype(np.int8)
+
+    return {
+        "next_period_start": next_period_start,
+        "next_period_end": next_period_end,
+        "ovulation_date": ovulation_date,
+        "fertile_window_start": fertile_window_start,
+        "fertile_window_end": fertile_window_end,
+        "pregnancy_probability": pregnancy_probability,
+        "cycle_day": cycle_day,
+        "phase": phase,
+    }
+
+
+def iter_batch_predictions(batch: dict) -> Iterator[dict]:
+    """Yield calculate_predictions-shaped dicts (dates, strings, ints) from a batch result."""
+    columns = {field: batch[field].tolist() for field in DATE_FIELDS}
+    columns["cycle_day"] = batch["cycle_day"].tolist()
+    columns["phase"] = [PHASES[code] for code in batch["phase"].tolist()]
+    columns["pregnancy_probability"] = [
+        PREGNANCY_PROBABILITIES[code] for code in batch["pregnancy_probability"].tolist()
+    ]
+    for values in zip(*columns.values()):
+        yield dict(zip(columns.keys(), values))
@@ -7,7 +7,7 @@ from app.db.models.doctor import Doctor
 from app.db.models.cycle_predictor import CycleLog, SymptomLog
 from app.cycle_predictor import schemas
 from app.api.v1.endpoints.auth import get_current_user
-from app.crud.admin import get_enabled_tenant_modules
+from app.crud.admin import get_enabled_tenant_module_codes
 
 router = APIRouter(prefix="/cycle-predictor", tags=["Cycle Predictor"])
 
@@ -54,10 +54,7 @@ async def check_cycle_predictor_enabled(
     """Verify cycle predictor module is enabled for this tenant/doctor."""
     doctor_id = current_actor.id if isinstance(current_actor, Doctor) else current_actor.doctor_id
     
-    enabled_modules = get_enabled_tenant_modules(db, doctor_id)
-    module_codes = [m.code for m in enabled_modules]
-    
-    if 'cycle_predictor' not in module_codes:
+    if 'cycle_predictor' not in get_enabled_tenant_module_codes(db, doctor_id):
         raise HTTPException(
             status_code=403,
             detail="Cycle predictor module is not enabled"
@@ -65,34 +62,34 @@ async def check_cycle_predictor_enabled(
     return True
 
 from app.cycle_predictor.logic import calculate_predictions
+from app.cycle_predictor import stats as cycle_stats
+
+def _actor_stats(db: Session, current_actor: Union[Doctor, CycleUser]):
+    """Running stats for a CycleUser; doctors aggregate all their logs on the fly."""
+    if isinstance(current_actor, CycleUser):
+        stats = cycle_stats.get_cycle_stats(db, current_actor.id)
+        db.commit()  # Persist the row if it was just built from history
+        return stats
+    rows = db.query(CycleLog.start_date, CycleLog.end_date).filter(CycleLog.doctor_id == current_actor.id).all()
+    return cycle_stats.stats_from_cycles(rows)
 
 @router.get("/predictions", response_model=schemas.PredictionResponse, dependencies=[Depends(check_cycle_predictor_enabled)])
 def get_predictions(
     db: Session = Depends(get_db),
     current_actor: Union[Doctor, CycleUser] = Depends(get_current_actor)
 ):
-    # Determine filter
-    if isinstance(current_actor, Doctor):
-        filter_kwargs = {"doctor_id": current_actor.id}
-    else:
-        # Check if cycle_user_id column exists (robustness)
-        # Assuming it exists now
-        filter_kwargs = {"cycle_user_id": current_actor.id}
+    stats = _actor_stats(db, current_actor)
+    summary = cycle_stats.summarize(stats)
 
-    # Get the most recent cycle
-    last_cycle = db.query(CycleLog).filter_by(**filter_kwargs).order_by(CycleLog.start_date.desc()).first()
-    
-    # For now, we use defaults or doctor settings if we had them
-    avg_cycle = 28
-    avg_period = 5
-    
-    if not last_cycle:
-        # No cycles recorded, return default predictions based on today
-        start_date = date.today()
-    else:
-        start_date = last_cycle.start_date
-        
-    predictions = calculate_predictions(start_date, avg_cycle, avg_period)
+    # No cycles recorded: default predictions based on today
+    start_date = stats.last_start_date or date.today()
+
+    predictions = calculate_predictions(start_date, summary["avg_cycle_length"], summary["avg_period_length"])
+
+    spread = cycle_stats.confidence_days(stats)
+    if spread:
+        predictions["next_period_range_start"] = predictions["next_period_start"] - timedelta(days=spread)
+        predictions["next_period_range_end"] = predictions["next_period_start"] + timedelta(days=spread)
     return predictions
 
 @router.get("/stats", response_model=schemas.CycleStats, dependencies=[Depends(check_cycle_predictor_enabled)])
@@ -100,64 +97,7 @@ def get_stats(
     db: Session = Depends(get_db),
     current_actor: Union[Doctor, CycleUser] = Depends(get_current_actor)
 ):
-    if isinstance(current_actor, Doctor):
-        filter_kwargs = {"doctor_id": current_actor.id}
-    else:
-        filter_kwargs = {"cycle_user_id": current_actor.id}
-
-    cycles = db.query(CycleLog).filter_by(**filter_kwargs).order_by(CycleLog.start_date.desc()).all()
-    
-    total_cycles = len(cycles)
-    
-    if total_cycles == 0:
-        return {
-            "total_cycles": 0,
-            "avg_cycle_length": 28,
-            "avg_period_length": 5,
-            "cycle_range_min": 0,
-            "cycle_range_max": 0
-        }
-
-    # Calculate Avg Period Length (duration of bleeding)
-    total_period_days = 0
-    valid_period_count = 0
-    for c in cycles:
-        if c.end_date:
-            days = (c.end_date - c.start_date).days + 1
-            total_period_days += days
-            valid_period_count += 1
-    
-    avg_period = round(total_period_days / valid_period_count) if valid_period_count > 0 else 5
-
-    # Calculate Avg Cycle Length (days between starts)
-    # We can use stored cycle_length if available, or compute from start dates
-    cycle_lengths = []
-    
-    # Method 1: Use stored values if robust
-    # Method 2: Compute intervals between consecutive cycles (sorted desc)
-    # Let's use computed intervals for better accuracy if stored values are missing
-    sorted_cycles = sorted(cycles, key=lambda x: x.start_date)
-    for i in range(len(sorted_cycles) - 1):
-        length = (sorted_cycles[i+1].start_date - sorted_cycles[i].start_date).days
-        if 20 <= length <= 45: # Filter reasonable cycle lengths
-            cycle_lengths.append(length)
-
-    if cycle_lengths:
-        avg_cycle = round(sum(cycle_lengths) / len(cycle_lengths))
-        min_cycle = min(cycle_lengths)
-        max_cycle = max(cycle_lengths)
-    else:
-        avg_cycle = 28
-        min_cycle = 28
-        max_cycle = 28
-
-    return {
-        "total_cycles": total_cycles,
-        "avg_cycle_length": avg_cycle,
-        "avg_period_length": avg_period,
-        "cycle_range_min": min_cycle,
-        "cycle_range_max": max_cycle
-    }
+    return cycle_stats.summarize(_actor_stats(db, current_actor))
 
 
 @router.get("/cycles", response_model=List[schemas.CycleLog], dependencies=[Depends(check_cycle_predictor_enabled)])
@@ -203,6 +143,7 @@ def create_cycle(
     if existing_cycle:
         # Update existing cycle
         print(f"DEBUG: Found existing cycle near {cycle_date}. Updating {existing_cycle.start_date} -> {cycle_date}")
+        old_start, old_end = existing_cycle.start_date, existing_cycle.end_date
         existing_cycle.start_date = cycle_date
         if cycle_in.end_date:
             existing_cycle.end_date = cycle_in.end_date
@@ -210,6 +151,7 @@ def create_cycle(
         if cycle_in.notes:
             existing_cycle.notes = cycle_in.notes
             
+        cycle_stats.record_cycle_changed(db, existing_cycle, old_start, old_end)
         db.commit()
         db.refresh(existing_cycle)
         return existing_cycle
@@ -233,6 +175,7 @@ def create_cycle(
         db_cycle.doctor_id = current_actor.doctor_id # Associate with doctor too
         
     db.add(db_cycle)
+    cycle_stats.record_cycle_added(db, db_cycle)
     db.commit()
     db.refresh(db_cycle)
     return db_cycle
@@ -252,6 +195,7 @@ def update_cycle(
     if not db_cycle:
         raise HTTPException(status_code=404, detail="Cycle not found")
     
+    old_start, old_end = db_cycle.start_date, db_cycle.end_date
     update_data = cycle_in.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_cycle, key, value)
@@ -259,6 +203,7 @@ def update_cycle(
     if db_cycle.start_date and db_cycle.end_date:
         db_cycle.cycle_length = (db_cycle.end_date - db_cycle.start_date).days + 1
     
+    cycle_stats.record_cycle_changed(db, db_cycle, old_start, old_end)
     db.commit()
     db.refresh(db_cycle)
     return db_cycle
@@ -277,6 +222,7 @@ def delete_cycle(
     if not db_cycle:
         raise HTTPException(status_code=404, detail="Cycle not found")
     
+    cycle_stats.record_cycle_removed(db, db_cycle)
     db.delete(db_cycle)
     db.commit()
     return {"message": "Cycle deleted"}
@@ -295,7 +241,9 @@ def delete_all_data(
         # Doctor deleting their own logs (unlikely but supported for consistency)
         filter_kwargs = {"doctor_id": doctor_id}
 
-    # Delete Cycles
+    # Delete Cycles (and the running stats of every user whose logs go away)
+    affected_users = {uid for (uid,) in db.query(CycleLog.cycle_user_id).filter_by(**filter_kwargs).distinct()}
+    cycle_stats.reset_cycle_stats(db, affected_users)
     db.query(CycleLog).filter_by(**filter_kwargs).delete()
     
     # Delete Symptoms
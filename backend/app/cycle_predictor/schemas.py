@@ -55,6 +55,9 @@ class PredictionResponse(BaseModel):
     pregnancy_probability: str # low, medium, high
     cycle_day: int
     phase: str # menstrual, follicular, ovulation, luteal
+    # +/- one standard deviation of the user's cycle length, once known
+    next_period_range_start: Optional[date] = None
+    next_period_range_end: Optional[date] = None
 
 class CycleStats(BaseModel):
     total_cycles: int
@@ -62,6 +65,9 @@ class CycleStats(BaseModel):
     avg_period_length: int
     cycle_range_min: int
     cycle_range_max: int
+    cycle_length_stddev: Optional[float] = None
+    period_length_stddev: Optional[float] = None
+    cycles_used: int = 0 # intervals inside the 20-45 day window
 
 class NotificationSettingsBase(BaseModel):
     contraceptive_enabled: bool = False
@@ -0,0 +1,261 @@
+#stats.py
+"""
+Incremental per-user cycle statistics.
+
+CycleUserStats keeps exact running sums (count, sum, sum of squares) of the
+intervals between consecutive period starts and of bleeding durations, plus
+a small histogram of accepted intervals for min/max. Every CycleLog write
+applies a delta computed from the neighbouring start dates only, so
+/predictions and /stats read one row instead of the whole history.
+"""
+import math
+from datetime import date, datetime
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.models.cycle_predictor import CycleLog, CycleUserStats
+
+# Same window the /stats endpoint always used to drop missed/duplicated logs
+MIN_CYCLE_INTERVAL = 20
+MAX_CYCLE_INTERVAL = 45
+
+DEFAULT_CYCLE_LENGTH = 28
+DEFAULT_PERIOD_LENGTH = 5
+
+
+def period_days(start_date: date, end_date: Optional[date]) -> Optional[int]:
+    if not end_date:
+        return None
+    return (end_date - start_date).days + 1
+
+
+def _reset(stats: CycleUserStats) -> CycleUserStats:
+    stats.total_cycles = 0
+    stats.last_start_date = None
+    stats.cycle_count = 0
+    stats.cycle_sum = 0
+    stats.cycle_sum_sq = 0
+    stats.cycle_histogram = {}
+    stats.period_count = 0
+    stats.period_sum = 0
+    stats.period_sum_sq = 0
+    return stats
+
+
+def _apply_interval(stats: CycleUserStats, days: int, sign: int):
+    if not MIN_CYCLE_INTERVAL <= days <= MAX_CYCLE_INTERVAL:
+        return
+    stats.cycle_count += sign
+    stats.cycle_sum += sign * days
+    stats.cycle_sum_sq += sign * days * days
+
+    # Reassign so SQLAlchemy notices the JSON change
+    histogram = dict(stats.cycle_histogram or {})
+    key = str(days)
+    histogram[key] = histogram.get(key, 0) + sign
+    if histogram[key] <= 0:
+        del histogram[key]
+    stats.cycle_histogram = histogram
+
+
+def _apply_period(stats: CycleUserStats, days: Optional[int], sign: int):
+    if days is None:
+        return
+    stats.period_count += sign
+    stats.period_sum += sign * days
+    stats.period_sum_sq += sign * days * days
+
+
+def accumulate(stats: CycleUserStats, cycles: Iterable[Tuple[date, Optional[date]]]) -> CycleUserStats:
+    """Fill `stats` from scratch with (start_date, end_date) pairs in any order."""
+    starts = []
+    for start_date, end_date in cycles:
+        starts.append(start_date)
+        _apply_period(stats, period_days(start_date, end_date), 1)
+
+    starts.sort()
+    for previous, current in zip(starts, starts[1:]):
+        _apply_interval(stats, (current - previous).days, 1)
+
+    stats.total_cycles = len(starts)
+    stats.last_start_date = starts[-1] if starts else None
+    return stats
+
+
+def stats_from_cycles(cycles: Iterable[Tuple[date, Optional[date]]]) -> CycleUserStats:
+    """Transient (never persisted) stats for ad-hoc sets of logs, e.g. a doctor's."""
+    return accumulate(_reset(CycleUserStats()), cycles)
+
+
+def rebuild_cycle_stats(db: Session, cycle_user_id: int) -> CycleUserStats:
+    """Recompute a user's stats from their flushed CycleLogs (backfill / repair)."""
+    stats = db.query(CycleUserStats).filter(
+        CycleUserStats.cycle_user_id == cycle_user_id
+    ).with_for_update().first()
+    if stats is None:
+        stats = CycleUserStats(cycle_user_id=cycle_user_id)
+        db.add(stats)
+    _reset(stats)
+
+    rows = db.query(CycleLog.start_date, CycleLog.end_date).filter(
+        CycleLog.cycle_user_id == cycle_user_id
+    ).all()
+    accumulate(stats, rows)
+    stats.updated_at = datetime.now()
+    return stats
+
+
+def _load(db: Session, cycle_user_id: int, for_update: bool = False) -> Tuple[CycleUserStats, bool]:
+    """(stats, rebuilt): rebuilt means the row was just built from the current history."""
+    query = db.query(CycleUserStats).filter(CycleUserStats.cycle_user_id == cycle_user_id)
+    if for_update:
+        query = query.with_for_update()
+    stats = query.first()
+    if stats is not None:
+        return stats, False
+    try:
+        with db.begin_nested():
+            stats = rebuild_cycle_stats(db, cycle_user_id)
+            db.flush()
+    except IntegrityError:
+        # A concurrent request built the row first (unique cycle_user_id): use theirs
+        return query.one(), False
+    return stats, True
+
+
+def get_cycle_stats(db: Session, cycle_user_id: int) -> CycleUserStats:
+    """Stats row for a user, built from history the first time it is needed."""
+    return _load(db, cycle_user_id)[0]
+
+
+def _neighbours(db: Session, cycle_user_id: int, start_date: date, exclude_id: Optional[int]) -> tuple:
+    """(previous start, next start, another log shares this start) among the user's other logs."""
+    others = db.query(CycleLog).filter(CycleLog.cycle_user_id == cycle_user_id)
+    if exclude_id is not None:
+        others = others.filter(CycleLog.id != exclude_id)
+
+    previous = others.filter(CycleLog.start_date < start_date).with_entities(func.max(CycleLog.start_date)).scalar()
+    following = others.filter(CycleLog.start_date > start_date).with_entities(func.min(CycleLog.start_date)).scalar()
+    duplicate = others.filter(CycleLog.start_date == start_date).with_entities(CycleLog.id).first() is not None
+    return previous, following, duplicate
+
+
+def _splice(db: Session, stats: CycleUserStats, start_date: date, end_date: Optional[date],
+            exclude_id: Optional[int], sign: int):
+    """
+    Insert (sign=1) or remove (sign=-1) one start date from the sorted
+    sequence of the user's other logs: the interval previous->next is
+    replaced by previous->start and start->next, or the reverse.
+    """
+    previous, following, duplicate = _neighbours(db, stats.cycle_user_id, start_date, exclude_id)
+
+    stats.total_cycles += sign
+    _apply_period(stats, period_days(start_date, end_date), sign)
+
+    # An identical start only adds a 0-day interval, which is never counted
+    if not duplicate:
+        if previous and following:
+            _apply_interval(stats, (following - previous).days, -sign)
+        if previous:
+            _apply_interval(stats, (start_date - previous).days, sign)
+        if following:
+            _apply_interval(stats, (following - start_date).days, sign)
+
+    if sign > 0:
+        if stats.last_start_date is None or start_date > stats.last_start_date:
+            stats.last_start_date = start_date
+    elif following is None and not duplicate:
+        stats.last_start_date = previous
+    stats.updated_at = datetime.now()
+
+
+def record_cycle_added(db: Session, cycle: CycleLog):
+    """Call after a CycleLog has been added to the session (before commit)."""
+    if not cycle.cycle_user_id:
+        return
+    db.flush()
+    stats, rebuilt = _load(db, cycle.cycle_user_id, for_update=True)
+    if not rebuilt:
+        _splice(db, stats, cycle.start_date, cycle.end_date, cycle.id, 1)
+
+
+def record_cycle_removed(db: Session, cycle: CycleLog):
+    """Call before a CycleLog is deleted."""
+    if not cycle.cycle_user_id:
+        return
+    stats, _ = _load(db, cycle.cycle_user_id, for_update=True)
+    _splice(db, stats, cycle.start_date, cycle.end_date, cycle.id, -1)
+
+
+def record_cycle_changed(db: Session, cycle: CycleLog, old_start: date, old_end: Optional[date]):
+    """Call after start/end of an existing CycleLog changed (before commit)."""
+    if not cycle.cycle_user_id or (old_start, old_end) == (cycle.start_date, cycle.end_date):
+        return
+    db.flush()
+    stats, rebuilt = _load(db, cycle.cycle_user_id, for_update=True)
+    if not rebuilt:
+        _splice(db, stats, old_start, old_end, cycle.id, -1)
+        _splice(db, stats, cycle.start_date, cycle.end_date, cycle.id, 1)
+
+
+def reset_cycle_stats(db: Session, cycle_user_ids: Iterable[int]):
+    """Drop stats rows (e.g. after bulk deletes); they are rebuilt on next read."""
+    cycle_user_ids = [uid for uid in cycle_user_ids if uid]
+    if cycle_user_ids:
+        db.query(CycleUserStats).filter(
+            CycleUserStats.cycle_user_id.in_(cycle_user_ids)
+        ).delete(synchronize_session=False)
+
+
+def summarize(stats: CycleUserStats) -> dict:
+    """
+    /stats payload plus spread: averages are rounded like the original
+    endpoint; the stddev (population) drives the prediction ranges.
+    """
+    if stats.cycle_count:
+        avg_cycle = round(stats.cycle_sum / stats.cycle_count)
+        lengths = [int(k) for k in (stats.cycle_histogram or {})]
+        min_cycle, max_cycle = min(lengths), max(lengths)
+        cycle_std = _stddev(stats.cycle_count, stats.cycle_sum, stats.cycle_sum_sq)
+    else:
+        avg_cycle = min_cycle = max_cycle = DEFAULT_CYCLE_LENGTH
+        cycle_std = None
+
+    if stats.period_count:
+        avg_period = round(stats.period_sum / stats.period_count)
+        period_std = _stddev(stats.period_count, stats.period_sum, stats.period_sum_sq)
+    else:
+        avg_period = DEFAULT_PERIOD_LENGTH
+        period_std = None
+
+    if not stats.total_cycles:
+        # Original endpoint reported an empty range for users with no logs
+        min_cycle = max_cycle = 0
+
+    return {
+        "total_cycles": stats.total_cycles,
+        "avg_cycle_length": avg_cycle,
+        "avg_period_length": avg_period,
+        "cycle_range_min": min_cycle,
+        "cycle_range_max": max_cycle,
+        "cycle_length_stddev": cycle_std,
+        "period_length_stddev": period_std,
+        "cycles_used": stats.cycle_count,
+    }
+
+
+def confidence_days(stats: CycleUserStats) -> Optional[int]:
+    """Half-width (days) of the next-period range; None until two intervals are known."""
+    if stats.cycle_count < 2:
+        return None
+    return max(1, math.ceil(_stddev(stats.cycle_count, stats.cycle_sum, stats.cycle_sum_sq)))
+
+
+def _stddev(count: int, total: int, total_sq: int) -> float:
+    # Integer sums keep this exact no matter how many add/remove deltas were applied
+    variance = max(count * total_sq - total * total, 0) / (count * count)
+    return round(math.sqrt(variance), 2)
+
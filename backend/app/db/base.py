@@ -2,25 +2,55 @@
 Database base configuration and session management.
 """
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.db import profiling
+from app.db.pool import engine_options, instrument_engine
 
-# Create database engine
+# Create database engine (pool sized for this process' role, see app.db.pool)
 engine = create_engine(
     settings.DATABASE_URL,
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    echo=False  # Set to True for SQL query logging
+    echo=False,  # Set to True for SQL query logging
+    **engine_options("sync", settings.DATABASE_URL)
 )
+instrument_engine("sync", engine)
+profiling.instrument_engine(engine)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers for the same databases
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_database_url(url: str):
+    """DATABASE_URL with its driver swapped for the asyncio one (psycopg2 -> asyncpg)."""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername))
+
+
+# Async engine for `async def` endpoints, so queries don't block the event loop
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    **engine_options("async", str(ASYNC_DATABASE_URL), is_async=True)
+)
+instrument_engine("async", async_engine.sync_engine)
+profiling.instrument_engine(async_engine.sync_engine)
+
+# expire_on_commit=False: attributes can't be lazy-loaded after commit in async code
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Declarative base for models
 Base = declarative_base()
 
 # Import all models so Alembic can detect them
-from app.db.models import doctor, appointment, patient, testimonial, gallery, consultation, location, service, cycle_user, preconsultation_template, tenant, endometriosis_result, oauth_whitelist, push_subscription
+from app.db.models import doctor, appointment, patient, testimonial, gallery, consultation, location, service, cycle_user, preconsultation_template, tenant, endometriosis_result, oauth_whitelist, push_subscription, image_derivative, media_blob
 from app.db.models.preconsultation import PreconsultationQuestion
 from app.blog import models as blog
 
@@ -37,3 +67,12 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    """
+    Dependency for `async def` endpoints: yields an AsyncSession.
+    Relationships are not lazy-loaded; use selectinload() or refresh(obj, [names]).
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, JSON, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, JSON, Boolean, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -16,6 +16,36 @@ class CycleLog(Base):
     doctor = relationship("Doctor", backref="cycle_logs")
     cycle_user = relationship("CycleUser", backref="cycle_logs")
 
+    __table_args__ = (
+        Index("ix_cycle_logs_cycle_user_id_start_date", "cycle_user_id", "start_date"),
+    )
+
+class CycleUserStats(Base):
+    """
+    Running cycle statistics per CycleUser, kept in sync by app.cycle_predictor.stats
+    on every CycleLog write so dashboards never rescan the history.
+    """
+    __tablename__ = "cycle_user_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cycle_user_id = Column(Integer, ForeignKey("cycle_users.id", ondelete="CASCADE"), unique=True, index=True, nullable=False)
+
+    total_cycles = Column(Integer, default=0, nullable=False)
+    last_start_date = Column(Date, nullable=True)
+
+    # Intervals between consecutive start dates inside the accepted window
+    cycle_count = Column(Integer, default=0, nullable=False)
+    cycle_sum = Column(Integer, default=0, nullable=False)
+    cycle_sum_sq = Column(Integer, default=0, nullable=False)
+    cycle_histogram = Column(JSON, default=dict, nullable=False)  # {"28": 3, ...} for exact min/max
+
+    # Bleeding duration of cycles with an end_date
+    period_count = Column(Integer, default=0, nullable=False)
+    period_sum = Column(Integer, default=0, nullable=False)
+    period_sum_sq = Column(Integer, default=0, nullable=False)
+
+    updated_at = Column(DateTime, nullable=True)
+
 class SymptomLog(Base):
     __tablename__ = "symptom_logs"
 
@@ -97,26 +97,16 @@ class Doctor(Base):
 
     @property
     def enabled_module_codes(self):
-        """Return list of codes of enabled modules."""
+        """Return list of codes of enabled modules (cached per tenant, see app.core.module_cache)."""
         from sqlalchemy.orm import object_session
-        from app.db.models.tenant_module import TenantModule
-        from app.db.models.module import Module
+        from app.core.module_cache import get_enabled_module_codes
         
         session = object_session(self)
         if not session:
             return []
         
         try:
-            # Query enabled modules for this tenant
-            enabled_modules = session.query(Module.code).join(
-                TenantModule,
-                TenantModule.module_id == Module.id
-            ).filter(
-                TenantModule.tenant_id == self.id,
-                TenantModule.is_enabled == True
-            ).all()
-            
-            return [code for (code,) in enabled_modules]
+            return sorted(get_enabled_module_codes(session, self.id))
         except Exception:
             return []
 
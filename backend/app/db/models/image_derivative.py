@@ -0,0 +1,42 @@
+"""
+Image derivative model - resized WebP/AVIF copies of an uploaded image.
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, UniqueConstraint
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class ImageDerivative(Base):
+    """
+    Variants built off-request by app.services.image_derivatives for one
+    uploaded image (and, for gallery images, one crop of it).
+    """
+    __tablename__ = "image_derivatives"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Informational: the doctor whose upload first built it. Store blobs are
+    # shared across tenants, so a doctor's deletion must not take the row along
+    doctor_id = Column(Integer, ForeignKey("doctors.id", ondelete="SET NULL"), nullable=True, index=True)
+
+    # Original as stored by the upload endpoints ("/uploads/gallery/...")
+    source_url = Column(String, nullable=False, index=True)
+    # Hash of the applied crop ("" = whole image)
+    crop_key = Column(String, nullable=False, default="")
+
+    status = Column(String, nullable=False, default="pending")  # pending, done, failed
+    error = Column(Text, nullable=True)
+
+    # Size after crop, before resizing
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    # [{"url", "width", "height", "type"}, ...] smallest first
+    variants = Column(JSON, nullable=True)
+    # Tiny blurred preview as a data: URI
+    placeholder = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("source_url", "crop_key", name="uq_image_derivatives_source_crop"),
+    )
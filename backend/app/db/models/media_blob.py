@@ -0,0 +1,28 @@
+"""
+Media blob model - one stored file of the content-addressed media store.
+"""
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class MediaBlob(Base):
+    """
+    An uploaded file stored once under UPLOAD_DIR/media by its SHA-256
+    (see app.services.media_store). ref_count is how many records point at
+    `url`; the garbage collector reconciles it and deletes unreferenced blobs.
+    """
+    __tablename__ = "media_blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, index=True, nullable=False)
+    # Immutable public URL ("/uploads/media/ab/ab12...ef.jpg")
+    url = Column(String, unique=True, nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+
+    ref_count = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Last upload of these bytes or change of ref_count; the GC grace period counts from here
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,219 @@
+"""
+Connection pool profiles and metrics.
+
+The same engines are built by uvicorn workers, Celery workers, Celery beat
+and ad-hoc scripts, which need very different pools: an API worker serves
+many concurrent requests, a prefork Celery child runs one task at a time and
+beat barely touches the database. The role is detected from the command line
+(override with DB_POOL_ROLE) and picks DB_POOL_SIZE_<ROLE> and
+DB_MAX_OVERFLOW_<ROLE>.
+
+Pooled connections are pinged on checkout and recycled after
+DB_POOL_RECYCLE_SECONDS, so a Postgres restart costs one reconnect instead of
+a burst of errors. With DB_PGBOUNCER_MODE (PgBouncer in transaction pooling)
+the app keeps no pool of its own and asyncpg doesn't cache prepared
+statements, which don't survive a server connection switch.
+
+Every engine records checkout wait times, timeouts, connects, invalidations
+and the checked-out high-water mark; pool_stats() reports them.
+"""
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("api", "worker", "beat", "script")
+
+# Recent checkout waits kept for percentiles
+WAIT_SAMPLES = 2000
+
+
+def process_role() -> str:
+    """api, worker, beat or script (DB_POOL_ROLE, else guessed from argv)."""
+    role = settings.DB_POOL_ROLE.lower()
+    if role in ROLES:
+        return role
+    argv = " ".join(sys.argv).lower()
+    if "celery" in argv:
+        return "beat" if " beat" in argv else "worker"
+    if "uvicorn" in argv or "gunicorn" in argv or "fastapi" in argv:
+        return "api"
+    return "script"
+
+
+class PoolMetrics:
+    def __init__(self, name: str, role: str):
+        self.name = name
+        self.role = role
+        self.pool = None  # current pool (replaced on engine.dispose())
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.counters = {
+            "checkouts": 0, "checkout_timeouts": 0, "connects": 0, "invalidations": 0,
+            "wait_seconds_total": 0.0, "wait_seconds_max": 0.0, "checked_out_max": 0,
+        }
+        self._checked_out = 0
+
+    def waited(self, seconds: float):
+        with self._lock:
+            self.counters["checkouts"] += 1
+            self.counters["wait_seconds_total"] += seconds
+            self.counters["wait_seconds_max"] = max(self.counters["wait_seconds_max"], seconds)
+            self._waits.append(seconds)
+
+    def count(self, name: str, delta: int = 1):
+        with self._lock:
+            self.counters[name] += delta
+
+    def checked_out(self, delta: int):
+        with self._lock:
+            self._checked_out += delta
+            self.counters["checked_out_max"] = max(self.counters["checked_out_max"], self._checked_out)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            waits = sorted(self._waits)
+            checked_out = self._checked_out
+
+        def percentile(p: float) -> Optional[float]:
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 3) if waits else None
+
+        pool = self.pool
+        stats = {
+            "engine": self.name,
+            "role": self.role,
+            "pool": type(pool).__name__ if pool is not None else None,
+            "checked_out": checked_out,
+            **counters,
+            "wait_ms_p50": percentile(0.5),
+            "wait_ms_p95": percentile(0.95),
+            "wait_ms_p99": percentile(0.99),
+        }
+        stats["wait_seconds_total"] = round(stats["wait_seconds_total"], 4)
+        stats["wait_seconds_max"] = round(stats["wait_seconds_max"], 4)
+        if isinstance(pool, QueuePool):
+            stats.update(
+                pool_size=pool.size(), max_overflow=pool._max_overflow,
+                idle=pool.checkedin(), overflow=max(0, pool.overflow()),
+            )
+        return stats
+
+
+class _TimedCheckout:
+    """Pool mixin: times every checkout (queue wait, or connect when the pool is empty)."""
+
+    metrics: PoolMetrics
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics.pool = self
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            self.metrics.count("checkout_timeouts")
+            raise
+        finally:
+            self.metrics.waited(time.perf_counter() - start)
+
+
+_metrics: Dict[str, PoolMetrics] = {}
+
+
+def _instrumented(base, metrics: PoolMetrics):
+    # A class per engine: engine.dispose() rebuilds the pool from self.__class__
+    return type(f"Instrumented{base.__name__}", (_TimedCheckout, base), {"metrics": metrics})
+
+
+def engine_options(name: str, url: str, is_async: bool = False) -> dict:
+    """create_engine/create_async_engine keyword arguments for this process role."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "postgresql":
+        # SQLite (development): keep SQLAlchemy's defaults
+        return {}
+
+    role = process_role()
+    metrics = _metrics[name] = PoolMetrics(name, role)
+
+    if settings.DB_PGBOUNCER_MODE:
+        options = {"poolclass": _instrumented(NullPool, metrics)}
+        if is_async:
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                # Unique names: PgBouncer may hand us a server connection another client prepared on
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            }
+        return options
+
+    base = AsyncAdaptedQueuePool if is_async else QueuePool
+    return {
+        "poolclass": _instrumented(base, metrics),
+        "pool_size": getattr(settings, f"DB_POOL_SIZE_{role.upper()}"),
+        "max_overflow": getattr(settings, f"DB_MAX_OVERFLOW_{role.upper()}"),
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_use_lifo": True,  # Idle extras age out instead of being kept warm round-robin
+    }
+
+
+def instrument_engine(name: str, engine):
+    """Hook connection events of a (sync) engine built with engine_options(name, ...)."""
+    metrics = _metrics.get(name)
+    if metrics is None:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        metrics.count("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checked_out(1)
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        metrics.checked_out(-1)
+
+    @event.listens_for(engine, "invalidate")
+    def _invalidate(dbapi_connection, connection_record, exception):
+        metrics.count("invalidations")
+
+
+def pool_stats() -> dict:
+    """Pool metrics of every instrumented engine in this process."""
+    return {
+        "role": process_role(),
+        "pgbouncer_mode": settings.DB_PGBOUNCER_MODE,
+        "engines": [metrics.stats() for metrics in _metrics.values()],
+    }
+
+
+_last_logged = 0.0
+
+
+def maybe_log_pool_stats():
+    """Log pool_stats() at most every DB_POOL_STATS_LOG_SECONDS (processes without an HTTP endpoint)."""
+    global _last_logged
+    interval = settings.DB_POOL_STATS_LOG_SECONDS
+    now = time.monotonic()
+    if not interval or not _metrics or now - _last_logged < interval:
+        return
+    _last_logged = now
+    logger.info(f"DB pool stats: {pool_stats()}")
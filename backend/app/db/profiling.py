@@ -0,0 +1,151 @@
+"""
+Per-request / per-task SQL profiling.
+
+With SQL_PROFILING_ENABLED every HTTP request and Celery task gets a
+QueryProfile: query count, total time spent in the database and how often
+each statement shape ran. SQLAlchemy already renders bound parameters as
+placeholders, so the statement text is the shape; the same shape running
+SQL_PROFILING_N_PLUS_ONE_THRESHOLD times or more in one unit of work is
+reported as a probable N+1 (a lazy load or a per-row lookup in a loop).
+
+HTTP responses carry a Server-Timing header (db time, query count, total
+time) and every profile is logged as one JSON line, at WARNING when it has
+N+1 suspects. With the setting off nothing is installed: no cursor event
+listeners and no middleware.
+"""
+import json
+import logging
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Statement text kept per shape in logs
+STATEMENT_PREVIEW = 300
+# Shapes listed in a log line, most frequent first
+TOP_SHAPES = 5
+
+_current: ContextVar[Optional["QueryProfile"]] = ContextVar("sql_profile", default=None)
+
+
+class QueryProfile:
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.shapes: Dict[str, list] = defaultdict(lambda: [0, 0.0])  # statement -> [count, seconds]
+
+    def record(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_seconds += seconds
+        shape = self.shapes[statement]
+        shape[0] += 1
+        shape[1] += seconds
+
+    def suspects(self) -> list:
+        threshold = settings.SQL_PROFILING_N_PLUS_ONE_THRESHOLD
+        return sorted(
+            ((statement, count, seconds) for statement, (count, seconds) in self.shapes.items() if count >= threshold),
+            key=lambda item: -item[1]
+        )
+
+    def server_timing(self) -> str:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return (
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries", '
+            f'total;dur={total_ms:.1f}'
+        )
+
+    def summary(self) -> dict:
+        def shape(statement, count, seconds):
+            return {"statement": " ".join(statement.split())[:STATEMENT_PREVIEW], "count": count, "ms": round(seconds * 1000, 2)}
+
+        top = sorted(self.shapes.items(), key=lambda item: -item[1][0])[:TOP_SHAPES]
+        return {
+            "label": self.label,
+            "queries": self.queries,
+            "distinct_statements": len(self.shapes),
+            "db_ms": round(self.db_seconds * 1000, 2),
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "n_plus_one": [shape(*suspect) for suspect in self.suspects()],
+            "top": [shape(statement, count, seconds) for statement, (count, seconds) in top],
+        }
+
+
+def start_profile(label: str):
+    """Profile queries of the current context; returns the token for finish_profile()."""
+    return _current.set(QueryProfile(label))
+
+
+def finish_profile(token) -> Optional[QueryProfile]:
+    """Stop profiling and log the result."""
+    profile = _current.get()
+    _current.reset(token)
+    if profile is None:
+        return None
+    summary = profile.summary()
+    if summary["n_plus_one"]:
+        logger.warning(f"SQL profile (probable N+1): {json.dumps(summary)}")
+    else:
+        logger.info(f"SQL profile: {json.dumps(summary)}")
+    return profile
+
+
+def current_profile() -> Optional[QueryProfile]:
+    return _current.get()
+
+
+def instrument_engine(engine):
+    """Time every cursor execution of a (sync) engine into the current profile."""
+    if not settings.SQL_PROFILING_ENABLED:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("sql_profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        started = conn.info.get("sql_profile_started")
+        if profile is not None and started:
+            profile.record(statement, time.perf_counter() - started.pop())
+
+
+class SQLProfilingMiddleware:
+    """ASGI middleware: one QueryProfile per HTTP request, reported as Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = start_profile(f"{scope['method']} {scope['path']}")
+        profile = _current.get()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                # Streaming bodies may still query after this; the log line has the full count
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", profile.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                profile.label = f"{scope['method']} {route.path}"
+            finish_profile(token)
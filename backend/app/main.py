@@ -1,11 +1,18 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import RedirectResponse
 from pathlib import Path
 
 from app.core.config import settings
 from app.api.v1.api import api_router
 from app.core.backup_service import backup_scheduler
+from app.core.visitor_counter import visitor_flush_scheduler, flush_visitor_counts
+from app.tasks.pdf_tasks import shutdown_render_pool
+from app.tasks.image_tasks import shutdown_derivative_pool
+from app.services.clinical_export import shutdown_export_runner
+from app.utils.media_storage import cache_control_for, public_media_url
+from app.utils.static_media import MediaStaticFiles, precompress_directory
+from app.db.base import async_engine
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,6 +36,10 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+if settings.SQL_PROFILING_ENABLED:
+    from app.db.profiling import SQLProfilingMiddleware
+    app.add_middleware(SQLProfilingMiddleware)
+
 # Resto de tu código...
 # Include API router
 # Include API router
@@ -41,12 +52,27 @@ app.include_router(api_router, prefix="/api/v1")
 # Mount static files for uploads
 uploads_path = Path(settings.UPLOAD_DIR).resolve()
 uploads_path.mkdir(parents=True, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=str(uploads_path)), name="uploads")
+if settings.MEDIA_STORAGE_BACKEND == "minio":
+    # Stored URLs stay "/uploads/<key>"; the bytes come from the bucket (objects carry their Cache-Control)
+    @app.get("/uploads/{key:path}", include_in_schema=False)
+    async def uploaded_media(key: str):
+        # The target follows MINIO_PUBLIC_ENDPOINT, not the content: never cached as immutable
+        return RedirectResponse(
+            public_media_url(key), status_code=307,
+            headers={"Cache-Control": f"public, max-age={settings.MEDIA_CACHE_MAX_AGE_SECONDS}"}
+        )
+else:
+    # Strong ETags, immutable caching for media/ and derived/, byte ranges for videos
+    app.mount("/uploads", MediaStaticFiles(directory=str(uploads_path), cache_control=cache_control_for), name="uploads")
 
 # Mount static files for sample-gallery (default images)
 sample_gallery_path = Path(__file__).parent.parent / "sample-gallery"
 sample_gallery_path.mkdir(parents=True, exist_ok=True)
-app.mount("/sample-gallery", StaticFiles(directory=str(sample_gallery_path)), name="sample-gallery")
+app.mount(
+    "/sample-gallery",
+    MediaStaticFiles(directory=str(sample_gallery_path), cache_control=cache_control_for),
+    name="sample-gallery"
+)
 
 
 @app.get("/")
@@ -72,6 +98,15 @@ async def startup_event():
     import asyncio
     asyncio.create_task(backup_scheduler(interval_seconds=3600))
     logger.info("Tarea de backup automático programada.")
+
+    # Volcar periódicamente las visitas acumuladas de los perfiles públicos
+    asyncio.create_task(visitor_flush_scheduler(interval_seconds=settings.VISITOR_FLUSH_INTERVAL_SECONDS))
+
+    # .br/.gz copies of the default gallery SVGs (only rewritten when stale)
+    try:
+        await asyncio.get_event_loop().run_in_executor(None, precompress_directory, sample_gallery_path)
+    except OSError as e:
+        logger.warning(f"No se pudieron precomprimir las imágenes de ejemplo: {e}")
     
     # Ensure S3 Bucket Exists
     try:
@@ -85,3 +120,15 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Error inicializando S3: {e}")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Persist buffered visitor counts, stop the render pools and close DB pools before the process exits."""
+    try:
+        flush_visitor_counts()
+    except Exception as e:
+        logger.error(f"Error guardando visitas pendientes: {e}")
+    shutdown_export_runner()
+    shutdown_render_pool()
+    shutdown_derivative_pool()
+    await async_engine.dispose()
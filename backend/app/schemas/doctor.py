@@ -5,6 +5,7 @@ from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from app.schemas.location import Location as LocationSchema
+from app.schemas.image import ImageVariants
 
 
 class DoctorBase(BaseModel):
@@ -166,6 +167,8 @@ class DoctorPublic(DoctorBase):
     certifications: List[CertificationInDB] = []
     locations: List[LocationSchema] = []
     enabled_modules: List[str] = Field(default=[], validation_alias="enabled_module_codes")
+    logo_variants: Optional[ImageVariants] = None  # Resized copies of logo_url / photo_url, once built
+    photo_variants: Optional[ImageVariants] = None
 
     class Config:
         from_attributes = True
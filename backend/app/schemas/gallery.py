@@ -5,6 +5,8 @@ from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from datetime import datetime
 
+from app.schemas.image import ImageVariants
+
 
 class GalleryImageBase(BaseModel):
     """Base schema with common gallery image fields."""
@@ -50,6 +52,7 @@ class GalleryImagePublic(GalleryImageBase):
     id: int
     featured: bool
     created_at: datetime
+    variants: Optional[ImageVariants] = None  # Resized copies of the cropped image, once built
 
     class Config:
         from_attributes = True
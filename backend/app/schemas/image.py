@@ -0,0 +1,21 @@
+"""
+Pydantic schemas for resized image variants.
+"""
+from pydantic import BaseModel
+from typing import List
+
+
+class ImageSource(BaseModel):
+    """One resized copy (use in <source srcset> / <img srcset>)."""
+    url: str
+    width: int
+    height: int
+    type: str  # "image/avif", "image/webp"
+
+
+class ImageVariants(BaseModel):
+    """Resized copies of an uploaded image, smallest first."""
+    width: int
+    height: int
+    placeholder: str  # Tiny data: URI to show while the real image loads
+    sources: List[ImageSource] = []
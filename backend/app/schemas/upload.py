@@ -0,0 +1,47 @@
+"""
+Pydantic schemas for resumable (chunked) and direct (presigned) uploads.
+"""
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+
+
+class UploadSessionCreate(BaseModel):
+    """Open a resumable upload of `size` bytes."""
+    size: int = Field(..., gt=0)
+    filename: Optional[str] = None
+
+
+class UploadSessionStatus(BaseModel):
+    """Where to continue: PUT the next piece at `offset`."""
+    upload_id: str
+    offset: int
+    size: int
+    complete: bool
+
+
+class UploadSessionComplete(BaseModel):
+    """Finish an upload; a SHA-256 (hex) is checked against the received bytes."""
+    sha256: Optional[str] = None
+
+
+class DirectUploadCreate(BaseModel):
+    """Ask for a presigned PUT: `kind` is what the file is for (logo, gallery, video...)."""
+    kind: str
+    size: int = Field(..., gt=0)
+    content_type: str
+    filename: Optional[str] = None
+
+
+class DirectUploadTicket(BaseModel):
+    """PUT the file to `upload_url` with `headers`, then complete with `token`."""
+    upload_url: str
+    method: str
+    headers: Dict[str, str]
+    token: str
+    expires_in: int
+
+
+class DirectUploadComplete(BaseModel):
+    """Finish a direct upload; a SHA-256 (hex), if given, is checked against the stored object."""
+    token: str
+    sha256: Optional[str] = None
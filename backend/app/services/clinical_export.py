@@ -0,0 +1,409 @@
+"""
+Bulk clinical export: every patient history of a doctor plus a CSV of all
+consultations, in one ZIP.
+
+Exports follow PDF_RENDER_BACKEND:
+  - "process": a coordinator thread of this API process (at most
+    PDF_EXPORT_CONCURRENCY at once, further requests get 429) fans patients
+    (grouped by patient_ci) out to the shared render pool of pdf_tasks, so an
+    export never starts processes of its own
+  - "celery": run_clinical_export_task renders the histories one by one on a
+    Celery worker
+
+A doctor has at most one export queued or running; asking again returns it.
+Each history goes through the rendered-PDF store, so unchanged histories are
+reused and later single downloads are cache hits. The ZIP is written to a
+spool file, moved into the same private store (local disk or MinIO), and
+handed out through a time-limited link. Progress is a small JSON document
+next to it, readable from any API process; a running export rewrites it at
+least every PROGRESS_INTERVAL_SECONDS, so one whose process died is reported
+as failed instead of running forever. ZIPs and progress files are deleted
+after PDF_EXPORT_RETENTION_HOURS (purge_expired_exports, Celery beat, and on
+every new export of the doctor).
+"""
+import csv
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status as http_status
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.db.models.consultation import Consultation
+from app.utils import pdf_cache
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+CSV_COLUMNS = [
+    "id", "patient_ci", "patient_name", "patient_age", "patient_phone", "history_number", "created_at",
+    "reason_for_visit", "family_history_mother", "family_history_father", "personal_history",
+    "supplements", "surgical_history", "obstetric_history_summary", "functional_exam_summary",
+    "habits_summary", "physical_exam", "ultrasound", "diagnosis", "plan", "observations",
+]
+
+PROGRESS_INTERVAL_SECONDS = 1.0
+# A running export whose progress is older than this has lost its process
+STALE_AFTER_SECONDS = 120
+# Queued on Celery and never picked up
+QUEUE_TIMEOUT_SECONDS = 3600
+EXPORTS_PREFIX = "exports/"
+# A text cell starting with one of these runs as a formula in spreadsheet tools
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _status_key(doctor_id: int, export_id: str) -> str:
+    return f"exports/{doctor_id}/{export_id}.json"
+
+
+def _active_key(doctor_id: int) -> str:
+    return f"exports/{doctor_id}/active.json"
+
+
+def _zip_key(doctor_id: int, export_id: str) -> str:
+    return f"exports/{doctor_id}/{export_id}.zip"
+
+
+def _age_seconds(moment: Optional[str]) -> float:
+    if not moment:
+        return float("inf")
+    return (datetime.utcnow() - datetime.fromisoformat(moment)).total_seconds()
+
+
+def read_status(doctor_id: int, export_id: str) -> Optional[dict]:
+    """An export's progress (None if unknown or past its retention)."""
+    if not re.fullmatch(r"[0-9a-f]{32}", export_id):
+        return None
+    raw = pdf_cache.read_cached_pdf(_status_key(doctor_id, export_id))
+    if not raw:
+        return None
+    status = json.loads(raw)
+    if _age_seconds(status.get("created_at")) > settings.PDF_EXPORT_RETENTION_HOURS * 3600:
+        return None  # Not purged yet
+    if status["status"] == RUNNING and _age_seconds(status.get("updated_at")) > STALE_AFTER_SECONDS:
+        status.update(status=FAILED, error="Export interrupted (server restarted); start it again")
+    elif status["status"] == QUEUED and _age_seconds(status.get("created_at")) > QUEUE_TIMEOUT_SECONDS:
+        status.update(status=FAILED, error="Export never started; start it again")
+    return status
+
+
+def _write_status(status: dict):
+    status["updated_at"] = datetime.utcnow().isoformat()
+    try:
+        pdf_cache.get_pdf_store().put(
+            _status_key(status["doctor_id"], status["export_id"]),
+            json.dumps(status).encode(), content_type="application/json"
+        )
+    except Exception as e:
+        logger.warning(f"Export {status['export_id']}: could not save progress: {e}")
+
+
+def render_patient_history(doctor_id: int, patient_ci: str) -> str:
+    """Worker process: make sure one patient's history is in the PDF store; returns its key."""
+    from app.services.consultation_pdf import store_report
+
+    db = SessionLocal()
+    try:
+        consultation = db.query(Consultation).filter(
+            Consultation.doctor_id == doctor_id,
+            Consultation.patient_ci == patient_ci
+        ).first()
+        return store_report(db, pdf_cache.HISTORY, consultation)
+    finally:
+        db.close()
+
+
+def _patient_cis(db: Session, doctor_id: int) -> list:
+    rows = db.query(Consultation.patient_ci).filter(
+        Consultation.doctor_id == doctor_id,
+        Consultation.patient_ci.isnot(None)
+    ).distinct().order_by(Consultation.patient_ci).all()
+    return [ci for (ci,) in rows]
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"  # Free text typed by patients: shown as text, never evaluated
+    return value
+
+
+def _write_csv(db: Session, doctor_id: int, zf: zipfile.ZipFile):
+    columns = [getattr(Consultation, name) for name in CSV_COLUMNS]
+    rows = db.query(*columns).filter(Consultation.doctor_id == doctor_id).order_by(
+        Consultation.patient_ci, Consultation.created_at
+    ).yield_per(500)
+    with zf.open("consultas.csv", "w", force_zip64=True) as raw:
+        # utf-8-sig so spreadsheet tools pick up accents correctly
+        with io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") as text:
+            writer = csv.writer(text)
+            writer.writerow(CSV_COLUMNS)
+            for row in rows:
+                writer.writerow([_csv_cell(value) for value in row])
+
+
+def _pdf_name(patient_ci: str, used: set) -> str:
+    safe = re.sub(r"[^0-9A-Za-z._-]+", "_", patient_ci).strip("_") or "sin_ci"
+    name, n = f"historias/{safe}.pdf", 1
+    while name in used:
+        n += 1
+        name = f"historias/{safe}_{n}.pdf"
+    used.add(name)
+    return name
+
+
+def _add_pdf(zf: zipfile.ZipFile, arcname: str, key: str):
+    path = pdf_cache.cached_pdf_path(key)
+    if path:
+        zf.write(path, arcname, compress_type=zipfile.ZIP_STORED)
+        return
+    # Object store: copy in chunks, never the whole file in memory
+    with zf.open(zipfile.ZipInfo(arcname, time.localtime()[:6]), "w", force_zip64=True) as dst:
+        for chunk in pdf_cache.iter_cached_pdf(key):
+            dst.write(chunk)
+
+
+def _render_histories(doctor_id: int, patients: list, executor=None, in_flight: int = 1):
+    """
+    Yield (patient_ci, key or exception) as histories land in the store, and
+    (None, None) while waiting so the caller can report progress. Without an
+    executor they are rendered here, one by one.
+    """
+    if executor is None:
+        for ci in patients:
+            try:
+                yield ci, render_patient_history(doctor_id, ci)
+            except Exception as e:
+                yield ci, e
+        return
+    pending = {}
+    remaining = iter(patients)
+    try:
+        while True:
+            for ci in remaining:
+                pending[executor.submit(render_patient_history, doctor_id, ci)] = ci
+                if len(pending) >= in_flight:
+                    break
+            if not pending:
+                return
+            finished, _ = wait(pending, timeout=PROGRESS_INTERVAL_SECONDS, return_when=FIRST_COMPLETED)
+            if not finished:
+                yield None, None
+            for future in finished:
+                ci = pending.pop(future)
+                try:
+                    yield ci, future.result()
+                except Exception as e:
+                    yield ci, e
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def run_export(doctor_id: int, export_id: str, executor=None, in_flight: int = 1):
+    """
+    Build the ZIP (blocking). Progress is saved as it goes. executor: process
+    pool to render histories on, `in_flight` at a time (inline without one).
+    """
+    status = read_status(doctor_id, export_id) or {"doctor_id": doctor_id, "export_id": export_id}
+    status.update(status=RUNNING, done=0, failed=[], started_at=datetime.utcnow().isoformat())
+
+    db = SessionLocal()
+    fd, spool = tempfile.mkstemp(suffix=".zip", dir=pdf_cache.spool_dir())
+    os.close(fd)
+    try:
+        patients = _patient_cis(db, doctor_id)
+        status["total"] = len(patients)
+        _write_status(status)
+
+        with zipfile.ZipFile(spool, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            _write_csv(db, doctor_id, zf)
+            db.close()
+
+            names = set()
+            last_report = time.monotonic()
+            for ci, result in _render_histories(doctor_id, patients, executor, in_flight):
+                if isinstance(result, Exception):
+                    logger.error(f"Export {export_id}: history for {ci} failed: {result}")
+                    status["failed"].append(ci)
+                elif ci is not None:
+                    _add_pdf(zf, _pdf_name(ci, names), result)
+                    status["done"] += 1
+                if time.monotonic() - last_report >= PROGRESS_INTERVAL_SECONDS:
+                    last_report = time.monotonic()
+                    _write_status(status)
+
+        pdf_cache.store_file(_zip_key(doctor_id, export_id), spool, content_type="application/zip")
+        status.update(status=DONE, finished_at=datetime.utcnow().isoformat())
+    except Exception as e:
+        logger.error(f"Export {export_id} failed: {e}")
+        status.update(status=FAILED, error=str(e), finished_at=datetime.utcnow().isoformat())
+    finally:
+        db.close()
+        if os.path.exists(spool):
+            os.unlink(spool)
+        _write_status(status)
+    return status
+
+
+def _run_in_process(doctor_id: int, export_id: str):
+    from app.tasks.pdf_tasks import get_render_pool
+
+    # Taken once: after shutdown_render_pool() submits fail instead of starting a new pool
+    executor = get_render_pool().executor
+    # One batch in flight, so interactive renders never wait behind a whole export
+    run_export(doctor_id, export_id, executor, in_flight=settings.PDF_RENDER_WORKERS)
+
+
+class ExportRunner:
+    """Coordinator threads of this API process, PDF_EXPORT_CONCURRENCY at most."""
+
+    def __init__(self, max_exports: int):
+        self.max_exports = max_exports
+        self.executor = ThreadPoolExecutor(max_workers=max_exports, thread_name_prefix="clinical-export")
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def submit(self, doctor_id: int, export_id: str):
+        with self._lock:
+            if len(self._running) >= self.max_exports:
+                raise HTTPException(
+                    status_code=http_status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Another export is being prepared; try again in a few minutes"
+                )
+            self._running.add(export_id)
+        future = self.executor.submit(_run_in_process, doctor_id, export_id)
+        future.add_done_callback(lambda f: self._finished(export_id))
+
+    def _finished(self, export_id: str):
+        with self._lock:
+            self._running.discard(export_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_runner: Optional[ExportRunner] = None
+_runner_lock = threading.Lock()
+# Serialises the one-export-per-doctor check within this process
+_start_lock = threading.Lock()
+
+
+def get_export_runner() -> ExportRunner:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = ExportRunner(max(1, settings.PDF_EXPORT_CONCURRENCY))
+        return _runner
+
+
+def shutdown_export_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is not None:
+            _runner.shutdown()
+            _runner = None
+
+
+def active_export(doctor_id: int) -> Optional[dict]:
+    """The doctor's queued or running export, if any."""
+    raw = pdf_cache.read_cached_pdf(_active_key(doctor_id))
+    if not raw:
+        return None
+    status = read_status(doctor_id, json.loads(raw)["export_id"])
+    return status if status and status["status"] in (QUEUED, RUNNING) else None
+
+
+def purge_expired_exports(doctor_id: Optional[int] = None) -> int:
+    """Delete export ZIPs and progress files older than PDF_EXPORT_RETENTION_HOURS."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.PDF_EXPORT_RETENTION_HOURS)
+    prefix = EXPORTS_PREFIX if doctor_id is None else f"{EXPORTS_PREFIX}{doctor_id}/"
+    try:
+        return pdf_cache.get_pdf_store().delete_older_than(prefix, cutoff)
+    except Exception as e:
+        logger.warning(f"Export purge failed for {prefix}: {e}")
+        return 0
+
+
+def start_export(doctor_id: int) -> dict:
+    """Queue an export of the doctor's practice (or return the one in progress)."""
+    with _start_lock:
+        active = active_export(doctor_id)
+        if active is not None:
+            return active
+        purge_expired_exports(doctor_id)
+
+        status = {
+            "doctor_id": doctor_id,
+            "export_id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        if settings.PDF_RENDER_BACKEND == "celery":
+            from app.tasks.export_tasks import run_clinical_export_task
+
+            _write_status(status)
+            run_clinical_export_task.delay(doctor_id, status["export_id"])
+        else:
+            runner = get_export_runner()
+            _write_status(status)
+            try:
+                runner.submit(doctor_id, status["export_id"])
+            except HTTPException:
+                pdf_cache.delete_cached_pdf(_status_key(doctor_id, status["export_id"]))
+                raise
+        pdf_cache.get_pdf_store().put(
+            _active_key(doctor_id), json.dumps({"export_id": status["export_id"]}).encode(),
+            content_type="application/json"
+        )
+    return status
+
+
+def _signature(doctor_id: int, export_id: str, expires: int) -> str:
+    message = f"{doctor_id}:{export_id}:{expires}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def download_url(doctor_id: int, export_id: str) -> Optional[str]:
+    """Time-limited link to a finished export's ZIP."""
+    filename = f"gynsys_export_{export_id[:8]}.zip"
+    if settings.PDF_CACHE_BACKEND == "minio":
+        from app.core.s3 import create_presigned_get
+
+        return create_presigned_get(
+            _zip_key(doctor_id, export_id), bucket=settings.PDF_CACHE_BUCKET,
+            expires_in=settings.PDF_EXPORT_LINK_TTL_SECONDS, filename=filename
+        )
+    expires = int(time.time()) + settings.PDF_EXPORT_LINK_TTL_SECONDS
+    return (
+        f"/api/v1/consultations/exports/{export_id}/download"
+        f"?doctor_id={doctor_id}&expires={expires}&signature={_signature(doctor_id, export_id, expires)}"
+    )
+
+
+def verify_download(doctor_id: int, export_id: str, expires: int, signature: str) -> Optional[str]:
+    """Local ZIP path for a valid, unexpired link (None otherwise)."""
+    if expires < time.time():
+        return None
+    if not hmac.compare_digest(signature, _signature(doctor_id, export_id, expires)):
+        return None
+    return pdf_cache.cached_pdf_path(_zip_key(doctor_id, export_id))
@@ -0,0 +1,171 @@
+"""
+Report data, cache keys and rendering for consultation PDFs.
+
+Shared by the download endpoints and the off-request render jobs
+(app.tasks.pdf_tasks) so both produce the same bytes under the same key.
+
+Medical histories are keyed by hashing the consultations one by one from a
+yield_per query. Histories longer than PDF_HISTORY_STREAM_THRESHOLD are also
+rendered that way, straight to a file, so memory stays flat however many
+years of visits a patient has.
+"""
+import hashlib
+import os
+import tempfile
+from typing import Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models.consultation import Consultation
+from app.db.models.doctor import Doctor
+from app.utils import pdf_cache
+
+HISTORY_COLUMNS = ("created_at", "physical_exam", "ultrasound", "diagnosis", "plan", "observations")
+
+
+def summary_report_data(consultation: Consultation) -> dict:
+    return {
+        "full_name": consultation.patient_name,
+        "ci": consultation.patient_ci,
+        "age": consultation.patient_age,
+        "phone": consultation.patient_phone,
+        "reason_for_visit": consultation.reason_for_visit,
+        "family_history_mother": consultation.family_history_mother,
+        "family_history_father": consultation.family_history_father,
+        "personal_history": consultation.personal_history,
+        "supplements": consultation.supplements,
+        "surgical_history": consultation.surgical_history,
+        "summary_gyn_obstetric": consultation.obstetric_history_summary,
+        "summary_functional_exam": consultation.functional_exam_summary,
+        "summary_habits": consultation.habits_summary,
+        "admin_physical_exam": consultation.physical_exam,
+        "admin_ultrasound": consultation.ultrasound,
+        "admin_diagnosis": consultation.diagnosis,
+        "admin_plan": consultation.plan,
+        "admin_observations": consultation.observations,
+        "history_number": consultation.history_number,
+        "address": "",
+        "occupation": "",
+        "created_at": consultation.created_at,
+    }
+
+
+def _patient_history(db: Session, consultation: Consultation):
+    # ALL consultations for this patient (same CI and doctor)
+    return db.query(Consultation).filter(
+        Consultation.patient_ci == consultation.patient_ci,
+        Consultation.doctor_id == consultation.doctor_id
+    )
+
+
+def history_patient_data(db: Session, consultation: Consultation) -> dict:
+    """Demographics and preconsultation data, taken from the MOST RECENT consultation."""
+    latest = _patient_history(db, consultation).order_by(Consultation.created_at.desc()).first() or consultation
+    return {
+        "full_name": latest.patient_name,
+        "ci": latest.patient_ci,
+        "age": latest.patient_age,
+        "phone": latest.patient_phone,
+        "reason_for_visit": latest.reason_for_visit,
+        "family_history_mother": latest.family_history_mother,
+        "family_history_father": latest.family_history_father,
+        "personal_history": latest.personal_history,
+        "supplements": latest.supplements,
+        "surgical_history": latest.surgical_history,
+        "summary_gyn_obstetric": latest.obstetric_history_summary,
+        "summary_functional_exam": latest.functional_exam_summary,
+        "summary_habits": latest.habits_summary,
+        "history_number": latest.history_number,
+        "address": "",
+        "occupation": "",
+    }
+
+
+def iter_history_consultations(db: Session, consultation: Consultation) -> Iterator[dict]:
+    """The patient's consultations, oldest first, streamed from a server-side cursor."""
+    columns = [getattr(Consultation, name) for name in HISTORY_COLUMNS]
+    rows = _patient_history(db, consultation).with_entities(*columns).order_by(
+        Consultation.created_at.asc(), Consultation.id.asc()
+    ).yield_per(settings.PDF_HISTORY_YIELD_PER)
+    for row in rows:
+        yield dict(zip(HISTORY_COLUMNS, row))
+
+
+def history_report_data(db: Session, consultation: Consultation) -> dict:
+    data = history_patient_data(db, consultation)
+    # Add ALL consultations for cumulative display
+    data["all_consultations"] = list(iter_history_consultations(db, consultation))
+    return data
+
+
+def is_long_history(db: Session, consultation: Consultation) -> bool:
+    return _patient_history(db, consultation).count() > settings.PDF_HISTORY_STREAM_THRESHOLD
+
+
+def patient_group(consultation: Consultation) -> str:
+    """Stable, non-identifying name for a patient's history versions in the PDF store."""
+    return hashlib.sha256(f"{consultation.patient_ci}".encode()).hexdigest()[:16]
+
+
+def report_key(db: Session, kind: str, consultation: Consultation) -> str:
+    doctor = db.query(Doctor).filter(Doctor.id == consultation.doctor_id).first()
+    if kind == pdf_cache.HISTORY:
+        # Grouped per patient: a new consultation's history replaces the previous file
+        return pdf_cache.pdf_key_stream(
+            kind, consultation.doctor_id, history_patient_data(db, consultation),
+            iter_history_consultations(db, consultation), doctor, group=patient_group(consultation)
+        )
+    return pdf_cache.pdf_key(kind, consultation.doctor_id, summary_report_data(consultation), doctor)
+
+
+def render_report(kind: str, data: dict, doctor_id: Optional[int], db: Session = None) -> bytes:
+    """Run the ReportLab layout for one report in memory (CPU-bound)."""
+    from app.utils.pdf_generator import generate_medical_report, generate_summary_report
+
+    if kind == pdf_cache.HISTORY:
+        return generate_medical_report(data, doctor_id, db).getvalue()
+    return generate_summary_report(data, doctor_id, db).getvalue()
+
+
+def stream_history_to_store(db: Session, consultation: Consultation, key: str, always_store: bool = False) -> Optional[str]:
+    """
+    Render a long medical history to a temporary file and move it into the
+    PDF store under `key`. Returns the temporary file's path when it was not
+    stored (cache disabled); the caller serves and then deletes it.
+    """
+    from app.utils.pdf_generator import stream_medical_report
+
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=pdf_cache.spool_dir())
+    os.close(fd)
+    try:
+        stream_medical_report(
+            history_patient_data(db, consultation), iter_history_consultations(db, consultation),
+            consultation.doctor_id, db, path
+        )
+        if not settings.PDF_CACHE_ENABLED and not always_store:
+            return path
+        pdf_cache.store_file(key, path)
+    except Exception:
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+    return None
+
+
+def store_report(db: Session, kind: str, consultation: Consultation, key: Optional[str] = None) -> str:
+    """Make sure the report is in the PDF store (render jobs); returns its key."""
+    key = key or report_key(db, kind, consultation)
+    if pdf_cache.has_cached_pdf(key):
+        return key
+
+    if kind == pdf_cache.HISTORY and is_long_history(db, consultation):
+        stream_history_to_store(db, consultation, key, always_store=True)
+    else:
+        data = history_report_data(db, consultation) if kind == pdf_cache.HISTORY else summary_report_data(consultation)
+        pdf_cache.get_or_render(
+            key, lambda: render_report(kind, data, consultation.doctor_id, db), always_store=True
+        )
+    if kind == pdf_cache.SUMMARY:
+        pdf_cache.remember_summary(db, consultation, key)
+    return key
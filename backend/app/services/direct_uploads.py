@@ -0,0 +1,133 @@
+"""
+Direct-to-bucket uploads.
+
+With the "minio" media storage a client does not have to send the bytes
+through the API: start_direct_upload() checks the declared size and type,
+and returns a presigned PUT for a fresh "incoming/" key. It also returns a
+signed token carrying the doctor, the upload kind, the key and the declared
+size, so any replica can finish the upload. The client PUTs the file to the
+bucket and calls complete_direct_upload(). That checks the stored object
+(size, type sniffed from its first bytes) and gives it its final key inside
+the bucket (a server-side copy): images go into the content-addressed media
+store (hashed here, they are at most MAX_UPLOAD_SIZE) and videos get a
+per-upload name, hashed only when the client sends the SHA-256 it expects.
+
+Incoming objects that were never completed are removed by the media store
+collector (app.services.media_store).
+"""
+import hashlib
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.core.security import create_access_token, verify_access_token
+from app.services.media_store import blob_key, register_blob
+from app.utils.media_storage import get_media_storage, url_for_key
+from app.utils.upload_stream import (
+    IMAGE_TYPES, SNIFF_BYTES, StoredUpload, key_for, max_size_for, sniff_content_type, too_large,
+    unsupported_type, upload_stem,
+)
+
+INCOMING_PREFIX = "incoming/"
+TOKEN_SCOPE = "direct_upload"
+
+
+def start_direct_upload(doctor_id: int, kind: str, allowed_types: Dict[str, str], size: int,
+                        content_type: str, filename: Optional[str] = None) -> dict:
+    storage = get_media_storage()
+    max_size = max_size_for(allowed_types)
+    if size > max_size:
+        raise too_large(max_size)
+    if content_type not in allowed_types:
+        raise unsupported_type(allowed_types)
+
+    key = f"{INCOMING_PREFIX}{uuid.uuid4().hex}{allowed_types[content_type]}"
+    expires_in = settings.DIRECT_UPLOAD_TTL_SECONDS
+    upload_url = storage.presigned_put(key, content_type, expires_in)
+    if upload_url is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Direct uploads need the minio media storage; use the streaming upload endpoints"
+        )
+    token = create_access_token(
+        {
+            "scope": TOKEN_SCOPE, "doctor_id": doctor_id, "kind": kind, "key": key, "size": size,
+            "content_type": content_type, "filename": filename,
+        },
+        expires_delta=timedelta(seconds=expires_in * 2),
+    )
+    return {
+        "upload_url": upload_url,
+        "method": "PUT",
+        "headers": {"Content-Type": content_type},
+        "token": token,
+        "expires_in": expires_in,
+    }
+
+
+def read_direct_upload(doctor_id: int, token: str) -> dict:
+    """The upload a completion token was issued for (404 for foreign, forged or expired tokens)."""
+    claims = verify_access_token(token)
+    if not claims or claims.get("scope") != TOKEN_SCOPE or claims.get("doctor_id") != doctor_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+    return claims
+
+
+def _sha256(key: str) -> str:
+    digest = hashlib.sha256()
+    for chunk in get_media_storage().iter_chunks(key):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def complete_direct_upload(claims: dict, directory: Path, allowed_types: Dict[str, str],
+                           expected_sha256: Optional[str] = None) -> StoredUpload:
+    """Validate the object the client PUT and move it to its final key. Blocking (storage calls)."""
+    storage = get_media_storage()
+    incoming = claims["key"]
+    size = storage.size(incoming)
+    if size is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Nothing was uploaded yet")
+    try:
+        max_size = max_size_for(allowed_types)
+        if size > max_size:
+            raise too_large(max_size)
+        if size != claims["size"]:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Upload size mismatch: declared {claims['size']} bytes, received {size}"
+            )
+        content_type = sniff_content_type(storage.read_head(incoming, SNIFF_BYTES))
+        if content_type not in allowed_types:
+            raise unsupported_type(allowed_types)
+        extension = allowed_types[content_type]
+
+        content_addressed = settings.MEDIA_STORE_ENABLED and allowed_types == IMAGE_TYPES
+        sha256 = _sha256(incoming) if content_addressed or expected_sha256 else None
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="SHA-256 mismatch: the upload is corrupt, upload it again"
+            )
+
+        if content_addressed:
+            key = blob_key(sha256, extension)
+            # Row first, like store_blob(): the collector deletes an object only while holding its row
+            register_blob(sha256, url_for_key(key), content_type, size)
+            if not storage.exists(key):
+                storage.copy(incoming, key)
+        else:
+            key = key_for(directory / f"{upload_stem(claims['doctor_id'], claims['kind'])}{extension}")
+            storage.copy(incoming, key)
+    finally:
+        # A rejected upload is not kept either
+        storage.delete(incoming)
+
+    return StoredUpload(
+        key=key, url=url_for_key(key), size=size, sha256=sha256,
+        content_type=content_type, filename=claims.get("filename")
+    )
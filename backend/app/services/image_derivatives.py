@@ -0,0 +1,284 @@
+"""
+Resized WebP/AVIF variants of uploaded images.
+
+The upload endpoints store originals byte-for-byte in the media storage;
+public pages should not ship those to phones. After an upload, a background
+job (app.tasks.image_tasks) decodes the original once, applies EXIF
+orientation and the gallery crop, and stores each of IMAGE_DERIVATIVE_FORMATS
+at each of IMAGE_DERIVATIVE_WIDTHS (never upscaled) under "derived/", plus a
+tiny placeholder. The result is an ImageDerivative row per (original, crop).
+
+Public endpoints batch-load the finished rows for the images they return
+(VariantIndex) and fall back to the original while a job is still running.
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import posixpath
+import uuid
+from pathlib import Path
+from typing import Iterable, Optional
+
+from PIL import Image, ImageOps, features
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models.image_derivative import ImageDerivative
+from app.schemas.image import ImageVariants
+from app.utils.media_storage import get_media_storage, key_for_url, url_for_key
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+UPLOAD_DIR = Path(settings.UPLOAD_DIR).resolve()
+DERIVED_DIR = UPLOAD_DIR / "derived"  # Also the staging directory of the "minio" backend
+DERIVED_PREFIX = "derived/"
+
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+SAVE_OPTIONS = {
+    "webp": {"quality": 78, "method": 4},
+    "avif": {"quality": 55, "speed": 6},
+}
+PLACEHOLDER_WIDTH = 16
+
+
+def crop_area(crop) -> Optional[dict]:
+    """croppedArea of a gallery crop ({x, y, width, height}), if it crops anything."""
+    area = crop.get("croppedArea") if isinstance(crop, dict) else None
+    if not isinstance(area, dict):
+        return None
+    try:
+        area = {k: float(area.get(k, 0)) for k in ("x", "y", "width", "height")}
+    except (TypeError, ValueError):
+        return None
+    if area["width"] <= 0 or area["height"] <= 0:
+        return None
+    return area
+
+
+def crop_key(crop) -> str:
+    area = crop_area(crop)
+    if area is None:
+        return ""
+    canonical = json.dumps({k: round(v, 4) for k, v in area.items()}, sort_keys=True)
+    return hashlib.sha1(canonical.encode()).hexdigest()[:12]
+
+
+def crop_box(crop, size) -> Optional[tuple]:
+    """Pixel box for the crop; percent-based like the editor, or legacy pixel values."""
+    area = crop_area(crop)
+    if area is None:
+        return None
+    width, height = size
+    if area["width"] > 100:
+        # Legacy pixel-based crops (see scripts/normalize_gallery_crops.py)
+        left, top, right, bottom = area["x"], area["y"], area["x"] + area["width"], area["y"] + area["height"]
+    else:
+        left = area["x"] * width / 100
+        top = area["y"] * height / 100
+        right = (area["x"] + area["width"]) * width / 100
+        bottom = (area["y"] + area["height"]) * height / 100
+    box = (
+        max(0, round(left)), max(0, round(top)),
+        min(width, round(right)), min(height, round(bottom)),
+    )
+    if box[2] - box[0] < 1 or box[3] - box[1] < 1 or box == (0, 0, width, height):
+        return None
+    return box
+
+
+def source_key(source_url: Optional[str]) -> Optional[str]:
+    """Storage key of an uploaded original (None for external or derived URLs)."""
+    key = key_for_url(source_url)
+    if key is None or key.startswith(DERIVED_PREFIX):
+        return None
+    return key
+
+
+def derived_key(url: Optional[str]) -> Optional[str]:
+    key = key_for_url(url)
+    return key if key is not None and key.startswith(DERIVED_PREFIX) else None
+
+
+def formats() -> list:
+    """Configured formats this Pillow build can encode."""
+    supported = []
+    for fmt in settings.IMAGE_DERIVATIVE_FORMATS:
+        fmt = fmt.lower()
+        if fmt in MIME_TYPES and features.check(fmt):
+            supported.append(fmt)
+        else:
+            logger.warning(f"Image derivatives: format {fmt!r} not supported by this Pillow build, skipped")
+    return supported
+
+
+def _normalized(image: Image.Image) -> Image.Image:
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    mode = "RGBA" if has_alpha else "RGB"
+    return image if image.mode == mode else image.convert(mode)
+
+
+def _save(image: Image.Image, key: str, fmt: str):
+    DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = DERIVED_DIR / f".{uuid.uuid4().hex}.{fmt}"
+    try:
+        image.save(tmp, fmt.upper(), **SAVE_OPTIONS[fmt])
+        get_media_storage().put_file(key, tmp, MIME_TYPES[fmt])
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _placeholder(image: Image.Image) -> str:
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    small = image.resize((PLACEHOLDER_WIDTH, height), Image.BILINEAR)
+    buffer = io.BytesIO()
+    small.save(buffer, "WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def render_derivatives(source_url: str, crop=None) -> dict:
+    """Store every variant of the image under "derived/". Blocking and CPU-bound."""
+    source = source_key(source_url)
+    if source is None:
+        raise FileNotFoundError(f"No stored file for {source_url}")
+
+    key = crop_key(crop)
+    folder, name = posixpath.split(source)
+    name = posixpath.splitext(name)[0]
+    stem = f"{name}.{key}" if key else name
+
+    with get_media_storage().local_file(source) as path, Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        box = crop_box(crop, image.size)
+        if box:
+            image = image.crop(box)
+        image = _normalized(image)
+
+    widths = sorted({min(w, image.width) for w in settings.IMAGE_DERIVATIVE_WIDTHS}, reverse=True)
+    variants = []
+    current = image
+    # Largest first, each step resized from the previous one
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        if current.size != (width, height):
+            current = current.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for fmt in formats():
+            variant_key = posixpath.join(DERIVED_PREFIX + folder, f"{stem}.{width}.{fmt}")
+            _save(current, variant_key, fmt)
+            variants.append({
+                "url": url_for_key(variant_key),
+                "width": width,
+                "height": height,
+                "type": MIME_TYPES[fmt],
+            })
+
+    variants.sort(key=lambda v: (v["width"], v["type"]))
+    return {
+        "width": image.width,
+        "height": image.height,
+        "variants": variants,
+        "placeholder": _placeholder(current),
+    }
+
+
+def _complete(row: ImageDerivative) -> bool:
+    """Finished and every variant file still on disk."""
+    storage = get_media_storage()
+    return row.status == DONE and bool(row.variants) and all(
+        storage.exists(derived_key(variant["url"]) or "") for variant in row.variants
+    )
+
+
+def build_derivatives(doctor_id: Optional[int], source_url: str, crop=None, force: bool = False) -> str:
+    """
+    Background job: render the variants and record them; returns the row status.
+    Store blobs are shared, so variants another upload of the same bytes already
+    built are reused unless `force`.
+    """
+    from app.db.base import SessionLocal
+
+    key = crop_key(crop)
+    db = SessionLocal()
+    try:
+        row = db.query(ImageDerivative).filter(
+            ImageDerivative.source_url == source_url,
+            ImageDerivative.crop_key == key
+        ).first()
+        if row is None:
+            row = ImageDerivative(source_url=source_url, crop_key=key, doctor_id=doctor_id)
+            db.add(row)
+        if not force and _complete(row):
+            db.commit()
+            return row.status
+        try:
+            result = render_derivatives(source_url, crop)
+            row.status = DONE
+            row.error = None
+            row.width = result["width"]
+            row.height = result["height"]
+            row.variants = result["variants"]
+            row.placeholder = result["placeholder"]
+        except Exception as e:
+            logger.error(f"Image derivatives for {source_url} failed: {e}")
+            row.status = FAILED
+            row.error = str(e)[:500]
+        db.commit()
+        return row.status
+    finally:
+        db.close()
+
+
+def discard_derivatives(db: Session, source_url: Optional[str], crop=None, all_crops: bool = False):
+    """Delete the rows and files of an original (one crop, or every crop). Caller commits."""
+    if not source_url:
+        return
+    query = db.query(ImageDerivative).filter(ImageDerivative.source_url == source_url)
+    if not all_crops:
+        query = query.filter(ImageDerivative.crop_key == crop_key(crop))
+    for row in query.all():
+        discard_derivative_row(db, row)
+
+
+def discard_derivative_row(db: Session, row: ImageDerivative):
+    for variant in row.variants or []:
+        key = derived_key(variant["url"])
+        if key is not None:
+            get_media_storage().delete(key)
+    db.delete(row)
+
+
+def derivatives_query(source_urls: Iterable[Optional[str]]):
+    """Finished rows for these originals (works with Session and AsyncSession)."""
+    urls = {url for url in source_urls if url}
+    return select(ImageDerivative).where(
+        ImageDerivative.source_url.in_(urls),
+        ImageDerivative.status == DONE
+    )
+
+
+class VariantIndex:
+    """Finished derivatives of a page's images, looked up by (url, crop)."""
+
+    def __init__(self, rows: Iterable[ImageDerivative] = ()):
+        self._rows = {(row.source_url, row.crop_key): row for row in rows}
+
+    def get(self, source_url: Optional[str], crop=None) -> Optional[ImageVariants]:
+        row = self._rows.get((source_url, crop_key(crop)))
+        if row is None:
+            return None
+        return ImageVariants(
+            width=row.width, height=row.height, placeholder=row.placeholder or "", sources=row.variants or []
+        )
+
+
+def load_variant_index(db: Session, source_urls: Iterable[Optional[str]]) -> VariantIndex:
+    urls = [url for url in source_urls if url]
+    if not urls:
+        return VariantIndex()
+    return VariantIndex(db.execute(derivatives_query(urls)).scalars())
@@ -0,0 +1,315 @@
+"""
+Content-addressed media store for uploaded images.
+
+Uploads used to be written as `{doctor_id}_{type}_{timestamp}` files, so the
+same logo uploaded twice, a template applied to a new tenant or a replaced
+gallery image all left another copy behind, and nothing deleted the old ones
+(cleanup_orphaned_gallery.py is run by hand). Now an upload is named by its
+SHA-256, as media/ab/ab12...ef.jpg in the media storage
+(app.utils.media_storage). Identical bytes are stored once, and a URL never
+changes content, so it can be cached forever.
+
+Each file has a MediaBlob row. Its ref_count follows the columns listed in
+MEDIA_REFERENCES: a Session hook adjusts it in the same transaction as the
+insert/update/delete of the referencing record. Writes the hook cannot see
+(bulk deletes, FK cascades, processes that never imported this module) are
+corrected by the garbage collector, which recounts from the tables.
+
+collect_garbage() (Celery beat, see app.tasks.media_tasks) deletes blobs that
+nothing has referenced for MEDIA_GC_GRACE_HOURS: an upload is only saved on a
+record afterwards (blog covers, services...), and the grace period leaves
+time for that. Before deleting, it locks the row and recounts that one URL.
+Uploads touch the row before placing the file, so re-uploading the same bytes
+during a collection either keeps the blob or writes the file again.
+"""
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy import event, inspect as sa_inspect, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.models.media_blob import MediaBlob
+from app.services.image_derivatives import (
+    crop_key, discard_derivative_row, discard_derivatives, source_key,
+)
+from app.utils.media_storage import get_media_storage
+from app.utils.upload_stream import IMAGE_TYPES, FileSink, StoredUpload, receive_upload
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = Path(settings.UPLOAD_DIR).resolve()
+MEDIA_DIR = UPLOAD_DIR / "media"  # Uploads in progress are staged here
+MEDIA_URL_PREFIX = "/uploads/media/"
+
+# Record columns that point at store URLs (model name -> attributes)
+MEDIA_REFERENCES = {
+    "Doctor": ("logo_url", "photo_url", "pdf_config"),
+    "DoctorCertification": ("logo_url",),
+    "GalleryImage": ("image_url",),
+    "BlogPost": ("cover_image",),
+    "Service": ("image_url",),
+    "Testimonial": ("photo_url",),
+    "Location": ("image_url",),
+    "Recommendation": ("image_url",),
+}
+# JSON columns: the keys holding image URLs (PDF header logo and signature)
+JSON_REFERENCES = {"pdf_config": ("logo_header_1", "logo_signature")}
+
+
+def media_url(value) -> Optional[str]:
+    """The store URL in a column value ("/uploads/media/..."; absolute URLs too), if any."""
+    if not isinstance(value, str) or MEDIA_URL_PREFIX not in value:
+        return None
+    return MEDIA_URL_PREFIX + value.split(MEDIA_URL_PREFIX, 1)[1].split("?", 1)[0]
+
+
+def is_media_url(url: Optional[str]) -> bool:
+    return media_url(url) is not None
+
+
+def blob_key(sha256: str, extension: str) -> str:
+    return f"media/{sha256[:2]}/{sha256}{extension}"
+
+
+def reference_urls(attr: str, value) -> List[str]:
+    """Store URLs held by one column value."""
+    if attr in JSON_REFERENCES:
+        values = [value.get(key) for key in JSON_REFERENCES[attr]] if isinstance(value, dict) else []
+    else:
+        values = [value]
+    return [url for url in map(media_url, values) if url]
+
+
+def register_blob(sha256: str, url: str, content_type: str, size: int):
+    """Create the blob's row, or touch it so a running collection keeps it. Own transaction."""
+    from app.db.base import engine
+
+    table = MediaBlob.__table__
+    touch = update(table).where(table.c.sha256 == sha256).values(updated_at=datetime.now(timezone.utc))
+    with engine.begin() as conn:
+        if conn.execute(touch).rowcount:
+            return
+    try:
+        with engine.begin() as conn:
+            conn.execute(table.insert().values(
+                sha256=sha256, url=url, content_type=content_type, size=size, ref_count=0,
+                updated_at=datetime.now(timezone.utc)
+            ))
+    except IntegrityError:
+        # The same bytes arrived concurrently
+        with engine.begin() as conn:
+            conn.execute(touch)
+
+
+async def store_blob(sink: FileSink, filename: Optional[str] = None) -> StoredUpload:
+    """receive_upload() commit: keep the bytes under their hash, once."""
+    await sink.finish()
+    stored = sink.stored(blob_key(sink.sha256, sink.extension), filename)
+    # Row first: the collector deletes a file only while holding its row
+    await run_in_threadpool(register_blob, stored.sha256, stored.url, stored.content_type, stored.size)
+    storage = get_media_storage()
+    if await run_in_threadpool(storage.exists, stored.key):
+        sink.discard()
+    else:
+        await run_in_threadpool(storage.put_file, stored.key, sink.tmp_path, stored.content_type)
+    return stored
+
+
+async def receive_media(
+    request: Request,
+    directory: Path,
+    doctor_id: int,
+    file_type: str,
+    allowed_types: Dict[str, str] = IMAGE_TYPES,
+) -> StoredUpload:
+    """
+    Stream an upload into the store. With MEDIA_STORE_ENABLED off it goes to
+    `directory` under a per-upload name as before.
+    """
+    if not settings.MEDIA_STORE_ENABLED:
+        return await receive_upload(request, directory, doctor_id, file_type, allowed_types)
+    return await receive_upload(request, MEDIA_DIR, doctor_id, file_type, allowed_types, commit=store_blob)
+
+
+def release_image(db: Session, url: Optional[str], crop=None, all_crops: bool = False):
+    """
+    A record stopped using `url` (for a crop). Store blobs may be shared, so
+    they and their variants are left to the collector; legacy per-upload
+    files go now. Caller commits.
+    """
+    if not url or is_media_url(url):
+        return
+    discard_derivatives(db, url, crop, all_crops=all_crops)
+    if all_crops:
+        key = source_key(url)
+        if key is not None:
+            get_media_storage().delete(key)
+
+
+# --- Reference counting ----------------------------------------------------
+
+def _reference_delta(session: Session) -> Counter:
+    delta = Counter()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        attrs = MEDIA_REFERENCES.get(type(obj).__name__)
+        if not attrs:
+            continue
+        state = sa_inspect(obj)
+        for attr in attrs:
+            # Not loaded when flushed (expired old value): the collector corrects the count
+            history = state.attrs[attr].history
+            if obj in session.new:
+                added, removed = chain(history.added, history.unchanged), ()
+            elif obj in session.deleted:
+                added, removed = (), chain(history.unchanged, history.deleted)
+            else:
+                added, removed = history.added, history.deleted
+            for value in added:
+                delta.update(reference_urls(attr, value))
+            for value in removed:
+                delta.subtract(reference_urls(attr, value))
+    return delta
+
+
+@event.listens_for(Session, "after_flush")
+def _count_media_references(session, flush_context):
+    delta = {url: n for url, n in _reference_delta(session).items() if n}
+    if not delta:
+        return
+    table = MediaBlob.__table__
+    connection = session.connection()
+    for url, n in delta.items():
+        result = connection.execute(
+            update(table).where(table.c.url == url)
+            .values(ref_count=table.c.ref_count + n, updated_at=datetime.now(timezone.utc))
+        )
+        if n > 0 and not result.rowcount:
+            logger.warning(f"Media store: {url} is referenced but has no blob")
+
+
+def reference_models() -> dict:
+    from app.db.base import Base
+
+    return {mapper.class_.__name__: mapper.class_ for mapper in Base.registry.mappers}
+
+
+def count_references(db: Session, url: Optional[str] = None) -> Counter:
+    """References per store URL, counted from the tables (only `url` if given)."""
+    models = reference_models()
+    counts = Counter()
+    for name, attrs in MEDIA_REFERENCES.items():
+        model = models[name]
+        for attr in attrs:
+            column = getattr(model, attr)
+            query = db.query(column).filter(column.isnot(None))
+            if attr not in JSON_REFERENCES:
+                query = query.filter(column.like(f"%{url or MEDIA_URL_PREFIX}%"))
+            for (value,) in query.yield_per(1000):
+                for ref in reference_urls(attr, value):
+                    if url is None or ref == url:
+                        counts[ref] += 1
+    return counts
+
+
+# --- Garbage collection ----------------------------------------------------
+
+def _older(moment: Optional[datetime], cutoff: datetime) -> bool:
+    if moment is None:
+        return True
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)  # SQLite drops the zone; stored as UTC
+    return moment < cutoff
+
+
+def _purge_partial_files(cutoff: datetime):
+    """Temp files of uploads that died mid-stream."""
+    if not MEDIA_DIR.exists():
+        return
+    for path in MEDIA_DIR.glob(".*.part"):
+        try:
+            if path.stat().st_mtime < cutoff.timestamp():
+                path.unlink(missing_ok=True)
+        except OSError:
+            continue
+
+
+def _discard_unused_crops(db: Session) -> int:
+    """Variants of crops no gallery image uses any more (blobs themselves may still be in use)."""
+    from app.db.models.gallery import GalleryImage
+    from app.db.models.image_derivative import ImageDerivative
+
+    used = {
+        (url, crop_key(crop)) for url, crop in db.query(GalleryImage.image_url, GalleryImage.crop)
+        .filter(GalleryImage.image_url.like(f"{MEDIA_URL_PREFIX}%"))
+    }
+    discarded = 0
+    for row in db.query(ImageDerivative).filter(
+        ImageDerivative.source_url.like(f"{MEDIA_URL_PREFIX}%"),
+        ImageDerivative.crop_key != ""
+    ).all():
+        if (row.source_url, row.crop_key) not in used:
+            discard_derivative_row(db, row)
+            discarded += 1
+    db.commit()
+    return discarded
+
+
+def collect_garbage(grace_hours: Optional[int] = None) -> dict:
+    """Reconcile ref_count with the tables and delete blobs unreferenced for the grace period."""
+    from app.db.base import SessionLocal
+
+    started = time.perf_counter()
+    grace = settings.MEDIA_GC_GRACE_HOURS if grace_hours is None else grace_hours
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace)
+    stats = {"blobs": 0, "reconciled": 0, "deleted": 0, "freed_bytes": 0, "crops_discarded": 0}
+
+    db = SessionLocal()
+    try:
+        counts = count_references(db)
+        candidates = []
+        for blob in db.query(MediaBlob).all():
+            stats["blobs"] += 1
+            actual = counts.get(blob.url, 0)
+            if blob.ref_count != actual:
+                # Also restarts the grace period of a blob whose last reference went unnoticed
+                blob.ref_count = actual
+                stats["reconciled"] += 1
+            elif actual == 0 and _older(blob.updated_at, cutoff):
+                candidates.append(blob.id)
+        db.commit()
+
+        for blob_id in candidates:
+            blob = db.query(MediaBlob).filter(MediaBlob.id == blob_id).with_for_update().first()
+            # Under the row lock: a new reference or an upload of the same bytes keeps it
+            if (blob is None or blob.ref_count > 0 or not _older(blob.updated_at, cutoff)
+                    or count_references(db, blob.url)):
+                db.rollback()
+                continue
+            discard_derivatives(db, blob.url, all_crops=True)
+            key = source_key(blob.url)
+            if key is not None:
+                get_media_storage().delete(key)
+            stats["deleted"] += 1
+            stats["freed_bytes"] += blob.size
+            db.delete(blob)
+            db.commit()
+
+        stats["crops_discarded"] = _discard_unused_crops(db)
+    finally:
+        db.close()
+
+    _purge_partial_files(cutoff)
+    # Direct uploads that were never completed (app.services.direct_uploads)
+    stats["incoming_discarded"] = get_media_storage().delete_older_than("incoming/", cutoff)
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"Media store GC: {stats}")
+    return stats
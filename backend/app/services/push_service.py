@@ -4,8 +4,9 @@ import re
 from html import unescape
 from typing import Dict, Any, Optional
 
-from pywebpush import webpush, WebPushException
-from app.core.config import settings
+from sqlalchemy.orm import Session
+
+from app.core.push import DELIVERED, EXPIRED, get_push_engine, to_subscription_info, delete_expired_subscriptions
 from app.db.models.cycle_user import CycleUser
 
 logger = logging.getLogger(__name__)
@@ -27,7 +28,8 @@ def send_push_notification(
     icon: Optional[str] = "/icon-192x192.png",
     badge: Optional[str] = "/badge-72x72.png",
     data: Optional[Dict[str, Any]] = None,
-    image: Optional[str] = None
+    image: Optional[str] = None,
+    db: Optional[Session] = None
 ) -> Dict[str, Any]:
     """
     Send a push notification to a user using pywebpush.
@@ -40,6 +42,7 @@ def send_push_notification(
         badge: Path to badge image
         data: Custom data dictionary
         image: Optional large image URL
+        db: Optional session used to delete expired (404/410) subscriptions
         
     Returns:
         Dict with status of the operation
@@ -60,51 +63,36 @@ def send_push_notification(
     if image:
         payload["image"] = image
         
+    subscriptions = list(user.push_subscriptions)
+    engine = get_push_engine()
+    if engine is None:
+        return {"success": False, "error": "VAPID configuration missing"}
+
+    # Send to all registered devices concurrently
+    message = json.dumps(payload)
+    results = engine.send_many([(to_subscription_info(sub), message) for sub in subscriptions])
+
     success_count = 0
     errors = []
-
-    # Send to all registered devices
-    for sub in user.push_subscriptions:
-        subscription_info = {
-            "endpoint": sub.endpoint,
-            "keys": {
-                "p256dh": sub.p256dh,
-                "auth": sub.auth
-            }
-        }
-            
-        try:
-            # Send notification
-            response = webpush(
-                subscription_info=subscription_info,
-                data=json.dumps(payload),
-                vapid_private_key=settings.VAPID_PRIVATE_KEY,
-                vapid_claims={
-                    "sub": f"mailto:{settings.EMAILS_FROM_EMAIL}"
-                }
-            )
+    expired_ids = []
+    for sub, (status, error) in zip(subscriptions, results):
+        if status == DELIVERED:
             success_count += 1
-            
-        except WebPushException as ex:
-            logger.error(f"WebPush error for user {user.id} device {sub.id}: {str(ex)}")
-            
-            # Check if subscription is expired/invalid
-            if ex.response and ex.response.status_code in [404, 410]:
-                # Automatically remove invalid subscription
-                # Note: We need a db session here to delete, but for now we skip
-                pass
-                
-            errors.append(str(ex))
-            
-        except Exception as e:
-            logger.error(f"Unexpected error sending push to user {user.id}: {str(e)}")
-            errors.append(str(e))
+            continue
+        logger.error(f"WebPush error for user {user.id} device {sub.id}: {error}")
+        if status == EXPIRED:
+            expired_ids.append(sub.id)
+        errors.append(error)
+
+    # Automatically remove invalid subscriptions when we have a session
+    if db is not None and expired_ids:
+        delete_expired_subscriptions(db, expired_ids)
             
     if success_count > 0:
         return {
             "success": True, 
             "message": f"Sent to {success_count} devices",
-            "device_count": len(user.push_subscriptions)
+            "device_count": len(subscriptions)
         }
     else:
         return {
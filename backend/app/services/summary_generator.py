@@ -5,6 +5,112 @@ from typing import Optional, Union, List, Dict, Any
 
 logger = logging.getLogger(__name__)
 
+_WORD_RE = re.compile(r"\w+")
+
+
+class KeywordIndex:
+    """
+    Inverted index over (lowercased) question texts for keyword lookups.
+
+    Matching keeps the substring semantics of the original linear scans:
+    "embaraz" matches "embarazada" and multi-word terms match as phrases.
+    Each term is resolved once against the token vocabulary and memoized, so
+    a lookup is a few set operations over question positions.
+    """
+
+    def __init__(self, texts: List[str]):
+        self.texts = list(texts)
+        self._tokens: Dict[str, set] = {}
+        for pos, text in enumerate(self.texts):
+            for token in _WORD_RE.findall(text):
+                self._tokens.setdefault(token, set()).add(pos)
+        self._postings: Dict[str, frozenset] = {}
+
+    def postings(self, term: str) -> frozenset:
+        """Positions of the texts that contain `term`."""
+        found = self._postings.get(term)
+        if found is not None:
+            return found
+
+        words = _WORD_RE.findall(term)
+        if len(words) == 1 and words[0] == term:
+            # A single word can only occur inside one token of the text
+            matches = set()
+            for token, positions in self._tokens.items():
+                if term in token:
+                    matches |= positions
+        else:
+            # Phrases (or punctuation): narrow down by their words, then confirm
+            candidates = frozenset.intersection(*[self.postings(w) for w in words]) if words else range(len(self.texts))
+            matches = {pos for pos in candidates if term in self.texts[pos]}
+
+        found = self._postings[term] = frozenset(matches)
+        return found
+
+    def first_with_all(self, terms: List[str], exclude: List[str] = (), among: frozenset = None) -> Optional[int]:
+        """First position whose text contains every term and none of `exclude`."""
+        if not terms:
+            return None
+        matches = frozenset.intersection(*[self.postings(t) for t in terms])
+        if among is not None:
+            matches &= among
+        for ex in exclude:
+            if not matches:
+                break
+            matches -= self.postings(ex)
+        return min(matches) if matches else None
+
+    def first_with_any(self, terms: List[str]) -> Optional[int]:
+        """First position whose text contains at least one term."""
+        matches = frozenset().union(*[self.postings(t) for t in terms])
+        return min(matches) if matches else None
+
+
+class QuestionTextMap(dict):
+    """
+    text_map of the legacy generator (question text -> answer) that keeps a
+    KeywordIndex of its questions, rebuilt after any change.
+    """
+
+    _index: Optional[KeywordIndex] = None
+
+    def __setitem__(self, key, value):
+        self._index = None
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._index = None
+        super().__delitem__(key)
+
+    def update(self, *args, **kwargs):
+        self._index = None
+        super().update(*args, **kwargs)
+
+    def pop(self, *args):
+        self._index = None
+        return super().pop(*args)
+
+    def clear(self):
+        self._index = None
+        super().clear()
+
+    def keyword_index(self) -> KeywordIndex:
+        if self._index is None:
+            self._questions = list(self)
+            self._answered = frozenset(
+                pos for pos, q_text in enumerate(self._questions)
+                if not (self[q_text] is None or self[q_text] == '')
+            )
+            self._index = KeywordIndex([q_text.lower() for q_text in self._questions])
+        return self._index
+
+    def first_answer(self, terms: List[str], exclude: List[str] = ()) -> Any:
+        """Answer of the first answered question containing all terms and no excluded keyword."""
+        index = self.keyword_index()
+        pos = index.first_with_all(terms, exclude, among=self._answered)
+        return None if pos is None else self[self._questions[pos]]
+
+
 class NarrativePreconsultaSummarizer:
     """Generador de resúmenes narrativos concisos y profesionales."""
     
@@ -12,6 +118,11 @@ class NarrativePreconsultaSummarizer:
         """Inicializa con el template del formulario."""
         self.template = template_data
         self.question_map = {item['id']: item for item in template_data}
+        self.keyword_index = KeywordIndex([str(q.get('text', '')).lower() for q in template_data])
+        # order -> position of the first question with that order
+        self.order_index = {}
+        for pos, q in enumerate(template_data):
+            self.order_index.setdefault(q.get('order'), pos)
     
     def _get_response_value(self, question_id: str, patient_data: Dict[str, Any]) -> Any:
         """Obtiene y formatea la respuesta de una pregunta específica."""
@@ -66,10 +177,9 @@ class NarrativePreconsultaSummarizer:
     
     def _find_question_id_by_order(self, order: int) -> Optional[str]:
         """Busca el ID de una pregunta por su orden."""
-        for q in self.template:
-            if q.get('order') == order or q.get('order') == str(order):
-                return q['id']
-        return None
+        positions = [self.order_index.get(key) for key in (order, str(order))]
+        positions = [pos for pos in positions if pos is not None]
+        return self.template[min(positions)]['id'] if positions else None
 
     def _extract_demographics(self, patient_data: Dict[str, Any]) -> Dict[str, str]:
         """Extrae información demográfica básica."""
@@ -172,11 +282,8 @@ class NarrativePreconsultaSummarizer:
     
     def _find_id_by_keywords(self, keywords: List[str]) -> Optional[str]:
         """Busca el ID de una pregunta basándose en palabras clave en su texto."""
-        for q in self.template:
-            q_text = str(q.get('text', '')).lower()
-            if any(k.lower() in q_text for k in keywords):
-                return q['id']
-        return None
+        pos = self.keyword_index.first_with_any([k.lower() for k in keywords])
+        return self.template[pos]['id'] if pos is not None else None
 
     def _get_value_by_keywords(self, keywords: List[str], patient_data: Dict[str, Any], direct_keys: List[str] = None) -> Any:
         """Obtiene valor buscando primero por claves directas, luego por ID que contenga keywords."""
@@ -563,10 +670,12 @@ class ClinicalSummaryGenerator:
 
     @staticmethod
     def generate(appointment=None, preconsultation_answers: Union[List, Dict] = None, 
-                 template_data: Optional[List[Dict]] = None) -> dict:
+                 template_data: Optional[List[Dict]] = None,
+                 summarizer: Optional[NarrativePreconsultaSummarizer] = None) -> dict:
         """
         Main entry point. Takes appointment (optional) and preconsultation answers.
         Si se proporciona template_data, usa el nuevo generador narrativo.
+        summarizer: generador ya construido para ese template (plantillas en caché).
         """
         if not preconsultation_answers:
             return ClinicalSummaryGenerator._empty_summary()
@@ -574,12 +683,12 @@ class ClinicalSummaryGenerator:
         # Si hay template_data, usar el nuevo generador narrativo
         if template_data:
             return ClinicalSummaryGenerator._generate_narrative_summary(
-                appointment, preconsultation_answers, template_data
+                appointment, preconsultation_answers, template_data, summarizer
             )
         
         # Método original (legacy)
         data_map = {}
-        text_map = {}
+        text_map = QuestionTextMap()
         
         # Populate maps from answers
         if isinstance(preconsultation_answers, list):
@@ -611,7 +720,7 @@ class ClinicalSummaryGenerator:
         }
 
     @staticmethod
-    def _generate_narrative_summary(appointment, preconsultation_answers, template_data):
+    def _generate_narrative_summary(appointment, preconsultation_answers, template_data, summarizer=None):
         """Genera resumen usando el nuevo generador narrativo."""
         try:
             # Convertir respuestas a formato de diccionario
@@ -642,8 +751,8 @@ class ClinicalSummaryGenerator:
                      if hasattr(appointment.patient, 'name'):
                         patient_name = appointment.patient.name
             
-            # Crear generador narrativo
-            summarizer = NarrativePreconsultaSummarizer(template_data)
+            # Crear generador narrativo (o reutilizar el de la plantilla en caché)
+            summarizer = summarizer or NarrativePreconsultaSummarizer(template_data)
             
             # Generar secciones
             sections = summarizer.generate_summary_sections(patient_data, patient_name)
@@ -696,7 +805,7 @@ class ClinicalSummaryGenerator:
     def _generate_fallback_summary(appointment, preconsultation_answers):
         """Método de fallback cuando el nuevo generador falla."""
         data_map = {}
-        text_map = {}
+        text_map = QuestionTextMap()
         
         if isinstance(preconsultation_answers, list):
             ClinicalSummaryGenerator._populate_maps_from_list(preconsultation_answers, data_map, text_map)
@@ -824,23 +933,13 @@ class ClinicalSummaryGenerator:
         if not text_search_terms:
             return None
         
-        for q_text, val in text_map.items():
-            if val is None or val == '':
-                continue
-            
-            q_lower = q_text.lower()
-            
-            # Check exclusions
-            if exclude_keywords:
-                exclude_keywords_lower = [ex.lower() for ex in exclude_keywords]
-                if any(ex in q_lower for ex in exclude_keywords_lower):
-                    continue
-            
-            # Check if all search terms are in the question text
-            if all(term in q_lower for term in text_search_terms):
-                return ClinicalSummaryGenerator._clean_value(val)
+        if not isinstance(text_map, QuestionTextMap):
+            text_map = QuestionTextMap(text_map)
+        exclude_keywords_lower = [ex.lower() for ex in exclude_keywords or []]
         
-        return None
+        # First answered question containing all search terms and no exclusion
+        val = text_map.first_answer(text_search_terms, exclude_keywords_lower)
+        return ClinicalSummaryGenerator._clean_value(val) if val is not None else None
 
     @staticmethod
     def _process_general_data(text_map: Dict, data_map: Dict, patient=None) -> str:
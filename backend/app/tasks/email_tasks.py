@@ -2,7 +2,6 @@
 """
 Celery tasks for sending emails.
 """
-import smtplib
 import json
 import os
 import re
@@ -10,16 +9,17 @@ import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
-from datetime import datetime, timedelta, date
+from datetime import datetime
 from typing import Optional, List, Dict, Any
 
 import requests
 import pytz
-from pywebpush import webpush, WebPushException
 from sqlalchemy.orm import joinedload
 
+from app.core import push
 from app.core.config import settings
 from app.core.celery_app import celery_app
+from app.core.smtp_pool import get_smtp_pool
 from app.db.base import get_db, SessionLocal
 from app.db.models.doctor import Doctor
 from app.db.models.cycle_user import CycleUser
@@ -32,41 +32,116 @@ logger = logging.getLogger(__name__)
 
 
 
+def _smtp_configured() -> bool:
+    """Basic check that real SMTP credentials were provided."""
+    return bool(settings.SMTP_USER) and "tu_correo" not in settings.SMTP_USER
+
+
+def _build_email_message(to_email: str, subject: str, html_content: str, attachments: list = None) -> MIMEMultipart:
+    """
+    Build the MIME message sent by the SMTP helpers.
+    attachments: list of dicts {'filename': str, 'content': bytes}
+    """
+    msg = MIMEMultipart()
+    msg["From"] = f"{settings.EMAILS_FROM_NAME} <{settings.EMAILS_FROM_EMAIL}>"
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    msg.attach(MIMEText(html_content, "html"))
+
+    if attachments:
+        for attachment in attachments:
+            if attachment.get('content'):
+                part = MIMEApplication(
+                    attachment['content'],
+                    Name=attachment.get('filename', 'attachment')
+                )
+                part['Content-Disposition'] = f'attachment; filename="{attachment.get("filename", "attachment")}"'
+                msg.attach(part)
+    return msg
+
+
 def _send_smtp_email(to_email: str, subject: str, html_content: str, attachments: list = None):
     """
     Helper to send email via SMTP, optionally with attachments.
     attachments: list of dicts {'filename': str, 'content': bytes}
+    Uses the worker's pooled SMTP session instead of a new connection per email.
     """
     # Check if SMTP is configured (basic check)
-    if not settings.SMTP_USER or "tu_correo" in settings.SMTP_USER:
+    if not _smtp_configured():
         return
 
     try:
-        msg = MIMEMultipart()
-        msg["From"] = f"{settings.EMAILS_FROM_NAME} <{settings.EMAILS_FROM_EMAIL}>"
-        msg["To"] = to_email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(html_content, "html"))
-
-        if attachments:
-            for attachment in attachments:
-                if attachment.get('content'):
-                    part = MIMEApplication(
-                        attachment['content'],
-                        Name=attachment.get('filename', 'attachment')
-                    )
-                    part['Content-Disposition'] = f'attachment; filename="{attachment.get("filename", "attachment")}"'
-                    msg.attach(part)
-
-        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT)
-        server.starttls()
-        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+        msg = _build_email_message(to_email, subject, html_content, attachments)
+        get_smtp_pool().send(msg)
     except Exception as e:
         logger.error(f"Error sending email: {e}")
 
 
+def _send_smtp_batch(emails: list) -> list:
+    """
+    Send many emails through one pooled SMTP session.
+    emails: list of dicts {'to_email', 'subject', 'html_content', 'attachments' (optional)}
+    Returns one (success, error_message) tuple per email, in order.
+    """
+    if not emails:
+        return []
+    # Same as _send_smtp_email: an unconfigured SMTP is a silent no-op
+    if not _smtp_configured():
+        return [(True, None)] * len(emails)
+
+    messages = [
+        _build_email_message(e['to_email'], e['subject'], e['html_content'], e.get('attachments'))
+        for e in emails
+    ]
+    try:
+        results = get_smtp_pool().send_many(messages)
+    except Exception as e:
+        logger.error(f"Error sending email batch: {e}")
+        return [(False, str(e))] * len(emails)
+
+    for email, (ok, error) in zip(emails, results):
+        if not ok:
+            logger.error(f"Error sending email to {email['to_email']}: {error}")
+    return [(ok, str(error) if error else None) for ok, error in results]
+
+
+def _build_push_payload(title: str, body: str, url: str = "/cycle/dashboard") -> str:
+    return json.dumps({
+        "title": title,
+        "body": body,
+        "url": url,
+        "icon": "/pwa-192x192.png",
+        "badge": "/pwa-192x192.png",
+        "tag": f"gynsys-{datetime.now().strftime('%Y%m%d')}",  # Evitar duplicados
+        "requireInteraction": True
+    })
+
+
+def _deliver_web_push(subscriptions: list, payload: str) -> tuple:
+    """
+    Send `payload` to plain subscription dicts {'id', 'endpoint', 'p256dh', 'auth'}
+    concurrently through the shared WebPushEngine.
+    Does not touch the DB, so it is safe to call from worker threads.
+    Returns (delivered_count, expired_subscription_ids, errors).
+    """
+    results = _deliver_web_push_jobs([(sub, payload) for sub in subscriptions])
+    delivered = sum(1 for status, _ in results if status == push.DELIVERED)
+    expired_ids = [sub["id"] for sub, (status, _) in zip(subscriptions, results) if status == push.EXPIRED]
+    errors = [error for status, error in results if status == push.FAILED]
+    return delivered, expired_ids, errors
+
+
+def _deliver_web_push_jobs(jobs: list) -> list:
+    """
+    Send (subscription dict, payload) jobs, possibly for many users at once.
+    Returns one (push.DELIVERED | push.EXPIRED | push.FAILED, error) per job.
+    """
+    engine = push.get_push_engine()
+    if engine is None:
+        return [(push.FAILED, "VAPID keys not configured")] * len(jobs)
+    return engine.send_many([(push.to_subscription_info(sub), payload) for sub, payload in jobs])
+
+
 def _send_web_push(user_id: int, title: str, body: str, url: str = "/cycle/dashboard", db=None):
     """
     Helper to send Web Push Notification to all user devices.
@@ -87,51 +162,18 @@ def _send_web_push(user_id: int, title: str, body: str, url: str = "/cycle/dashb
         if not subs:
             return
         
-        payload = json.dumps({
-            "title": title,
-            "body": body,
-            "url": url,
-            "icon": "/pwa-192x192.png",
-            "badge": "/pwa-192x192.png",
-            "tag": f"gynsys-{datetime.now().strftime('%Y%m%d')}",  # Evitar duplicados
-            "requireInteraction": True
-        })
+        payload = _build_push_payload(title, body, url)
         
-        failed_subs = []
-        for sub in subs:
-            try:
-                logger.info(f"Sending push to user {user_id}, sub_id {sub.id}")
-                webpush(
-                    subscription_info={
-                        "endpoint": sub.endpoint,
-                        "keys": {
-                            "p256dh": sub.p256dh,
-                            "auth": sub.auth
-                        }
-                    },
-                    data=payload,
-                    vapid_private_key=settings.VAPID_PRIVATE_KEY,
-                    vapid_claims={
-                        "sub": f"mailto:{settings.VAPID_CLAIM_EMAIL}",
-                        "exp": int((datetime.now() + timedelta(hours=12)).timestamp())
-                    },
-                    timeout=10
-                )
-                logger.info(f"Push delivered successfully to sub_id {sub.id}")
-            except WebPushException as ex:
-                if ex.response and ex.response.status_code in [404, 410]:
-                    # Subscription expired/gone
-                    failed_subs.append(sub)
-                else:
-                    logger.error(f"Push error for user {user_id}: {ex}")
-            except Exception as e:
-                logger.error(f"Unexpected push error: {e}")
+        logger.info(f"Sending push to user {user_id}, {len(subs)} subscriptions")
+        delivered, expired_ids, errors = _deliver_web_push(
+            [{"id": s.id, "endpoint": s.endpoint, "p256dh": s.p256dh, "auth": s.auth} for s in subs],
+            payload
+        )
+        for error in errors:
+            logger.error(f"Push error for user {user_id}: {error}")
         
         # Batch delete expired subscriptions
-        if failed_subs:
-            for sub in failed_subs:
-                db.delete(sub)
-            db.commit()
+        push.delete_expired_subscriptions(db, expired_ids)
             
     except Exception as e:
         logger.error(f"Error in _send_web_push: {e}")
@@ -427,34 +469,6 @@ def send_tenant_approval_email(self, email: str, doctor_name: str, slug: str):
 
 # --- Helper Functions (Ported from Frontend) ---
 
-def calculate_predictions(last_period_date: date, cycle_length: int = 28, period_length: int = 5) -> dict:
-    """
-    Calculate cycle predictions based on last period date.
-    Returns:
-    - next_period_start
-    - next_period_end
-    - ovulation_date
-    - fertile_window_start
-    - fertile_window_end
-    """
-    next_period_start = last_period_date + timedelta(days=cycle_length)
-    next_period_end = next_period_start + timedelta(days=period_length - 1)
-    
-    # Luteal phase is typically 14 days before next period
-    ovulation_date = next_period_start - timedelta(days=14)
-    
-    # Fertile window: 5 days before ovulation + ovulation day
-    fertile_window_start = ovulation_date - timedelta(days=5)
-    fertile_window_end = ovulation_date 
-    
-    return {
-        "next_period_start": next_period_start,
-        "next_period_end": next_period_end,
-        "ovulation_date": ovulation_date,
-        "fertile_window_start": fertile_window_start,
-        "fertile_window_end": fertile_window_end
-    }
-
 def to_roman(num):
     if not isinstance(num, int) or num < 1: return ""
     val = [1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1]
@@ -0,0 +1,17 @@
+"""
+Bulk clinical exports on Celery (PDF_RENDER_BACKEND="celery") and their
+retention sweep (Celery beat, hourly); see app.services.clinical_export.
+"""
+from app.core.celery_app import celery_app
+from app.services.clinical_export import purge_expired_exports, run_export
+
+
+@celery_app.task(name="app.tasks.export_tasks.run_clinical_export_task")
+def run_clinical_export_task(doctor_id: int, export_id: str) -> dict:
+    # Prefork children are daemons and cannot start a pool: histories render here, one by one
+    return run_export(doctor_id, export_id)
+
+
+@celery_app.task(name="app.tasks.export_tasks.purge_clinical_exports")
+def purge_clinical_exports() -> int:
+    return purge_expired_exports()
@@ -0,0 +1,79 @@
+"""
+Off-request image derivative jobs.
+
+Decoding and re-encoding images (AVIF especially) is CPU-bound, so it never
+runs in the upload request:
+  - IMAGE_DERIVATIVE_BACKEND="process": a small process pool inside the API
+    process (IMAGE_DERIVATIVE_WORKERS processes, started on first use)
+  - IMAGE_DERIVATIVE_BACKEND="celery": build_image_derivatives_task on the
+    Celery workers (they must share UPLOAD_DIR, or use the "minio" media storage)
+
+Finished variants are recorded as ImageDerivative rows, which drops the
+doctor's cached public bundle (see app.core.public_bundle).
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.services.image_derivatives import build_derivatives, source_key
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="app.tasks.image_tasks.build_image_derivatives_task")
+def build_image_derivatives_task(doctor_id: Optional[int], source_url: str, crop=None) -> str:
+    return build_derivatives(doctor_id, source_url, crop)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_derivative_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server (and its DB connections) is not safe
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_derivative_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _built(doctor_id: Optional[int], source_url: str, future):
+    from app.core.public_bundle import invalidate_public_bundle
+
+    if future.cancelled():
+        return  # Pool shut down
+    if future.exception() is not None:
+        logger.error(f"Image derivatives for {source_url} crashed: {future.exception()}")
+        return
+    # The worker's own commit only reaches this process' cache through Redis
+    if doctor_id is not None:
+        invalidate_public_bundle(doctor_id)
+
+
+def schedule_derivatives(doctor_id: Optional[int], source_url: Optional[str], crop=None):
+    """Queue variant generation for a freshly stored upload. Never fails the request."""
+    if not settings.IMAGE_DERIVATIVES_ENABLED or source_key(source_url) is None:
+        return
+    try:
+        if settings.IMAGE_DERIVATIVE_BACKEND == "celery":
+            build_image_derivatives_task.delay(doctor_id, source_url, crop)
+        else:
+            future = get_derivative_pool().submit(build_derivatives, doctor_id, source_url, crop)
+            future.add_done_callback(lambda f: _built(doctor_id, source_url, f))
+    except Exception as e:
+        logger.warning(f"Could not queue image derivatives for {source_url}: {e}")
@@ -0,0 +1,14 @@
+"""
+Media store garbage collection (Celery beat, nightly).
+
+Deletes content-addressed blobs that no record has referenced for
+MEDIA_GC_GRACE_HOURS, with their WebP/AVIF variants; see
+app.services.media_store.
+"""
+from app.core.celery_app import celery_app
+from app.services.media_store import collect_garbage
+
+
+@celery_app.task(name="app.tasks.media_tasks.collect_media_garbage")
+def collect_media_garbage() -> dict:
+    return collect_garbage()
@@ -3,16 +3,20 @@
 Celery tasks for evaluating notification rules and queueing pending notifications.
 """
 import logging
+from collections import defaultdict
 from datetime import date, datetime, timedelta
 import pytz
+from celery import chord, group
+from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.db.base import SessionLocal
 from app.db.models.doctor import Doctor
 from app.db.models.cycle_user import CycleUser
 from app.db.models.notification import NotificationRule, NotificationLog, PendingNotification
 from app.db.models.cycle_predictor import CycleLog, PregnancyLog, SymptomLog, CycleNotificationSettings
-from app.cycle_predictor.logic import calculate_predictions
+from app.cycle_predictor.logic import calculate_predictions, calculate_predictions_batch, iter_batch_predictions
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +26,19 @@ def calculate_smart_context(user: CycleUser, predictions: dict, pregnancy: Pregn
     """
     tz = pytz.timezone('America/Caracas')
     today = datetime.now(tz).date()
+
+    symptom_log = db_session.query(SymptomLog).filter(
+        SymptomLog.cycle_user_id == user.id,
+        SymptomLog.date == today
+    ).first()
+
+    return build_smart_context(user, predictions, pregnancy, symptom_log, today)
+
+def build_smart_context(user: CycleUser, predictions: dict, pregnancy: PregnancyLog, symptom_log: SymptomLog, today: date) -> dict:
+    """
+    Same as calculate_smart_context but with today's SymptomLog already loaded,
+    so the bulk evaluator can feed it from a prefetched map.
+    """
     ctx = { "today": today }
     
     # 1. Pregnancy Context
@@ -40,10 +57,6 @@ def calculate_smart_context(user: CycleUser, predictions: dict, pregnancy: Pregn
             ctx["trimester"] = 3
             
     # Universal Symptom Check
-    symptom_log = db_session.query(SymptomLog).filter(
-        SymptomLog.cycle_user_id == user.id,
-        SymptomLog.date == today
-    ).first()
     if symptom_log and symptom_log.symptoms:
         if isinstance(symptom_log.symptoms, list):
             ctx["reported_symptoms"] = symptom_log.symptoms
@@ -181,105 +194,605 @@ def evaluate_rule(rule: NotificationRule, context: dict, user_settings: CycleNot
 
     return False
 
+def _hashable(value) -> bool:
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+class RuleIndex:
+    """
+    Tenant rules compiled once per run so a user's smart context only touches
+    the rules that can match it: O(matches) per user instead of O(rules).
+
+    Rules are bucketed by trigger shape and the settings switches that gate
+    each rule are resolved up front. Rules whose trigger cannot be bucketed
+    (non-dict JSON, unhashable values, no `name` for name-based gates) fall
+    back to evaluate_rule, so `match` always agrees with evaluate_rule.
+    """
+
+    OFFSET_KEYS = ("cycle_day", "days_before_period", "days_after_ovulation")
+    FERTILE_KEYS = ("is_fertile_start", "is_ovulation_day", "days_after_ovulation")
+    FLAG_KEYS = ("is_ovulation_day", "is_fertile_start", "is_fertile_end")
+
+    def __init__(self, rules: list):
+        self.rules = list(rules)
+        # Positions into self.rules, per context (pregnant / cycle)
+        self.pregnant_gates = {}
+        self.cycle_gates = {}
+        self.pregnant_fallback = []
+        self.cycle_fallback = []
+        # Pregnancy buckets
+        self.by_gestation_week = defaultdict(list)
+        self.by_trimester_day = defaultdict(list)
+        self.by_symptom = defaultdict(list)
+        # Cycle buckets
+        self.by_pill_subtype = defaultdict(list)
+        self.new_pack = []
+        self.by_days_late = defaultdict(list)
+        self.by_offset = defaultdict(list)
+        self.by_flag = defaultdict(list)
+
+        for pos, rule in enumerate(self.rules):
+            trigger = rule.trigger_condition
+            if not trigger: continue  # evaluate_rule never matches
+            if not isinstance(trigger, dict):
+                self.pregnant_fallback.append(pos)
+                self.cycle_fallback.append(pos)
+                continue
+            self._compile_pregnant(pos, rule, trigger)
+            self._compile_cycle(pos, rule, trigger)
+
+    @staticmethod
+    def _name_lower(rule: NotificationRule):
+        name = getattr(rule, "name", None)
+        return name.lower() if isinstance(name, str) else None
+
+    @staticmethod
+    def _gates_exist(gates: tuple) -> bool:
+        return all(hasattr(CycleNotificationSettings, g) for g in gates)
+
+    def _compile_pregnant(self, pos: int, rule: NotificationRule, trigger: dict):
+        gates = ()
+        if rule.notification_type == "prenatal_daily_tip":
+            gates = ("prenatal_daily_tips",)
+        elif rule.notification_type == "prenatal_alert":
+            gates = ("prenatal_symptom_alerts",)
+        elif rule.notification_type == "prenatal_milestone":
+            name_lower = self._name_lower(rule)
+            if name_lower is None:
+                self.pregnant_fallback.append(pos)
+                return
+            if "ecografía" in name_lower or "ecografia" in name_lower:
+                gates = ("prenatal_ultrasounds",)
+            elif "semana" in name_lower:
+                gates = ("prenatal_milestones",)
+            else:
+                gates = ("prenatal_lab_results",)
+
+        if rule.notification_type == "prenatal_milestone":
+            if "gestation_week" in trigger:
+                key = trigger["gestation_week"]
+            elif "semana_inicio" in trigger and "semana_fin" in trigger:
+                key = trigger["semana_inicio"]
+            else:
+                return
+            bucket = self.by_gestation_week
+        elif rule.notification_type == "prenatal_daily_tip":
+            key = (trigger.get("trimestre"), trigger.get("dia"))
+            bucket = self.by_trimester_day
+        elif rule.notification_type == "prenatal_alert":
+            key = trigger.get("sintoma_disparador")
+            if not key: return
+            if not isinstance(key, str):
+                self.pregnant_fallback.append(pos)
+                return
+            key = key.lower()
+            bucket = self.by_symptom
+        else:
+            return
+
+        if not _hashable(key):
+            self.pregnant_fallback.append(pos)
+            return
+        bucket[key].append(pos)
+        self.pregnant_gates[pos] = gates
+
+    def _compile_cycle(self, pos: int, rule: NotificationRule, trigger: dict):
+        gates = []
+        if trigger.get("type") == "contraceptive":
+            gates.append("contraceptive_enabled")
+        if any(k in trigger for k in self.FERTILE_KEYS):
+            gates.append("cycle_fertile_window")
+        if "days_before_period" in trigger:
+            name_lower = self._name_lower(rule)
+            if name_lower is None:
+                self.cycle_fallback.append(pos)
+                return
+            if "abstinencia" in name_lower or "ritmo" in name_lower:
+                gates.append("cycle_rhythm_method")
+            elif "síntoma" in name_lower or "pms" in name_lower:
+                gates.append("cycle_pms_symptoms")
+            else:
+                gates.append("cycle_period_predictions")
+        if trigger.get("event") == "period_confirmation":
+            gates.append("period_confirmation_reminder")
+        gates = tuple(gates)
+        if not self._gates_exist(gates):
+            self.cycle_fallback.append(pos)
+            return
+
+        if trigger.get("type") == "contraceptive":
+            if trigger.get("subtype") == "new_pack":
+                self.new_pack.append(pos)
+                self.cycle_gates[pos] = gates
+                return
+            entries = [(self.by_pill_subtype, trigger.get("subtype"))]
+        elif trigger.get("event") == "period_confirmation":
+            entries = [(self.by_days_late, trigger.get("day_late"))]
+        else:
+            offset_key = next((k for k in self.OFFSET_KEYS if k in trigger), None)
+            if offset_key:
+                entries = [(self.by_offset, (offset_key, trigger[offset_key]))]
+            else:
+                entries = [(self.by_flag, flag) for flag in self.FLAG_KEYS if trigger.get(flag)]
+                if trigger.get("event") == "annual_checkup":
+                    entries.append((self.by_flag, "is_annual_checkup"))
+
+        if not all(_hashable(key) for _, key in entries):
+            self.cycle_fallback.append(pos)
+            return
+        for bucket, key in entries:
+            bucket[key].append(pos)
+        if entries:
+            self.cycle_gates[pos] = gates
+
+    def _pregnant_candidates(self, context: dict) -> list:
+        candidates = list(self.by_gestation_week.get(context.get("gestation_week"), ()))
+        candidates.extend(self.by_trimester_day.get((context.get("trimester"), context.get("gestation_day_of_week")), ()))
+        reported_symptoms = context.get("reported_symptoms", [])
+        if self.by_symptom and reported_symptoms:
+            reported_lower = [s.lower() for s in reported_symptoms]
+            for keyword, positions in self.by_symptom.items():
+                if any(keyword in s for s in reported_lower):
+                    candidates.extend(positions)
+        return candidates
+
+    def _cycle_candidates(self, context: dict) -> list:
+        candidates = []
+        if context.get("pill_event") == "new_pack":
+            candidates.extend(self.new_pack)
+        candidates.extend(self.by_pill_subtype.get(context.get("pill_subtype"), ()))
+        if context.get("period_confirmation_needed"):
+            candidates.extend(self.by_days_late.get(context.get("days_late"), ()))
+        for key in self.OFFSET_KEYS:
+            candidates.extend(self.by_offset.get((key, context.get(key)), ()))
+        for flag, positions in self.by_flag.items():
+            if context.get(flag):
+                candidates.extend(positions)
+        return candidates
+
+    def match(self, context: dict, user_settings: CycleNotificationSettings) -> list:
+        """Rules for which evaluate_rule(rule, context, user_settings) is True, in rule order."""
+        if not user_settings: return []
+
+        if context.get("is_pregnant"):
+            candidates, gates, fallback = self._pregnant_candidates(context), self.pregnant_gates, self.pregnant_fallback
+        else:
+            candidates, gates, fallback = self._cycle_candidates(context), self.cycle_gates, self.cycle_fallback
+
+        matched = {pos for pos in candidates if all(getattr(user_settings, g) for g in gates[pos])}
+        matched.update(pos for pos in fallback if evaluate_rule(self.rules[pos], context, user_settings))
+        return [self.rules[pos] for pos in sorted(matched)]
+
+def _build_pending_values(rule: NotificationRule, user: CycleUser, smart_ctx: dict, now: datetime) -> dict:
+    """
+    Column values for the PendingNotification queued when `rule` matches `user`.
+    """
+    # Use rule.send_time (HH:MM)
+    try:
+        hour, minute = map(int, rule.send_time.split(':'))
+        target_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    except:
+        target_time = now.replace(hour=8, minute=0, second=0, microsecond=0)
+
+    if target_time < now:
+        target_time = now + timedelta(minutes=5) # Run soon if time passed
+
+    # Render Content
+    render_vars = { "patient_name": user.nombre_completo }
+    render_vars.update(smart_ctx)
+
+    rendered = rule.render_content(render_vars)
+
+    return {
+        "notification_rule_id": rule.id,
+        "recipient_id": user.id,
+        "subject": rendered["title"],
+        "body": rendered["message_html"],
+        "message_text": rendered["message_text"],
+        "scheduled_for": target_time,
+        "channel": rule.channel,
+        "status": "pending",
+    }
+
+def _evaluate_tenant(db: Session, doctor_id: int, rules: list, now: datetime):
+    """
+    Legacy per-user evaluation: one round of queries per user and per rule.
+    """
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    users = db.query(CycleUser).filter(
+        CycleUser.doctor_id == doctor_id,
+        CycleUser.is_active == True
+    ).all()
+
+    for user in users:
+        try:
+            user_settings = db.query(CycleNotificationSettings).filter(
+                CycleNotificationSettings.cycle_user_id == user.id
+            ).first()
+            if not user_settings: continue
+
+            pregnancy = db.query(PregnancyLog).filter(
+                 PregnancyLog.cycle_user_id == user.id,
+                 PregnancyLog.is_active == True
+            ).first()
+
+            predictions = None
+            if not pregnancy:
+                 last_cycle = db.query(CycleLog).filter(CycleLog.cycle_user_id == user.id).order_by(CycleLog.start_date.desc()).first()
+                 if last_cycle:
+                     predictions = calculate_predictions(last_cycle.start_date, user.cycle_avg_length, user.period_avg_length)
+
+            smart_ctx = calculate_smart_context(user, predictions, pregnancy, db)
+
+            for rule in rules:
+                # Frequency Cap: Don't queue if sent today
+                already_sent = db.query(NotificationLog).filter(
+                    NotificationLog.notification_rule_id == rule.id,
+                    NotificationLog.recipient_id == user.id,
+                    NotificationLog.sent_at >= today_start
+                ).first()
+                if already_sent: continue
+
+                # Already pending?
+                already_pending = db.query(PendingNotification).filter(
+                    PendingNotification.notification_rule_id == rule.id,
+                    PendingNotification.recipient_id == user.id,
+                    PendingNotification.status == "pending",
+                    PendingNotification.scheduled_for >= today_start
+                ).first()
+                if already_pending: continue
+
+                if evaluate_rule(rule, smart_ctx, user_settings):
+                    db.add(PendingNotification(**_build_pending_values(rule, user, smart_ctx, now)))
+
+            db.commit()
+
+        except Exception as e:
+            logger.error(f"Error processing user {user.id}: {e}", exc_info=True)
+            db.rollback()
+
+def _prefetch_tenant_state(db: Session, doctor_id: int, today: date, today_start: datetime,
+                           min_user_id: int = None, max_user_id: int = None) -> dict:
+    """
+    Load everything the rule evaluation needs for one tenant in a handful of
+    set-based queries instead of several queries per user and per rule.
+    The optional inclusive CycleUser id range restricts it to one shard.
+    """
+    user_filters = [CycleUser.doctor_id == doctor_id, CycleUser.is_active == True]
+    if min_user_id is not None:
+        user_filters.append(CycleUser.id >= min_user_id)
+    if max_user_id is not None:
+        user_filters.append(CycleUser.id <= max_user_id)
+
+    user_ids = select(CycleUser.id).where(*user_filters)
+
+    users = db.query(CycleUser).filter(*user_filters).order_by(CycleUser.id).all()
+
+    settings_by_user = {
+        s.cycle_user_id: s
+        for s in db.query(CycleNotificationSettings).filter(
+            CycleNotificationSettings.cycle_user_id.in_(user_ids)
+        )
+    }
+
+    pregnancy_by_user = {}
+    for p in db.query(PregnancyLog).filter(
+        PregnancyLog.cycle_user_id.in_(user_ids),
+        PregnancyLog.is_active == True
+    ).order_by(PregnancyLog.id):
+        pregnancy_by_user.setdefault(p.cycle_user_id, p)
+
+    # Only start_date of the latest cycle feeds calculate_predictions
+    last_cycle_start_by_user = dict(
+        db.query(CycleLog.cycle_user_id, func.max(CycleLog.start_date)).filter(
+            CycleLog.cycle_user_id.in_(user_ids)
+        ).group_by(CycleLog.cycle_user_id).all()
+    )
+
+    symptom_by_user = {}
+    for log in db.query(SymptomLog).filter(
+        SymptomLog.cycle_user_id.in_(user_ids),
+        SymptomLog.date == today
+    ).order_by(SymptomLog.id):
+        symptom_by_user.setdefault(log.cycle_user_id, log)
+
+    sent_pairs = set(
+        db.query(NotificationLog.notification_rule_id, NotificationLog.recipient_id).filter(
+            NotificationLog.recipient_id.in_(user_ids),
+            NotificationLog.sent_at >= today_start
+        ).all()
+    )
+
+    pending_pairs = set(
+        db.query(PendingNotification.notification_rule_id, PendingNotification.recipient_id).filter(
+            PendingNotification.recipient_id.in_(user_ids),
+            PendingNotification.status == "pending",
+            PendingNotification.scheduled_for >= today_start
+        ).all()
+    )
+
+    return {
+        "users": users,
+        "settings": settings_by_user,
+        "pregnancies": pregnancy_by_user,
+        "last_cycle_starts": last_cycle_start_by_user,
+        "symptoms": symptom_by_user,
+        "skip_pairs": sent_pairs | pending_pairs,
+    }
+
+def _insert_pending(db: Session, rows: list) -> bool:
+    try:
+        db.execute(insert(PendingNotification), rows)
+        db.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error inserting {len(rows)} pending notifications: {e}", exc_info=True)
+        db.rollback()
+        return False
+
+def _flush_pending(db: Session, rows: list) -> tuple:
+    """
+    Insert a batch of PendingNotification rows in a single statement.
+    If the batch fails it is retried one recipient at a time, so a bad row
+    only costs its own user's notifications. Returns (queued, failed users).
+    """
+    if not rows:
+        return 0, 0
+    if _insert_pending(db, rows):
+        return len(rows), 0
+
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row["recipient_id"], []).append(row)
+    queued = failed = 0
+    for user_rows in by_user.values():
+        if _insert_pending(db, user_rows):
+            queued += len(user_rows)
+        else:
+            failed += 1
+    return queued, failed
+
+def _new_run_counts() -> dict:
+    """
+    evaluated: users whose context was evaluated
+    queued: PendingNotifications inserted
+    skipped: matches dropped because already sent or pending today
+    errors: failed users, in evaluation or when inserting their rows
+    """
+    return {"evaluated": 0, "queued": 0, "skipped": 0, "errors": 0}
+
+def _cohort_predictions(state: dict) -> dict:
+    """
+    Cycle predictions for every non-pregnant user with a logged cycle,
+    computed in one vectorized pass. Returns {user_id: predictions dict}.
+    """
+    cohort = [
+        user for user in state["users"]
+        if not state["pregnancies"].get(user.id) and state["last_cycle_starts"].get(user.id)
+    ]
+    if not cohort:
+        return {}
+    batch = calculate_predictions_batch(
+        [state["last_cycle_starts"][user.id] for user in cohort],
+        [user.cycle_avg_length for user in cohort],
+        [user.period_avg_length for user in cohort],
+    )
+    return dict(zip((user.id for user in cohort), iter_batch_predictions(batch)))
+
+def _evaluate_tenant_bulk(db: Session, doctor_id: int, rules: list, now: datetime,
+                          min_user_id: int = None, max_user_id: int = None) -> dict:
+    """
+    Bulk evaluation: prefetch the tenant state, look up each user's matching
+    rules in a RuleIndex and insert PendingNotifications in batches.
+    Produces the same queue as _evaluate_tenant. Returns the run counts.
+    """
+    counts = _new_run_counts()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    state = _prefetch_tenant_state(db, doctor_id, now.date(), today_start, min_user_id, max_user_id)
+    skip_pairs = state["skip_pairs"]
+    rule_index = RuleIndex(rules)
+    batch_size = settings.NOTIFICATION_BULK_BATCH_SIZE
+
+    def flush(rows):
+        queued, failed = _flush_pending(db, rows)
+        counts["queued"] += queued
+        counts["errors"] += failed
+
+    predictions_by_user = _cohort_predictions(state)
+
+    batch = []
+    for user in state["users"]:
+        try:
+            user_settings = state["settings"].get(user.id)
+            if not user_settings: continue
+
+            pregnancy = state["pregnancies"].get(user.id)
+            predictions = predictions_by_user.get(user.id)
+
+            smart_ctx = build_smart_context(user, predictions, pregnancy, state["symptoms"].get(user.id), now.date())
+
+            # A failure on one user must not leave part of their rules queued
+            user_rows = []
+            user_skipped = 0
+            for rule in rule_index.match(smart_ctx, user_settings):
+                if (rule.id, user.id) in skip_pairs:
+                    user_skipped += 1
+                    continue
+                user_rows.append(_build_pending_values(rule, user, smart_ctx, now))
+        except Exception as e:
+            logger.error(f"Error processing user {user.id}: {e}", exc_info=True)
+            counts["errors"] += 1
+            continue
+
+        counts["evaluated"] += 1
+        counts["skipped"] += user_skipped
+        batch.extend(user_rows)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+
+    flush(batch)
+    return counts
+
+def _active_rules(db: Session, doctor_id: int) -> list:
+    return db.query(NotificationRule).filter(
+        NotificationRule.tenant_id == doctor_id,
+        NotificationRule.is_active == True
+    ).all()
+
 @celery_app.task
-def process_dynamic_notifications():
+def process_dynamic_notifications(bulk: bool = None, fanout: bool = None):
     """
     Daily Task (8:00 AM): Evaluates all rules for all users and queues PendingNotifications.
+    `bulk` defaults to settings.NOTIFICATION_BULK_EVALUATION and `fanout` to
+    settings.NOTIFICATION_FANOUT_ENABLED; fan-out hands the run to
+    dispatch_notification_shards.
     """
+    if fanout is None:
+        fanout = settings.NOTIFICATION_FANOUT_ENABLED
+    if fanout:
+        return dispatch_notification_shards()
+
+    if bulk is None:
+        bulk = settings.NOTIFICATION_BULK_EVALUATION
+
     db = SessionLocal()
+    summary = _new_run_counts()
     try:
         doctors = db.query(Doctor).filter(Doctor.is_active == True).all()
         tz = pytz.timezone('America/Caracas')
         now = datetime.now(tz)
         
         for doctor in doctors:
-            rules = db.query(NotificationRule).filter(
-                NotificationRule.tenant_id == doctor.id,
-                NotificationRule.is_active == True
-            ).all()
+            rules = _active_rules(db, doctor.id)
             
             if not rules: continue
-            
-            users = db.query(CycleUser).filter(
-                CycleUser.doctor_id == doctor.id, 
-                CycleUser.is_active == True
-            ).all()
-            
-            for user in users:
-                try:
-                    user_settings = db.query(CycleNotificationSettings).filter(
-                        CycleNotificationSettings.cycle_user_id == user.id
-                    ).first()
-                    if not user_settings: continue
-
-                    pregnancy = db.query(PregnancyLog).filter(
-                         PregnancyLog.cycle_user_id == user.id, 
-                         PregnancyLog.is_active == True
-                    ).first()
-                    
-                    predictions = None
-                    if not pregnancy:
-                         last_cycle = db.query(CycleLog).filter(CycleLog.cycle_user_id == user.id).order_by(CycleLog.start_date.desc()).first()
-                         if last_cycle:
-                             predictions = calculate_predictions(last_cycle.start_date, user.cycle_avg_length, user.period_avg_length)
-                    
-                    smart_ctx = calculate_smart_context(user, predictions, pregnancy, db)
-                    
-                    for rule in rules:
-                        # Frequency Cap: Don't queue if sent today
-                        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                        already_sent = db.query(NotificationLog).filter(
-                            NotificationLog.notification_rule_id == rule.id,
-                            NotificationLog.recipient_id == user.id,
-                            NotificationLog.sent_at >= today_start
-                        ).first()
-                        if already_sent: continue
-
-                        # Already pending?
-                        already_pending = db.query(PendingNotification).filter(
-                            PendingNotification.notification_rule_id == rule.id,
-                            PendingNotification.recipient_id == user.id,
-                            PendingNotification.status == "pending",
-                            PendingNotification.scheduled_for >= today_start
-                        ).first()
-                        if already_pending: continue
-
-                        if evaluate_rule(rule, smart_ctx, user_settings):
-                            # Use rule.send_time (HH:MM)
-                            try:
-                                hour, minute = map(int, rule.send_time.split(':'))
-                                target_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                            except:
-                                target_time = now.replace(hour=8, minute=0, second=0, microsecond=0)
-                                
-                            if target_time < now:
-                                target_time = now + timedelta(minutes=5) # Run soon if time passed
-
-                            # Render Content
-                            render_vars = { "patient_name": user.nombre_completo }
-                            render_vars.update(smart_ctx)
-                            
-                            rendered = rule.render_content(render_vars)
-
-                            pending = PendingNotification(
-                                notification_rule_id=rule.id,
-                                recipient_id=user.id,
-                                subject=rendered["title"],
-                                body=rendered["message_html"],
-                                message_text=rendered["message_text"],
-                                scheduled_for=target_time,
-                                channel=rule.channel,
-                                status="pending"
-                            )
-                            db.add(pending)
-                    
-                    db.commit()
-                            
-                except Exception as e:
-                    logger.error(f"Error processing user {user.id}: {e}", exc_info=True)
-                    db.rollback()
+
+            if bulk:
+                for key, value in _evaluate_tenant_bulk(db, doctor.id, rules, now).items():
+                    summary[key] += value
+            else:
+                _evaluate_tenant(db, doctor.id, rules, now)
                     
     except Exception as e:
         logger.error(f"Critical Error in process_dynamic_notifications: {e}", exc_info=True)
     finally:
         db.close()
+
+    return summary
+
+def _plan_shards(db: Session, doctor_id: int, shard_size: int) -> list:
+    """
+    Split a tenant's active CycleUsers into inclusive id ranges of at most
+    shard_size users. The last range is open-ended so users registered
+    between planning and execution are still evaluated.
+    """
+    user_ids = [row[0] for row in db.query(CycleUser.id).filter(
+        CycleUser.doctor_id == doctor_id,
+        CycleUser.is_active == True
+    ).order_by(CycleUser.id).all()]
+
+    shards = []
+    for start in range(0, len(user_ids), shard_size):
+        chunk = user_ids[start:start + shard_size]
+        shards.append((chunk[0], chunk[-1]))
+    if shards:
+        shards[-1] = (shards[-1][0], None)
+    return shards
+
+@celery_app.task
+def dispatch_notification_shards():
+    """
+    Fan-out coordinator: splits the daily evaluation into (tenant, CycleUser id
+    range) shards, runs them as a chord across the workers and aggregates the
+    per-shard counts in summarize_notification_run.
+    """
+    db = SessionLocal()
+    try:
+        tz = pytz.timezone('America/Caracas')
+        now = datetime.now(tz)
+
+        shard_tasks = []
+        doctors = db.query(Doctor).filter(Doctor.is_active == True).all()
+        for doctor in doctors:
+            if not _active_rules(db, doctor.id): continue
+            for min_user_id, max_user_id in _plan_shards(db, doctor.id, settings.NOTIFICATION_SHARD_SIZE):
+                shard_tasks.append(
+                    evaluate_notification_shard.s(doctor.id, min_user_id, max_user_id, now.isoformat())
+                )
+    finally:
+        db.close()
+
+    if not shard_tasks:
+        return summarize_notification_run([], now.isoformat())
+
+    result = chord(group(shard_tasks))(summarize_notification_run.s(now.isoformat()))
+    logger.info(f"Dispatched {len(shard_tasks)} notification shards (chord {result.id})")
+    return {"shards": len(shard_tasks), "chord_id": result.id}
+
+@celery_app.task
+def evaluate_notification_shard(doctor_id: int, min_user_id: int, max_user_id: int, run_at: str) -> dict:
+    """
+    Evaluate one shard with the bulk evaluator. `run_at` is the coordinator's
+    timestamp so every shard schedules against the same "now".
+    Never raises, so one bad shard cannot fail the whole chord.
+    """
+    counts = _new_run_counts()
+    counts.update(doctor_id=doctor_id, min_user_id=min_user_id, max_user_id=max_user_id)
+    db = SessionLocal()
+    try:
+        rules = _active_rules(db, doctor_id)
+        if rules:
+            counts.update(_evaluate_tenant_bulk(
+                db, doctor_id, rules, datetime.fromisoformat(run_at), min_user_id, max_user_id
+            ))
+    except Exception as e:
+        logger.error(f"Error in notification shard {doctor_id}:{min_user_id}-{max_user_id}: {e}", exc_info=True)
+        counts["errors"] += 1
+    finally:
+        db.close()
+    return counts
+
+@celery_app.task
+def summarize_notification_run(shard_results: list, run_at: str) -> dict:
+    """
+    Chord callback: aggregate per-shard counts into the run summary.
+    """
+    summary = _new_run_counts()
+    for result in shard_results:
+        for key in summary:
+            summary[key] += result.get(key, 0)
+
+    tz = pytz.timezone('America/Caracas')
+    started = datetime.fromisoformat(run_at)
+    summary["shards"] = len(shard_results)
+    summary["tenants"] = len({r.get("doctor_id") for r in shard_results})
+    summary["duration_seconds"] = round((datetime.now(tz) - started).total_seconds(), 2)
+    summary["run_at"] = run_at
+
+    logger.info(f"Notification run summary: {summary}")
+    return summary
@@ -4,27 +4,42 @@ Celery tasks for processing the PendingNotification queue and delivering message
 """
 import logging
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
+from sqlalchemy import delete, insert, or_, and_, select, update
+from app.core import push
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.db.base import SessionLocal
-from app.db.models.notification import PendingNotification, NotificationLog, NotificationChannel
+from app.db.models.notification import PendingNotification, NotificationLog, NotificationChannel, NotificationRule
 from app.db.models.cycle_user import CycleUser
-from app.tasks.email_tasks import _send_smtp_email, _send_web_push
+from app.db.models.push_subscription import PushSubscription
+from app.tasks.email_tasks import (
+    _send_smtp_email, _send_smtp_batch, _send_web_push, _build_push_payload, _deliver_web_push_jobs
+)
 
 logger = logging.getLogger(__name__)
 
+MAX_RETRIES = 5
+
 @celery_app.task
-def process_notification_queue():
+def process_notification_queue(batched: bool = None):
     """
     Periodic task to send pending notifications that are due.
     Scheduled in celery_app.py to run every few minutes.
+    `batched` defaults to settings.NOTIFICATION_BATCH_DELIVERY.
     """
+    if batched is None:
+        batched = settings.NOTIFICATION_BATCH_DELIVERY
+
     db = SessionLocal()
     try:
         tz = pytz.timezone('America/Caracas')
         now = datetime.now(tz)
         
+        if batched:
+            return _drain_queue_batched(db, now)
+
         # Obtener notificaciones pendientes vencidas
         pending_list = db.query(PendingNotification).filter(
             PendingNotification.status.in_(["pending", "retrying"]),
@@ -51,7 +66,7 @@ def process_notification_queue():
                 else:
                     item.retry_count += 1
                     item.last_error = error
-                    if item.retry_count >= 5:
+                    if item.retry_count >= MAX_RETRIES:
                         item.status = "failed"
                     else:
                         item.status = "retrying"
@@ -105,3 +120,199 @@ def send_dual_notification_logic(db, item: PendingNotification):
         return True, "push", None
         
     return False, None, error_msg or "No valid channel succeeded"
+
+# --- Batched delivery ---
+
+def _claim_batch(db, now: datetime, limit: int) -> list:
+    """
+    Claim up to `limit` due notifications for this worker.
+    Rows are picked with SELECT ... FOR UPDATE SKIP LOCKED and flipped to
+    "sending" in the same short transaction, so concurrent workers never get
+    the same row and no lock is held while talking to push/SMTP servers.
+    Rows left in "sending" by a crashed worker are reclaimed after
+    NOTIFICATION_CLAIM_TIMEOUT_MINUTES.
+    """
+    stale_before = now - timedelta(minutes=settings.NOTIFICATION_CLAIM_TIMEOUT_MINUTES)
+    try:
+        ids = db.execute(
+            select(PendingNotification.id).where(
+                PendingNotification.scheduled_for <= now,
+                or_(
+                    # Rows already attempted in this run carry updated_at == now
+                    # and wait for the next run instead of burning retries.
+                    and_(
+                        PendingNotification.status.in_(["pending", "retrying"]),
+                        or_(PendingNotification.updated_at.is_(None), PendingNotification.updated_at < now)
+                    ),
+                    and_(
+                        PendingNotification.status == "sending",
+                        PendingNotification.updated_at < stale_before
+                    )
+                )
+            ).order_by(PendingNotification.scheduled_for)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+
+        if ids:
+            db.execute(
+                update(PendingNotification)
+                .where(PendingNotification.id.in_(ids))
+                .values(status="sending", updated_at=now)
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if not ids:
+        return []
+    return db.query(PendingNotification).filter(PendingNotification.id.in_(ids)).all()
+
+def _deliver_batch(db, items: list) -> tuple:
+    """
+    Deliver a claimed batch: every push of every item goes out in one
+    concurrent WebPushEngine fan-out, email fallbacks share one SMTP session.
+    Returns ({item_id: (success, channel_used, error)}, expired_subscription_ids).
+    """
+    users = {
+        u.id: u for u in db.query(CycleUser).filter(
+            CycleUser.id.in_({item.recipient_id for item in items})
+        )
+    }
+    subs_by_user = {}
+    for sub in db.query(PushSubscription).filter(PushSubscription.user_id.in_(users.keys())):
+        subs_by_user.setdefault(sub.user_id, []).append(
+            {"id": sub.id, "endpoint": sub.endpoint, "p256dh": sub.p256dh, "auth": sub.auth}
+        )
+
+    outcomes = {}
+    expired_ids = []
+    push_errors = {}
+    push_capable = bool(settings.VAPID_PRIVATE_KEY and settings.VAPID_CLAIM_EMAIL)
+
+    # 1. Push: flatten (item, subscription) pairs into a single fan-out
+    jobs = []
+    job_items = []
+    for item in items:
+        if item.recipient_id not in users:
+            outcomes[item.id] = (False, None, "User not found")
+            continue
+        subs = subs_by_user.get(item.recipient_id)
+        if item.channel in ["push", "dual"] and push_capable and subs:
+            payload = _build_push_payload(item.subject, item.message_text or item.subject, "/cycle/dashboard")
+            for sub in subs:
+                jobs.append((sub, payload))
+                job_items.append(item.id)
+
+    try:
+        results = _deliver_web_push_jobs(jobs)
+    except Exception as e:
+        results = [(push.FAILED, str(e))] * len(jobs)
+
+    for item_id, (sub, _), (status, error) in zip(job_items, jobs, results):
+        if status == push.DELIVERED:
+            outcomes[item_id] = (True, "push", None)
+        elif status == push.EXPIRED:
+            expired_ids.append(sub["id"])
+        else:
+            push_errors[item_id] = f"Push error: {error}"
+    for item_id in set(job_items):
+        if item_id not in outcomes and item_id not in push_errors:
+            push_errors[item_id] = "No active push subscription"
+
+    # 2. Email fallback over a single SMTP session
+    email_items = [
+        item for item in items
+        if item.id not in outcomes and item.channel in ["email", "dual"]
+    ]
+    if email_items:
+        outcomes.update(_send_email_batch(email_items, users))
+
+    for item in items:
+        if item.id not in outcomes:
+            outcomes[item.id] = (False, None, push_errors.get(item.id) or "No valid channel succeeded")
+
+    return outcomes, expired_ids
+
+def _send_email_batch(items: list, users: dict) -> dict:
+    """Send the email leg of several notifications through one pooled SMTP session."""
+    results = _send_smtp_batch([
+        {
+            "to_email": users[item.recipient_id].email,
+            "subject": item.subject,
+            "html_content": item.body,
+        }
+        for item in items
+    ])
+    return {
+        item.id: (ok, "email", error)
+        for item, (ok, error) in zip(items, results)
+    }
+
+def _record_batch(db, items: list, outcomes: dict, expired_ids: list, now: datetime):
+    """Write status updates, NotificationLogs and expired subscription cleanup in bulk."""
+    rule_types = dict(
+        db.query(NotificationRule.id, NotificationRule.notification_type).filter(
+            NotificationRule.id.in_({item.notification_rule_id for item in items if item.notification_rule_id})
+        ).all()
+    )
+
+    updates = []
+    logs = []
+    for item in items:
+        success, channel_used, error = outcomes[item.id]
+        if success:
+            updates.append({"id": item.id, "status": "sent", "updated_at": now})
+            logs.append({
+                "notification_rule_id": item.notification_rule_id,
+                "recipient_id": item.recipient_id,
+                "notification_type": rule_types.get(item.notification_rule_id, "unknown"),
+                "title_sent": item.subject,
+                "status": "sent",
+                "channel_used": channel_used,
+            })
+        else:
+            retry_count = (item.retry_count or 0) + 1
+            updates.append({
+                "id": item.id,
+                "status": "failed" if retry_count >= MAX_RETRIES else "retrying",
+                "retry_count": retry_count,
+                "last_error": error,
+                "updated_at": now,
+            })
+            logger.warning(f"Notification {item.id} failed (try {retry_count}): {error}")
+
+    try:
+        db.execute(update(PendingNotification), updates)
+        if logs:
+            db.execute(insert(NotificationLog), logs)
+        if expired_ids:
+            db.execute(delete(PushSubscription).where(PushSubscription.id.in_(expired_ids)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def _drain_queue_batched(db, now: datetime) -> dict:
+    """
+    High-throughput delivery: claim, deliver and record batches until the due
+    queue is empty or NOTIFICATION_MAX_BATCHES_PER_RUN is reached.
+    Safe to run on several workers at once.
+    """
+    stats = {"sent": 0, "failed": 0, "batches": 0}
+    for _ in range(settings.NOTIFICATION_MAX_BATCHES_PER_RUN):
+        items = _claim_batch(db, now, settings.NOTIFICATION_DELIVERY_BATCH_SIZE)
+        if not items:
+            break
+
+        outcomes, expired_ids = _deliver_batch(db, items)
+        _record_batch(db, items, outcomes, expired_ids, now)
+
+        sent = sum(1 for success, _, _ in outcomes.values() if success)
+        stats["sent"] += sent
+        stats["failed"] += len(items) - sent
+        stats["batches"] += 1
+
+    logger.info(f"Notification queue drained: {stats}")
+    return stats
@@ -0,0 +1,239 @@
+"""
+Off-request rendering of consultation PDFs.
+
+ReportLab layout is CPU-bound, so render jobs run outside the request:
+  - PDF_RENDER_BACKEND="process": a process pool inside the API process
+    (PDF_RENDER_WORKERS processes, started on first use)
+  - PDF_RENDER_BACKEND="celery": render_consultation_pdf_task on the Celery
+    workers (the PDF store must then be shared, i.e. PDF_CACHE_BACKEND="minio")
+
+Finished artifacts go to the rendered-PDF store (app.utils.pdf_cache). The job
+id encodes the artifact's cache key, so a finished job is visible from every
+API process and asking twice for the same document reuses the same job.
+"""
+import logging
+import multiprocessing
+import re
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.db.models.consultation import Consultation
+from app.services import consultation_pdf
+from app.utils import pdf_cache
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# '<doctor_id>.<kind>[.<patient group>].<sha256>', the artifact's key spelled with dots
+JOB_ID_RE = re.compile(r"^(\d+)\.(summary|history)\.(?:([0-9a-f]{16})\.)?([0-9a-f]{64})$")
+
+# Failed jobs kept for status polling in process mode
+MAX_TRACKED_FAILURES = 500
+
+
+def job_id_for(key: str) -> str:
+    # '<doctor_id>/<kind>-<sha256>.pdf' or, grouped, '<doctor_id>/<kind>/<group>/<sha256>.pdf'
+    return ".".join(key[:-len(".pdf")].replace("-", "/", 1).split("/"))
+
+
+def key_for(job_id: str) -> Optional[str]:
+    match = JOB_ID_RE.match(job_id)
+    if not match:
+        return None
+    doctor_id, kind, group, digest = match.groups()
+    if group:
+        return f"{doctor_id}/{kind}/{group}/{digest}.pdf"
+    return f"{doctor_id}/{kind}-{digest}.pdf"
+
+
+def render_job(kind: str, consultation_id: int) -> str:
+    """Render (or reuse) a consultation report into the PDF store; returns its key."""
+    db = SessionLocal()
+    try:
+        consultation = db.query(Consultation).filter(Consultation.id == consultation_id).first()
+        if consultation is None:
+            raise ValueError(f"Consultation {consultation_id} not found")
+        return consultation_pdf.store_report(db, kind, consultation)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.tasks.pdf_tasks.render_consultation_pdf_task")
+def render_consultation_pdf_task(kind: str, consultation_id: int) -> str:
+    return render_job(kind, consultation_id)
+
+
+@celery_app.task(name="app.tasks.pdf_tasks.email_rendered_report")
+def email_rendered_report(key: Optional[str], email: str, patient_name: str, report_url: str = None):
+    """Send the report email with the finished artifact attached (the link alone if it is missing)."""
+    from app.tasks.email_tasks import send_consultation_report_email
+
+    pdf_bytes = pdf_cache.read_cached_pdf(key) if key else None
+    return send_consultation_report_email(
+        email=email, patient_name=patient_name, report_url=report_url, pdf_bytes=pdf_bytes
+    )
+
+
+class RenderPool:
+    """Process pool plus the futures of the jobs this API process submitted."""
+
+    def __init__(self, max_workers: int):
+        # spawn: forking a threaded server (and its DB connections) is not safe
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._jobs: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: str, kind: str, consultation_id: int) -> Future:
+        with self._lock:
+            future = self._jobs.get(job_id)
+            # A cancelled (pool shut down) or failed job is submitted again
+            if future is not None and not (future.done() and (future.cancelled() or future.exception() is not None)):
+                return future
+            future = self.executor.submit(render_job, kind, consultation_id)
+            self._jobs[job_id] = future
+        future.add_done_callback(lambda f, job_id=job_id: self._settle(job_id, f))
+        return future
+
+    def _settle(self, job_id: str, future: Future):
+        with self._lock:
+            if not future.cancelled() and future.exception() is None and future.result() == key_for(job_id):
+                # The artifact is in the store now; that is the source of truth
+                self._jobs.pop(job_id, None)
+                return
+            failed = [j for j, f in self._jobs.items() if f.done()]
+            for stale in failed[:max(0, len(failed) - MAX_TRACKED_FAILURES)]:
+                del self._jobs[stale]
+
+    def get(self, job_id: str) -> Optional[Future]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: Optional[RenderPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> RenderPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderPool(settings.PDF_RENDER_WORKERS)
+        return _pool
+
+
+def shutdown_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def _job(job_id: str, status: str, key: Optional[str] = None, error: Optional[str] = None) -> dict:
+    job = {"job_id": job_id, "status": status}
+    if status == DONE:
+        job["download_url"] = f"/api/v1/consultations/pdf-jobs/{job_id}/download"
+        job["key"] = key
+    if error:
+        job["error"] = error
+    return job
+
+
+def submit_render_job(db: Session, kind: str, consultation: Consultation, link=None) -> dict:
+    """
+    Queue a render of `kind` for the consultation, or report it done when the
+    current version is already stored. link: Celery signature to run with the
+    artifact key afterwards (Celery backend only).
+    """
+    key = consultation_pdf.report_key(db, kind, consultation)
+    job_id = job_id_for(key)
+
+    if pdf_cache.has_cached_pdf(key):
+        return _job(job_id, DONE, key)
+
+    if settings.PDF_RENDER_BACKEND == "celery":
+        render_consultation_pdf_task.apply_async(args=[kind, consultation.id], task_id=job_id, link=link)
+    else:
+        get_render_pool().submit(job_id, kind, consultation.id)
+    return _job(job_id, PENDING)
+
+
+def get_job_status(job_id: str) -> Optional[dict]:
+    """Status of a render job, or None if the id is unknown."""
+    key = key_for(job_id)
+    if key is None:
+        return None
+    if pdf_cache.has_cached_pdf(key):
+        return _job(job_id, DONE, key)
+
+    if settings.PDF_RENDER_BACKEND == "celery":
+        result = celery_app.AsyncResult(job_id)
+        if result.state == "FAILURE":
+            return _job(job_id, FAILED, error=str(result.result))
+        if result.state == "SUCCESS":
+            # Data changed while queued: the artifact landed under a newer key
+            return _job(job_id, DONE, result.result)
+        return _job(job_id, RUNNING if result.state == "STARTED" else PENDING)
+
+    future = get_render_pool().get(job_id)
+    if future is None:
+        return None
+    if not future.done():
+        return _job(job_id, RUNNING if future.running() else PENDING)
+    if future.cancelled():
+        return _job(job_id, FAILED, error="Render cancelled (server shutting down)")
+    if future.exception() is not None:
+        return _job(job_id, FAILED, error=str(future.exception()))
+    return _job(job_id, DONE, future.result())
+
+
+def wait_for_job(job_id: str, timeout: float) -> Optional[str]:
+    """Block until a process-pool job finishes; returns the artifact key (None on failure)."""
+    key = key_for(job_id)
+    if key is not None and pdf_cache.has_cached_pdf(key):
+        return key
+    future = get_render_pool().get(job_id)
+    if future is None or future.cancelled():
+        return None
+    try:
+        return future.result(timeout=timeout)
+    except Exception as e:
+        logger.error(f"PDF render job {job_id} failed: {e}")
+        return None
+
+
+def send_report_when_rendered(job_id: str, email: str, patient_name: str, report_url: str = None):
+    """Background task: wait for the render, then email it."""
+    key = wait_for_job(job_id, settings.PDF_RENDER_TIMEOUT)
+    return email_rendered_report(key, email, patient_name, report_url)
+
+
+def queue_report_email(db: Session, consultation: Consultation, email: str, report_url: str, background_tasks) -> dict:
+    """Render the summary off-request and email it once the artifact exists."""
+    email_args = (email, consultation.patient_name, report_url)
+    if settings.PDF_RENDER_BACKEND == "celery":
+        job = submit_render_job(
+            db, pdf_cache.SUMMARY, consultation, link=email_rendered_report.s(*email_args)
+        )
+        if job["status"] == DONE:
+            email_rendered_report.delay(job["key"], *email_args)
+        return job
+
+    job = submit_render_job(db, pdf_cache.SUMMARY, consultation)
+    background_tasks.add_task(send_report_when_rendered, job["job_id"], *email_args)
+    return job
@@ -0,0 +1,300 @@
+"""
+Where uploaded media lives.
+
+An upload is addressed by its key, the path under UPLOAD_DIR
+("media/ab/ab12...ef.jpg", "videos/12_video_..._1a2b3c4d.mp4"). Records store
+"/uploads/<key>" whatever the backend, so switching backends never rewrites
+the database:
+  - MEDIA_STORAGE_BACKEND="local": files in UPLOAD_DIR, served by the
+    /uploads mount
+  - MEDIA_STORAGE_BACKEND="minio": objects in the public-read
+    MEDIA_STORAGE_BUCKET; /uploads/<key> redirects there. Every API replica
+    and worker sees every upload, and clients can PUT large files straight
+    to the bucket (presigned_put, see the /uploads/direct endpoints)
+
+Code that needs the bytes on disk uses local_file(key) (a temporary copy
+for S3) or, for small files read again and again like PDF logos, fetch(key)
+(a copy kept in MEDIA_STORAGE_CACHE_DIR; keys never change content: blobs
+are named by hash, other uploads get unique names).
+
+Browsers and CDNs cache an upload for as long as cache_control_for(key)
+says, whether /uploads serves it or the bucket does (objects carry it).
+
+scripts/migrate_media_storage.py copies every object between backends.
+"""
+import logging
+import mimetypes
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_URL_PREFIX = "/uploads/"
+# Keys that never change content: blobs are named by their hash, variants after their source
+IMMUTABLE_PREFIXES = ("media/", "derived/")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def key_for_url(url: Optional[str]) -> Optional[str]:
+    """Storage key of an "/uploads/..." URL (None for anything else)."""
+    if not url or not url.startswith(UPLOAD_URL_PREFIX):
+        return None
+    key = posixpath.normpath(url[len(UPLOAD_URL_PREFIX):].split("?", 1)[0])
+    if key in (".", "") or key.startswith(("..", "/")):
+        return None
+    return key
+
+
+def url_for_key(key: str) -> str:
+    return f"{UPLOAD_URL_PREFIX}{key}"
+
+
+def cache_control_for(key: str) -> str:
+    if key.startswith(IMMUTABLE_PREFIXES):
+        return IMMUTABLE_CACHE_CONTROL
+    if key.startswith("incoming/"):
+        return "no-store"  # Unvalidated direct uploads
+    # Other uploads get a fresh name when replaced, but legacy ones may not have
+    return f"public, max-age={settings.MEDIA_CACHE_MAX_AGE_SECONDS}"
+
+
+class LocalMediaStorage:
+    backend = "local"
+
+    def __init__(self, root: str):
+        self.root = Path(root).resolve()
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return self.path(key).stat().st_size
+        except OSError:
+            return None
+
+    def read_head(self, key: str, length: int) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read(length)
+
+    def iter_chunks(self, key: str, chunk_size: int = 1024 * 1024):
+        with open(self.path(key), "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def put_file(self, key: str, source: Path, content_type: Optional[str] = None):
+        """Move `source` into place (a rename when it is on the same filesystem)."""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(source), path)
+
+    def copy(self, key: str, target_key: str):
+        target = self.path(target_key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+        shutil.copyfile(self.path(key), tmp)
+        os.replace(tmp, target)
+
+    def delete(self, key: str):
+        try:
+            self.path(key).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Media storage: could not delete {key}: {e}")
+
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        base = self.root / prefix if prefix else self.root
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if not name.startswith("."):  # Uploads in progress
+                    yield (Path(dirpath) / name).relative_to(self.root).as_posix()
+
+    def delete_older_than(self, prefix: str, cutoff: datetime) -> int:
+        deleted = 0
+        for key in list(self.keys(prefix)):
+            try:
+                if self.path(key).stat().st_mtime < cutoff.timestamp():
+                    self.path(key).unlink(missing_ok=True)
+                    deleted += 1
+            except OSError:
+                continue
+        return deleted
+
+    def fetch(self, key: str) -> Optional[Path]:
+        path = self.path(key)
+        return path if path.is_file() else None
+
+    @contextmanager
+    def local_file(self, key: str):
+        path = self.fetch(key)
+        if path is None:
+            raise FileNotFoundError(key)
+        yield path
+
+    def presigned_put(self, key: str, content_type: str, expires_in: int) -> Optional[str]:
+        return None  # Bytes reach local disk through the API only
+
+
+class S3MediaStorage:
+    backend = "minio"
+
+    def __init__(self, bucket: str, cache_dir: str):
+        from app.core.s3 import ensure_bucket_exists, get_s3_client
+
+        self.bucket = bucket
+        self.cache_dir = Path(cache_dir).resolve()
+        self.s3 = get_s3_client()
+        try:
+            self.s3.head_bucket(Bucket=bucket)
+        except Exception:
+            ensure_bucket_exists(bucket)
+
+    def exists(self, key: str) -> bool:
+        return self.size(key) is not None
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return self.s3.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except Exception:
+            return None
+
+    def read_head(self, key: str, length: int) -> bytes:
+        return self.s3.get_object(Bucket=self.bucket, Key=key, Range=f"bytes=0-{length - 1}")["Body"].read()
+
+    def iter_chunks(self, key: str, chunk_size: int = 1024 * 1024):
+        body = self.s3.get_object(Bucket=self.bucket, Key=key)["Body"]
+        yield from body.iter_chunks(chunk_size)
+
+    def put_file(self, key: str, source: Path, content_type: Optional[str] = None):
+        extra = {"CacheControl": cache_control_for(key)}
+        if content_type:
+            extra["ContentType"] = content_type
+        self.s3.upload_file(str(source), self.bucket, key, ExtraArgs=extra)
+        os.unlink(source)
+
+    def copy(self, key: str, target_key: str):
+        # Server-side: the bytes never come through this process. The source's
+        # caching headers (none for incoming/) must not carry over
+        content_type = (self.s3.head_object(Bucket=self.bucket, Key=key).get("ContentType")
+                        or mimetypes.guess_type(target_key)[0] or "application/octet-stream")
+        self.s3.copy(
+            {"Bucket": self.bucket, "Key": key}, self.bucket, target_key,
+            ExtraArgs={
+                "MetadataDirective": "REPLACE", "ContentType": content_type,
+                "CacheControl": cache_control_for(target_key),
+            },
+        )
+
+    def delete(self, key: str):
+        try:
+            self.s3.delete_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            logger.warning(f"Media storage: could not delete {key}: {e}")
+        try:
+            (self.cache_dir / key).unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"]
+
+    def delete_older_than(self, prefix: str, cutoff: datetime) -> int:
+        deleted = 0
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            objects = [{"Key": obj["Key"]} for obj in page.get("Contents", []) if obj["LastModified"] < cutoff]
+            if objects:
+                self.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+                deleted += len(objects)
+        return deleted
+
+    def _download(self, key: str, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        try:
+            self.s3.download_file(self.bucket, key, str(tmp))
+            os.replace(tmp, path)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def fetch(self, key: str) -> Optional[Path]:
+        path = self.cache_dir / key
+        if path.is_file():
+            return path
+        try:
+            self._download(key, path)
+        except Exception as e:
+            logger.warning(f"Media storage: could not fetch {key}: {e}")
+            return None
+        return path
+
+    @contextmanager
+    def local_file(self, key: str):
+        with tempfile.TemporaryDirectory(prefix="media-") as tmp_dir:
+            path = Path(tmp_dir) / posixpath.basename(key)
+            try:
+                self._download(key, path)
+            except Exception as e:
+                raise FileNotFoundError(key) from e
+            yield path
+
+    def presigned_put(self, key: str, content_type: str, expires_in: int) -> Optional[str]:
+        from app.core.s3 import public_endpoint_url
+
+        url = self.s3.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires_in,
+        )
+        return public_endpoint_url(url)
+
+
+def create_media_storage(backend: str):
+    if backend == "minio":
+        return S3MediaStorage(settings.MEDIA_STORAGE_BUCKET, settings.MEDIA_STORAGE_CACHE_DIR)
+    return LocalMediaStorage(settings.UPLOAD_DIR)
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_media_storage():
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_media_storage(settings.MEDIA_STORAGE_BACKEND)
+        return _storage
+
+
+def public_media_url(key: str) -> str:
+    """Where browsers fetch an upload: the bucket for "minio", the /uploads mount otherwise."""
+    if settings.MEDIA_STORAGE_BACKEND == "minio":
+        return f"{settings.MINIO_PUBLIC_ENDPOINT.rstrip('/')}/{settings.MEDIA_STORAGE_BUCKET}/{key}"
+    return url_for_key(key)
+
+
+def local_media_file(url: Optional[str]) -> Optional[str]:
+    """Local path (or cached copy) of an "/uploads/..." URL, for code that reads it from disk."""
+    key = key_for_url(url)
+    if key is None:
+        return None
+    path = get_media_storage().fetch(key)
+    return str(path) if path is not None else None
@@ -0,0 +1,155 @@
+"""
+Per-doctor cache of the images printed on PDFs (header logo, signature).
+
+Each asset is resolved to a local file once, downscaled with Pillow to the
+size it is printed at (PDF_ASSET_DPI) and kept decoded in an LRU, so a
+render costs one os.stat per image instead of path probing, a full-size
+decode and an oversized embedded bitmap. Uploading a new logo or signature
+calls invalidate_doctor_assets; a file replaced in place is caught by the
+(size, mtime) stamp check.
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from PIL import Image as PILImage
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Image
+
+from app.core.config import settings
+
+LOGO = "logo"
+SIGNATURE = "signature"
+
+# Print box (width, height) in points; the header logo is only width-bound
+PRINT_BOXES = {
+    LOGO: (1.2 * inch, None),
+    SIGNATURE: (2.5 * inch, 1 * inch),
+}
+
+
+@dataclass
+class PDFAsset:
+    reader: ImageReader
+    width: float  # Print size in points
+    height: float
+    path: str
+    stamp: Tuple[int, int]  # (size, mtime_ns) of the source file
+
+
+def _print_size(kind: str, aspect: float) -> Tuple[float, float]:
+    max_width, max_height = PRINT_BOXES[kind]
+    width, height = max_width, max_width * aspect
+    if max_height is not None and height > max_height:
+        height = max_height
+        width = height / aspect
+    return width, height
+
+
+def load_pdf_asset(kind: str, path: str) -> PDFAsset:
+    """Decode `path` and downscale it to its print size (never upscales)."""
+    st = os.stat(path)
+    with PILImage.open(path) as src:
+        src.load()
+        image = src
+        aspect = image.height / float(image.width)
+        width, height = _print_size(kind, aspect)
+
+        pixels = (max(1, round(width / inch * settings.PDF_ASSET_DPI)),
+                  max(1, round(height / inch * settings.PDF_ASSET_DPI)))
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        if pixels[0] < image.width:
+            image = image.resize(pixels, PILImage.LANCZOS)
+        else:
+            image = image.copy()
+    return PDFAsset(ImageReader(image), width, height, path, (st.st_size, st.st_mtime_ns))
+
+
+class PDFAssetCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, PDFAsset]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doctor_id: Optional[int], kind: str, url: Optional[str]) -> Optional[PDFAsset]:
+        if not url:
+            return None
+        key = (doctor_id, kind, url)
+        with self._lock:
+            asset = self._entries.get(key)
+            if asset is not None:
+                self._entries.move_to_end(key)
+
+        if asset is not None:
+            try:
+                st = os.stat(asset.path)
+                if (st.st_size, st.st_mtime_ns) == asset.stamp:
+                    return asset
+            except OSError:
+                pass
+
+        from app.utils.media_storage import local_media_file
+        from app.utils.pdf_generator import get_local_path_from_url
+
+        path = local_media_file(url) or get_local_path_from_url(url)
+        if not path:
+            self._forget(key)
+            return None
+        asset = load_pdf_asset(kind, path)
+        with self._lock:
+            self._entries[key] = asset
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return asset
+
+    def _forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, doctor_id: Optional[int] = None):
+        with self._lock:
+            if doctor_id is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == doctor_id]:
+                    del self._entries[key]
+
+
+_cache: Optional[PDFAssetCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_asset_cache() -> PDFAssetCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PDFAssetCache(settings.PDF_ASSET_CACHE_SIZE)
+        return _cache
+
+
+def get_pdf_asset(doctor_id: Optional[int], kind: str, url: Optional[str]) -> Optional[PDFAsset]:
+    return get_pdf_asset_cache().get(doctor_id, kind, url)
+
+
+def invalidate_doctor_assets(doctor_id: Optional[int] = None):
+    get_pdf_asset_cache().invalidate(doctor_id)
+
+
+class AssetImage(Image):
+    """Image flowable drawn from a cached, already decoded PDFAsset."""
+
+    def __init__(self, asset: PDFAsset, hAlign: str = "CENTER"):
+        # Set before Image.__init__ so it never opens or decodes anything itself
+        self._img = asset.reader
+        self._file = None
+        self.filename = asset.path
+        self.hAlign = hAlign
+        self._mask = "auto"
+        self._drawing = None
+        self._dpi = False
+        self._setup(asset.width, asset.height, "direct", 0)
@@ -0,0 +1,395 @@
+"""
+Content-addressed cache for rendered consultation PDFs.
+
+A rendered document is stored under a key derived from everything that
+shapes it: the mapped report data, the doctor's header/signature fields and
+pdf_config, and the size/mtime of the logo and signature files. Any change
+to one of those produces a new key, so a stale PDF is never served; old
+files are removed when a consultation is updated or deleted and when a
+doctor's PDF-relevant profile fields change (Session hook below). Medical
+histories are grouped per patient ('<doctor_id>/history/<patient>/...'):
+storing a new version deletes the ones it supersedes.
+
+Files live on local disk (PDF_CACHE_DIR, outside the public /uploads mount)
+or, with PDF_CACHE_BACKEND="minio", in the private PDF_CACHE_BUCKET.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from datetime import date, datetime
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout code changes so previously rendered files are ignored
+RENDERER_VERSION = 1
+
+SUMMARY = "summary"
+HISTORY = "history"
+
+# Doctor columns that end up in the rendered header/signature
+DOCTOR_PDF_FIELDS = {"pdf_config", "logo_url", "nombre_completo", "especialidad"}
+SESSION_KEY = "pdf_cache_dirty_doctors"
+
+
+class LocalPDFStore:
+    def __init__(self, root: str):
+        self.root = Path(root).resolve()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes, content_type: str = "application/pdf"):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def put_file(self, key: str, source: str, content_type: str = "application/pdf"):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(source, path)
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        return str(path) if path.is_file() else None
+
+    def iter_chunks(self, key: str, chunk_size: int = 64 * 1024):
+        with open(self._path(key), "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def delete(self, key: str):
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def delete_prefix(self, prefix: str, keep: Optional[str] = None):
+        if keep is None:
+            shutil.rmtree(self.root / prefix, ignore_errors=True)
+            return
+        directory = self.root / prefix
+        for path in list(directory.iterdir()) if directory.is_dir() else []:
+            # Dotfiles are writes in progress (see put)
+            if path.is_file() and not path.name.startswith(".") and path != self._path(keep):
+                path.unlink(missing_ok=True)
+
+    def delete_older_than(self, prefix: str, cutoff: datetime) -> int:
+        deleted = 0
+        for path in list((self.root / prefix).rglob("*")) if (self.root / prefix).is_dir() else []:
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff.timestamp():
+                    path.unlink()
+                    deleted += 1
+            except OSError:
+                continue
+        return deleted
+
+
+class S3PDFStore:
+    def __init__(self, bucket: str):
+        from app.core.s3 import get_s3_client
+
+        self.bucket = bucket
+        self.s3 = get_s3_client()
+        try:
+            self.s3.head_bucket(Bucket=bucket)
+        except Exception:
+            # Private bucket: no public-read policy, unlike the media bucket
+            self.s3.create_bucket(Bucket=bucket)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def put(self, key: str, data: bytes, content_type: str = "application/pdf"):
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+
+    def put_file(self, key: str, source: str, content_type: str = "application/pdf"):
+        self.s3.upload_file(source, self.bucket, key, ExtraArgs={"ContentType": content_type})
+        os.unlink(source)
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    def iter_chunks(self, key: str, chunk_size: int = 64 * 1024):
+        body = self.s3.get_object(Bucket=self.bucket, Key=key)["Body"]
+        yield from body.iter_chunks(chunk_size)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except Exception:
+            return False
+
+    def delete(self, key: str):
+        self.s3.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_prefix(self, prefix: str, keep: Optional[str] = None):
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            objects = [{"Key": obj["Key"]} for obj in page.get("Contents", []) if obj["Key"] != keep]
+            if objects:
+                self.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+
+    def delete_older_than(self, prefix: str, cutoff: datetime) -> int:
+        deleted = 0
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            objects = [{"Key": obj["Key"]} for obj in page.get("Contents", []) if obj["LastModified"] < cutoff]
+            if objects:
+                self.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+                deleted += len(objects)
+        return deleted
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_pdf_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            if settings.PDF_CACHE_BACKEND == "minio":
+                _store = S3PDFStore(settings.PDF_CACHE_BUCKET)
+            else:
+                _store = LocalPDFStore(settings.PDF_CACHE_DIR)
+        return _store
+
+
+def _asset_stamp(doctor_id: int, kind: str, url: Optional[str]):
+    """(size, mtime) of a logo/signature file so replacing it in place changes the key."""
+    from app.utils.pdf_assets import get_pdf_asset
+
+    try:
+        asset = get_pdf_asset(doctor_id, kind, url)
+    except Exception:
+        return None
+    return list(asset.stamp) if asset else None
+
+
+def doctor_fingerprint(doctor) -> dict:
+    """Everything from the doctor row and its image files that shapes a PDF."""
+    from app.utils.pdf_assets import LOGO, SIGNATURE
+
+    if doctor is None:
+        return {}
+    pdf_config = doctor.pdf_config or {}
+    return {
+        "name": doctor.nombre_completo,
+        "specialty": doctor.especialidad,
+        "logo_url": doctor.logo_url,
+        "pdf_config": pdf_config,
+        "logo": _asset_stamp(doctor.id, LOGO, pdf_config.get("logo_header_1") or doctor.logo_url),
+        "signature": _asset_stamp(doctor.id, SIGNATURE, pdf_config.get("logo_signature")),
+    }
+
+
+def pdf_key(kind: str, doctor_id: int, report_data: dict, doctor=None) -> str:
+    """Storage key '<doctor_id>/<kind>-<sha256>.pdf' for a report."""
+    material = {
+        "v": RENDERER_VERSION,
+        "kind": kind,
+        "data": report_data,
+        "doctor": doctor_fingerprint(doctor),
+    }
+    if kind == SUMMARY:
+        # The summary's closing line carries the issue date
+        material["issued"] = date.today().isoformat()
+    digest = hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{doctor_id}/{kind}-{digest}.pdf"
+
+
+def pdf_key_stream(kind: str, doctor_id: int, report_data: dict, rows: Iterable[dict], doctor=None,
+                   group: Optional[str] = None) -> str:
+    """
+    pdf_key for documents with too many rows to hold at once: rows are hashed
+    one by one. With a group the key is '<doctor_id>/<kind>/<group>/<sha256>.pdf',
+    and storing it drops the group's previous versions (drop_superseded).
+    """
+    digest = hashlib.sha256(json.dumps({
+        "v": RENDERER_VERSION,
+        "kind": kind,
+        "data": report_data,
+        "doctor": doctor_fingerprint(doctor),
+    }, sort_keys=True, default=str).encode())
+    for row in rows:
+        digest.update(json.dumps(row, sort_keys=True, default=str).encode())
+    if group:
+        return f"{doctor_id}/{kind}/{group}/{digest.hexdigest()}.pdf"
+    return f"{doctor_id}/{kind}-{digest.hexdigest()}.pdf"
+
+
+def etag_for(key: str) -> str:
+    return f'"{PurePosixPath(key).stem.rsplit("-", 1)[-1][:32]}"'
+
+
+def _group_prefix(key: str) -> Optional[str]:
+    """'<doctor_id>/<kind>/<group>/' for grouped keys (pdf_key_stream), else None."""
+    parts = key.split("/")
+    if len(parts) == 4 and parts[1] in (SUMMARY, HISTORY):
+        return "/".join(parts[:3]) + "/"
+    return None
+
+
+def drop_superseded(key: str):
+    """Delete the other versions stored in key's group: only the newest one is ever served again."""
+    prefix = _group_prefix(key)
+    if not prefix:
+        return
+    try:
+        get_pdf_store().delete_prefix(prefix, keep=key)
+    except Exception as e:
+        logger.warning(f"PDF cache cleanup failed for {prefix}: {e}")
+
+
+def get_or_render(key: str, render: Callable[[], bytes], always_store: bool = False) -> bytes:
+    """
+    Cached bytes for key, rendering and storing them on a miss.
+    always_store: keep the result even with PDF_CACHE_ENABLED off (render jobs
+    hand their artifact over through the store).
+    """
+    if not settings.PDF_CACHE_ENABLED and not always_store:
+        return render()
+
+    store = get_pdf_store()
+    try:
+        cached = store.get(key)
+    except Exception as e:
+        logger.warning(f"PDF cache read failed for {key}: {e}")
+        cached = None
+    if cached is not None:
+        return cached
+
+    pdf_bytes = render()
+    try:
+        store.put(key, pdf_bytes)
+    except Exception as e:
+        logger.warning(f"PDF cache write failed for {key}: {e}")
+    else:
+        drop_superseded(key)
+    return pdf_bytes
+
+
+def _cached_key(pdf_path: Optional[str]) -> Optional[str]:
+    # Rows created before the cache carry the "dynamic" placeholder
+    return pdf_path if pdf_path and pdf_path.endswith(".pdf") else None
+
+
+def remember_summary(db: Session, consultation, key: str):
+    """Point Consultation.pdf_path at its current summary, dropping the previous file."""
+    if consultation.pdf_path == key or not settings.PDF_CACHE_ENABLED:
+        return
+    previous = _cached_key(consultation.pdf_path)
+    consultation.pdf_path = key
+    db.commit()
+    if previous:
+        delete_cached_pdf(previous)
+
+
+def spool_dir() -> Optional[str]:
+    """Where big PDFs are written before entering the store (same filesystem as a local store)."""
+    if settings.PDF_CACHE_BACKEND == "minio":
+        return None
+    path = Path(settings.PDF_CACHE_DIR).resolve() / ".spool"
+    path.mkdir(parents=True, exist_ok=True)
+    return str(path)
+
+
+def store_file(key: str, path: str, content_type: str = "application/pdf"):
+    """Move a rendered file into the store under key."""
+    get_pdf_store().put_file(key, path, content_type)
+    drop_superseded(key)
+
+
+def cached_pdf_path(key: str) -> Optional[str]:
+    """Local filesystem path of a stored PDF (local backend only)."""
+    return get_pdf_store().local_path(key)
+
+
+def iter_cached_pdf(key: str):
+    return get_pdf_store().iter_chunks(key)
+
+
+def has_cached_pdf(key: str) -> bool:
+    try:
+        return get_pdf_store().exists(key)
+    except Exception as e:
+        logger.warning(f"PDF cache lookup failed for {key}: {e}")
+        return False
+
+
+def read_cached_pdf(key: str) -> Optional[bytes]:
+    try:
+        return get_pdf_store().get(key)
+    except Exception as e:
+        logger.warning(f"PDF cache read failed for {key}: {e}")
+        return None
+
+
+def delete_cached_pdf(key: str):
+    try:
+        get_pdf_store().delete(key)
+    except Exception as e:
+        logger.warning(f"PDF cache delete failed for {key}: {e}")
+
+
+def invalidate_consultation_pdf(consultation):
+    """Forget a consultation's rendered summary (call after committing an update)."""
+    key = _cached_key(consultation.pdf_path)
+    if key:
+        delete_cached_pdf(key)
+
+
+def invalidate_doctor_pdfs(doctor_id: int):
+    """Drop every cached PDF of a doctor (header, logo or signature changed)."""
+    try:
+        get_pdf_store().delete_prefix(f"{doctor_id}/")
+    except Exception as e:
+        logger.warning(f"PDF cache purge failed for doctor {doctor_id}: {e}")
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_doctor_pdf_changes(session, flush_context):
+    for obj in session.dirty:
+        if type(obj).__name__ != "Doctor":
+            continue
+        state = sa_inspect(obj)
+        if any(state.attrs[field].history.has_changes() for field in DOCTOR_PDF_FIELDS):
+            session.info.setdefault(SESSION_KEY, set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _purge_after_commit(session):
+    for doctor_id in session.info.pop(SESSION_KEY, ()):
+        invalidate_doctor_pdfs(doctor_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop(SESSION_KEY, None)
@@ -3,18 +3,20 @@ import io
 import json
 import logging
 from datetime import datetime
+from itertools import chain
 from pathlib import Path
+from typing import Iterable
 from reportlab.lib.pagesizes import legal, letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 # import qrcode
-from reportlab.lib.utils import ImageReader
 from sqlalchemy.orm import Session
 from app.db.models.doctor import Doctor
 from app.core.config import settings
+from app.utils.pdf_assets import LOGO, SIGNATURE, AssetImage, get_pdf_asset
 from app.utils.medical_report_builder import (
     format_simple_antecedente,
     format_family_history,
@@ -140,18 +142,10 @@ def generate_summary_report(report_data: dict, doctor_id: int, db: Session = Non
     
     if logo_source:
         try:
-            logo_path = get_local_path_from_url(logo_source)
-            
-            if logo_path and os.path.exists(logo_path):
-                img = Image(logo_path, width=1.2*inch, height=1.2*inch)
-                img.hAlign = 'CENTER'
-                # Maintain aspect ratio
-                img_reader = ImageReader(logo_path)
-                iw, ih = img_reader.getSize()
-                aspect = ih / float(iw)
-                img = Image(logo_path, width=1.2*inch, height=(1.2*inch)*aspect)
-                img.hAlign = 'CENTER'
-                logo_image = img
+            # Pre-scaled to 1.2 inch wide, aspect ratio kept
+            asset = get_pdf_asset(doctor_id, LOGO, logo_source)
+            if asset:
+                logo_image = AssetImage(asset)
             else:
                 logger.warning(f"Logo file not found for source: {logo_source}")
         except Exception as e:
@@ -247,22 +241,10 @@ def generate_summary_report(report_data: dict, doctor_id: int, db: Session = Non
     signature_image = None
     if signature_source:
         try:
-            sig_path = get_local_path_from_url(signature_source)
-            if sig_path and os.path.exists(sig_path):
-                # Signature usually wider
-                img_reader = ImageReader(sig_path)
-                iw, ih = img_reader.getSize()
-                aspect = ih / float(iw)
-                # Limit width to 2.5 inch
-                target_width = 2.5*inch
-                target_height = target_width * aspect
-                # But limit height to 1 inch
-                if target_height > 1*inch:
-                    target_height = 1*inch
-                    target_width = target_height / aspect
-                
-                signature_image = Image(sig_path, width=target_width, height=target_height)
-                signature_image.hAlign = 'CENTER'
+            # Pre-scaled to fit 2.5 x 1 inch
+            asset = get_pdf_asset(doctor_id, SIGNATURE, signature_source)
+            if asset:
+                signature_image = AssetImage(asset)
         except Exception as e:
             logger.error(f"Error loading signature: {e}")
 
@@ -282,8 +264,76 @@ def generate_summary_report(report_data: dict, doctor_id: int, db: Session = Non
 
 def generate_medical_report(report_data: dict, doctor_id: int, db: Session = None) -> io.BytesIO:
     buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=legal, topMargin=0.5*inch, bottomMargin=0.5*inch, leftMargin=0.75*inch, rightMargin=0.75*inch)
-    story = []
+    doc = _medical_report_doc(buffer)
+    story = list(_medical_report_story(report_data, report_data.get('all_consultations', []), doctor_id, db))
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+def stream_medical_report(report_data: dict, consultations: Iterable[dict], doctor_id: int, db: Session, path: str):
+    """
+    Same document as generate_medical_report, written to `path` while
+    `consultations` is consumed lazily (e.g. rows from a yield_per query).
+    Each consultation gets its own table so only a few flowables are alive at
+    any time; the canvas still holds the compressed pages until it saves.
+    """
+    doc = _medical_report_doc(path)
+    doc.build(_FlowableFeed(
+        _medical_report_story(report_data, consultations, doctor_id, db, table_per_consultation=True)
+    ))
+
+class _FlowableFeed(list):
+    """Flowable list for doc.build that is topped up from a generator as it drains."""
+
+    def __init__(self, source, lookahead: int = 4):
+        super().__init__()
+        self._source = iter(source)
+        self._lookahead = lookahead
+
+    def __len__(self):
+        while self._source is not None and list.__len__(self) < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+        return list.__len__(self)
+
+def _medical_report_doc(output) -> SimpleDocTemplate:
+    return SimpleDocTemplate(output, pagesize=legal, topMargin=0.5*inch, bottomMargin=0.5*inch, leftMargin=0.75*inch, rightMargin=0.75*inch)
+
+def _history_body_table(body_rows: list) -> Table:
+    # Track which rows are headers for background styling
+    header_rows = []
+    for idx, row in enumerate(body_rows):
+        # Check if it's a section header (CONSULTAS MÉDICAS or Consulta #X)
+        if row[0] and hasattr(row[0], 'text'):
+            text = row[0].text
+            if 'CONSULTAS MÉDICAS' in text or 'Consulta #' in text:
+                header_rows.append(idx)
+
+    body_table = Table(body_rows, colWidths=[2.2*inch, 5.3*inch])
+
+    # Base table style
+    table_style = [
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.Color(0.8, 0.8, 0.8)),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
+    ]
+
+    # Add gray background and span to header rows
+    for row_idx in header_rows:
+        table_style.append(('SPAN', (0, row_idx), (1, row_idx)))  # Merge both columns
+        table_style.append(('BACKGROUND', (0, row_idx), (-1, row_idx), colors.Color(0.95, 0.95, 0.95)))
+        table_style.append(('TOPPADDING', (0, row_idx), (-1, row_idx), 8))
+        table_style.append(('BOTTOMPADDING', (0, row_idx), (-1, row_idx), 8))
+
+    body_table.setStyle(TableStyle(table_style))
+    return body_table
+
+def _medical_report_story(report_data: dict, consultations: Iterable[dict], doctor_id: int, db: Session = None,
+                          table_per_consultation: bool = False):
+    """Flowables of the medical history, yielded in order."""
 
     styleN = ParagraphStyle(name='Normal', fontName='Helvetica', fontSize=10, leading=12)
     styleB = ParagraphStyle(name='Bold', fontName='Helvetica-Bold', fontSize=10, leading=12)
@@ -318,15 +368,9 @@ def generate_medical_report(report_data: dict, doctor_id: int, db: Session = Non
     
     if logo_source:
         try:
-            logo_path = get_local_path_from_url(logo_source)
-            
-            if logo_path and os.path.exists(logo_path):
-                img_reader = ImageReader(logo_path)
-                iw, ih = img_reader.getSize()
-                aspect = ih / float(iw)
-                img = Image(logo_path, width=1.2*inch, height=(1.2*inch)*aspect)
-                img.hAlign = 'CENTER'
-                logo_image = img
+            asset = get_pdf_asset(doctor_id, LOGO, logo_source)
+            if asset:
+                logo_image = AssetImage(asset)
         except Exception as e:
             logger.error(f"Error loading logo: {e}")
     
@@ -339,11 +383,11 @@ def generate_medical_report(report_data: dict, doctor_id: int, db: Session = Non
         ('ALIGN', (0,0), (0,0), 'CENTER'), # Logo centered in its cell
         ('ALIGN', (1,0), (1,0), 'LEFT'),   # Text left aligned next to logo
     ]))
-    story.append(header_table)
+    yield header_table
     
     report_title =  "HISTORIA MÉDICA"
-    story.append(Paragraph(f"<u>{report_title}</u>", styleH1))
-    story.append(Spacer(1, 0.2*inch))
+    yield Paragraph(f"<u>{report_title}</u>", styleH1)
+    yield Spacer(1, 0.2*inch)
 
     # Patient Table
     patient_table_data = [
@@ -361,8 +405,8 @@ def generate_medical_report(report_data: dict, doctor_id: int, db: Session = Non
         ('VALIGN', (0, 0), (-1, -1), 'TOP'),
         ('LINEBELOW', (0,-1), (-1,-1), 0.5, colors.Color(0.8, 0.8, 0.8))
     ]))
-    story.append(patient_table)
-    story.append(Spacer(1, 0.2*inch))
+    yield patient_table
+    yield Spacer(1, 0.2*inch)
 
     # Body
     body_rows = []
@@ -403,9 +447,10 @@ def generate_medical_report(report_data: dict, doctor_id: int, db: Session = Non
         body_rows.append([label_p, value_p_list])
 
     # PART 2: All Consultations (chronologically)
-    all_consultations = report_data.get('all_consultations', [])
-    
-    if all_consultations:
+    consultations = iter(consultations)
+    first_consultation = next(consultations, None)
+
+    if first_consultation is not None:
         # Add separator/header for consultations section with gray background
         consultas_header_style = ParagraphStyle(
             name='ConsultaHeader',
@@ -419,7 +464,11 @@ def generate_medical_report(report_data: dict, doctor_id: int, db: Session = Non
             []
         ])
     
-        for idx, consultation in enumerate(all_consultations):
+        for idx, consultation in enumerate(chain([first_consultation], consultations)):
+            if table_per_consultation and body_rows:
+                yield _history_body_table(body_rows)
+                body_rows = []
+
             # Consultation header with date
             consulta_date = consultation.get('created_at')
             date_str = ""
@@ -482,37 +531,6 @@ def generate_medical_report(report_data: dict, doctor_id: int, db: Session = Non
                 body_rows.append([label_p, value_p_list])
 
     if body_rows:
-        # Track which rows are headers for background styling
-        header_rows = []
-        for idx, row in enumerate(body_rows):
-            # Check if it's a section header (CONSULTAS MÉDICAS or Consulta #X)
-            if row[0] and hasattr(row[0], 'text'):
-                text = row[0].text
-                if 'CONSULTAS MÉDICAS' in text or 'Consulta #' in text:
-                    header_rows.append(idx)
-        
-        body_table = Table(body_rows, colWidths=[2.2*inch, 5.3*inch])
-        
-        # Base table style
-        table_style = [
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.Color(0.8, 0.8, 0.8)),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
-        ]
-        
-        # Add gray background and span to header rows
-        for row_idx in header_rows:
-            table_style.append(('SPAN', (0, row_idx), (1, row_idx)))  # Merge both columns
-            table_style.append(('BACKGROUND', (0, row_idx), (-1, row_idx), colors.Color(0.95, 0.95, 0.95)))
-            table_style.append(('TOPPADDING', (0, row_idx), (-1, row_idx), 8))
-            table_style.append(('BOTTOMPADDING', (0, row_idx), (-1, row_idx), 8))
-        
-        body_table.setStyle(TableStyle(table_style))
-        story.append(body_table)
+        yield _history_body_table(body_rows)
 
     # Footer removed - medical history is cumulative document without signature
-
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
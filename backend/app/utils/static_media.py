@@ -0,0 +1,245 @@
+"""
+Static media serving for the /uploads and /sample-gallery mounts.
+
+Starlette's StaticFiles sends every file with a weak mtime/size ETag, no
+Cache-Control and no Range support, so browsers revalidate every image on
+every visit and a video can only be played from the first byte.
+MediaStaticFiles adds:
+  - a strong ETag: the SHA-256 for content-addressed blobs (named by it),
+    size and mtime otherwise; If-None-Match / If-Modified-Since give 304
+  - Cache-Control from the caller's policy: "immutable" for keys that never
+    change content (media/, derived/, see cache_control_for() in
+    app.utils.media_storage), so repeat visits never reach the server
+  - single byte ranges (Range / If-Range -> 206, 416), what video players
+    and mobile browsers send when seeking. The body goes out with the ASGI
+    zero-copy extension (sendfile) when the server offers it, otherwise in
+    chunks read with pread in a thread
+  - precompressed siblings of compressible files ("logo.svg.br",
+    "logo.svg.gz", written by precompress_directory()) picked from
+    Accept-Encoding, with Vary: Accept-Encoding
+"""
+import gzip
+import os
+import stat
+from email.utils import formatdate, parsedate
+from mimetypes import guess_type
+from pathlib import Path, PurePosixPath
+from typing import Callable, List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+# Worth compressing; images, videos and PDFs already are
+COMPRESSIBLE_TYPES = {
+    "image/svg+xml", "application/json", "application/javascript", "text/javascript",
+    "text/css", "text/plain", "text/html", "application/xml", "text/xml",
+}
+# Preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# Below this, compression gains less than the headers cost
+MIN_COMPRESS_SIZE = 256
+CHUNK_SIZE = 256 * 1024
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+def strong_etag(key: str, stat_result: os.stat_result) -> str:
+    stem = PurePosixPath(key).stem
+    if key.startswith("media/") and len(stem) == 64:
+        return f'"{stem}"'  # Content-addressed blob: its name is its SHA-256
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (first, last) byte of a single "bytes=" range, clamped to the file; None
+    to send the whole file (no header, bad syntax, several ranges). Raises
+    ValueError when the range is unsatisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(0, size - int(last)), size - 1  # Suffix: the last N bytes
+    except ValueError:
+        return None
+    if start > end or start >= size or (not first and not last):
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def accepted_encodings(header: Optional[str]) -> List[str]:
+    """Encodings we precompress that Accept-Encoding allows, preferred first."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        params = params.strip().replace(" ", "")
+        try:
+            if params.startswith("q=") and float(params[2:]) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return [coding for coding, _ in ENCODINGS if coding in accepted]
+
+
+class MediaFileResponse(Response):
+    """A file, or the [start, end] slice of it, sent without buffering it."""
+
+    def __init__(self, path: Path, headers: dict, status_code: int = 200,
+                 start: int = 0, length: int = 0, send_body: bool = True):
+        self.path = path
+        self.status_code = status_code
+        self.start = start
+        self.length = length
+        self.send_body = send_body
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or not self.length:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        with open(self.path, "rb") as file:
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                await send({
+                    "type": ZEROCOPY_EXTENSION, "file": file,
+                    "offset": self.start, "count": self.length, "more_body": False,
+                })
+                return
+            fd = file.fileno()
+            offset, remaining = self.start, self.length
+            while remaining:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, min(CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break  # Truncated while sending: the client sees a short body
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+            if remaining:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class MediaStaticFiles(StaticFiles):
+    """StaticFiles with strong ETags, a Cache-Control policy, byte ranges and precompressed siblings."""
+
+    def __init__(self, *, directory: str, cache_control: Callable[[str], str], **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.root = Path(directory).resolve()
+        self.cache_control = cache_control
+
+    def _precompressed(self, path: Path, stat_result: os.stat_result, content_type: str, request_headers: Headers):
+        """(path, stat, encoding) of the best up-to-date precompressed sibling the client accepts, if any."""
+        if content_type not in COMPRESSIBLE_TYPES or "range" in request_headers:
+            return None
+        for coding in accepted_encodings(request_headers.get("accept-encoding")):
+            sibling = path.with_name(path.name + dict(ENCODINGS)[coding])
+            try:
+                sibling_stat = sibling.stat()
+            except OSError:
+                continue
+            if stat.S_ISREG(sibling_stat.st_mode) and sibling_stat.st_mtime_ns >= stat_result.st_mtime_ns:
+                return sibling, sibling_stat, coding
+        return None
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        path = Path(full_path)
+        request_headers = Headers(scope=scope)
+        content_type = guess_type(path.name)[0] or "application/octet-stream"
+        headers = {
+            "content-type": f"{content_type}; charset=utf-8" if content_type.startswith("text/") else content_type,
+            "accept-ranges": "bytes",
+            "cache-control": self.cache_control(path.resolve().relative_to(self.root).as_posix()),
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        }
+        if content_type in COMPRESSIBLE_TYPES:
+            headers["vary"] = "Accept-Encoding"
+
+        precompressed = self._precompressed(path, stat_result, content_type, request_headers)
+        if precompressed:
+            path, stat_result, coding = precompressed
+            headers["content-encoding"] = coding
+        headers["etag"] = strong_etag(path.resolve().relative_to(self.root).as_posix(), stat_result)
+
+        if self._not_modified(request_headers, headers["etag"], stat_result):
+            return Response(status_code=304, headers={
+                key: value for key, value in headers.items() if key in ("etag", "cache-control", "vary")
+            })
+
+        size = stat_result.st_size
+        start, length = 0, size
+        if status_code == 200 and not precompressed and self._range_applies(request_headers, headers["etag"]):
+            try:
+                byte_range = parse_range(request_headers.get("range"), size)
+            except ValueError:
+                return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+            if byte_range:
+                start, end = byte_range
+                length = end - start + 1
+                status_code = 206
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+        headers["content-length"] = str(length)
+        return MediaFileResponse(
+            path, headers, status_code=status_code, start=start, length=length,
+            send_body=scope["method"] != "HEAD"
+        )
+
+    @staticmethod
+    def _not_modified(request_headers: Headers, etag: str, stat_result: os.stat_result) -> bool:
+        if "if-none-match" in request_headers:
+            return _etag_matches(request_headers["if-none-match"], etag)
+        since = parsedate(request_headers.get("if-modified-since", ""))
+        return since is not None and since >= parsedate(formatdate(stat_result.st_mtime, usegmt=True))
+
+    @staticmethod
+    def _range_applies(request_headers: Headers, etag: str) -> bool:
+        """If-Range: only resume a download of the same bytes (strong ETag match)."""
+        if_range = request_headers.get("if-range")
+        return if_range is None or if_range.strip() == etag
+
+
+def precompress_directory(directory, min_size: int = MIN_COMPRESS_SIZE) -> int:
+    """Write .gz (and .br, with the brotli package) next to compressible files lacking fresh ones."""
+    written = 0
+    for path in Path(directory).rglob("*"):
+        if not path.is_file() or guess_type(path.name)[0] not in COMPRESSIBLE_TYPES:
+            continue
+        source_stat = path.stat()
+        if source_stat.st_size < min_size:
+            continue
+        data = None
+        for coding, suffix in ENCODINGS:
+            if coding == "br" and brotli is None:
+                continue
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime_ns >= source_stat.st_mtime_ns:
+                continue
+            data = path.read_bytes() if data is None else data
+            compressed = brotli.compress(data, quality=11) if coding == "br" else gzip.compress(data, 9, mtime=0)
+            if len(compressed) >= len(data):
+                target.unlink(missing_ok=True)  # Not worth it: the original is served
+                continue
+            tmp = target.with_name(f".{target.name}.tmp")
+            tmp.write_bytes(compressed)
+            os.replace(tmp, target)
+            written += 1
+    return written
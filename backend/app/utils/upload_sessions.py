@@ -0,0 +1,253 @@
+"""
+Resumable, chunked uploads for large videos.
+
+A client opens a session with the total size, PUTs the body in pieces at
+increasing offsets (each piece streamed to disk as it arrives) and completes
+the session, optionally passing the SHA-256 it expects. After a dropped
+connection it asks for the session's offset and continues from there.
+
+Sessions live in UPLOAD_PARTIAL_DIR (outside the public /uploads mount) as
+`<id>.json` metadata plus the `<id>.part` bytes; the part file's length is
+the offset, so any API process can take the next piece. Completing hands the
+part file to the media storage. Sessions untouched for
+UPLOAD_SESSION_TTL_HOURS are deleted.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.utils.media_storage import get_media_storage, url_for_key
+from app.utils.upload_stream import (
+    SNIFF_BYTES, VIDEO_TYPES, StoredUpload, key_for, max_size_for, sniff_content_type, too_large,
+    unsupported_type, upload_stem,
+)
+
+PARTIAL_DIR = Path(settings.UPLOAD_PARTIAL_DIR).resolve()
+
+# A chunk PUT holds the session's lock, touching it every LOCK_REFRESH_SECONDS
+# while bytes arrive; a lock untouched for LOCK_STALE_SECONDS is from a dead request
+LOCK_STALE_SECONDS = 600
+LOCK_REFRESH_SECONDS = 30
+HASH_READ_SIZE = 1024 * 1024
+
+
+def _paths(upload_id: str):
+    if not (len(upload_id) == 32 and all(c in "0123456789abcdef" for c in upload_id)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+    return PARTIAL_DIR / f"{upload_id}.json", PARTIAL_DIR / f"{upload_id}.part", PARTIAL_DIR / f"{upload_id}.lock"
+
+
+def _load(doctor_id: int, upload_id: str) -> dict:
+    meta_path, part_path, _ = _paths(upload_id)
+    try:
+        meta = json.loads(meta_path.read_text())
+    except (OSError, ValueError):
+        meta = None
+    if meta is None or meta["doctor_id"] != doctor_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+    meta["offset"] = part_path.stat().st_size if part_path.exists() else 0
+    return meta
+
+
+def _status(meta: dict) -> dict:
+    return {
+        "upload_id": meta["upload_id"],
+        "offset": meta["offset"],
+        "size": meta["size"],
+        "complete": meta["offset"] == meta["size"],
+    }
+
+
+def purge_stale_sessions():
+    """Delete sessions whose files were all last touched more than UPLOAD_SESSION_TTL_HOURS ago."""
+    cutoff = time.time() - settings.UPLOAD_SESSION_TTL_HOURS * 3600
+    if not PARTIAL_DIR.exists():
+        return
+    sessions = {}
+    for path in PARTIAL_DIR.iterdir():
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            continue
+        sessions.setdefault(path.stem, []).append((path, mtime))
+    for files in sessions.values():
+        if max(mtime for _, mtime in files) < cutoff:
+            for path, _ in files:
+                path.unlink(missing_ok=True)
+
+
+def create_session(doctor_id: int, file_type: str, size: int, filename: Optional[str] = None) -> dict:
+    max_size = max_size_for(VIDEO_TYPES)
+    if size <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload size must be positive")
+    if size > max_size:
+        raise too_large(max_size)
+
+    purge_stale_sessions()
+    PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    meta_path, part_path, _ = _paths(upload_id)
+    meta = {
+        "upload_id": upload_id,
+        "doctor_id": doctor_id,
+        "file_type": file_type,
+        "size": size,
+        "filename": filename,
+    }
+    part_path.touch()
+    meta_path.write_text(json.dumps(meta))
+    meta["offset"] = 0
+    return _status(meta)
+
+
+def get_session(doctor_id: int, upload_id: str) -> dict:
+    return _status(_load(doctor_id, upload_id))
+
+
+def _acquire(lock_path: Path) -> str:
+    """Take the session's lock; returns the token written in it, which proves ownership."""
+    token = uuid.uuid4().hex
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            stale = time.time() - lock_path.stat().st_mtime > LOCK_STALE_SECONDS
+        except OSError:
+            stale = True
+        if not stale:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another chunk of this upload is in progress")
+        lock_path.unlink(missing_ok=True)
+        return _acquire(lock_path)
+    with os.fdopen(fd, "w") as lock:
+        lock.write(token)
+    return token
+
+
+def _owns(lock_path: Path, token: str) -> bool:
+    try:
+        return lock_path.read_text() == token
+    except OSError:
+        return False
+
+
+def _refresh(lock_path: Path, token: str):
+    """Keep a held lock fresh; fails if it went stale and another request took it over."""
+    if not _owns(lock_path, token):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another chunk of this upload took over")
+    os.utime(lock_path)
+
+
+def _release(lock_path: Path, token: str):
+    if _owns(lock_path, token):
+        lock_path.unlink(missing_ok=True)
+
+
+async def append_chunk(request: Request, doctor_id: int, upload_id: str, offset: int) -> dict:
+    """Stream the request body onto the session at `offset` (must be the current offset)."""
+    meta = _load(doctor_id, upload_id)
+    _, part_path, lock_path = _paths(upload_id)
+
+    token = _acquire(lock_path)
+    try:
+        current = part_path.stat().st_size
+        if offset != current:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"message": "Offset mismatch", "offset": current}
+            )
+        # Whatever arrives before a dropped connection is kept; the client resumes from there
+        head, checked = b"", current > 0
+        written = current
+        refreshed = time.monotonic()
+        # Unbuffered: the file's size is exactly what this request wrote
+        with open(part_path, "ab", buffering=0) as part:
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                if time.monotonic() - refreshed > LOCK_REFRESH_SECONDS:
+                    _refresh(lock_path, token)
+                    refreshed = time.monotonic()
+                if os.fstat(part.fileno()).st_size != written:
+                    # Someone else appended: stop before the pieces interleave
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="Another chunk of this upload was written concurrently"
+                    )
+                if written + len(chunk) > meta["size"]:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Chunk goes past the declared upload size"
+                    )
+                if not checked:
+                    # Reject a non-video before storing anything (complete_session checks again)
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                    if len(head) >= SNIFF_BYTES or written + len(chunk) == meta["size"]:
+                        if sniff_content_type(head) not in VIDEO_TYPES:
+                            raise unsupported_type(VIDEO_TYPES)
+                        checked = True
+                await run_in_threadpool(part.write, chunk)
+                written += len(chunk)
+        meta["offset"] = written
+    finally:
+        _release(lock_path, token)
+    return _status(meta)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def complete_session(doctor_id: int, upload_id: str, directory: Path,
+                           expected_sha256: Optional[str] = None) -> StoredUpload:
+    """Verify a fully received session and store it under `directory`."""
+    meta = _load(doctor_id, upload_id)
+    meta_path, part_path, lock_path = _paths(upload_id)
+    if meta["offset"] != meta["size"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Upload incomplete", "offset": meta["offset"], "size": meta["size"]}
+        )
+
+    token = _acquire(lock_path)
+    try:
+        with open(part_path, "rb") as part:
+            content_type = sniff_content_type(part.read(SNIFF_BYTES))
+        if content_type not in VIDEO_TYPES:
+            raise unsupported_type(VIDEO_TYPES)
+
+        # Pieces may have been written by different processes: hash the assembled file
+        sha256 = await run_in_threadpool(_sha256, part_path)
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="SHA-256 mismatch: the upload is corrupt, start a new session"
+            )
+
+        key = key_for(directory / f"{upload_stem(doctor_id, meta['file_type'])}{VIDEO_TYPES[content_type]}")
+        # Local disk: a rename (or a copy across filesystems); "minio": an upload
+        await run_in_threadpool(get_media_storage().put_file, key, part_path, content_type)
+        meta_path.unlink(missing_ok=True)
+    finally:
+        _release(lock_path, token)
+    return StoredUpload(
+        key=key, url=url_for_key(key), size=meta["size"], sha256=sha256,
+        content_type=content_type, filename=meta.get("filename")
+    )
+
+
+def abort_session(doctor_id: int, upload_id: str):
+    _load(doctor_id, upload_id)
+    for path in _paths(upload_id):
+        path.unlink(missing_ok=True)
@@ -0,0 +1,296 @@
+"""
+Streaming upload ingestion.
+
+Declaring an `UploadFile` parameter makes Starlette spool the whole request
+body before the handler runs; the handlers then measured it by seeking and
+copied it again with blocking I/O on the event loop. Here the multipart body
+is read from request.stream() chunk by chunk instead:
+
+  - the size limit of the upload kind is enforced as bytes arrive (and from
+    Content-Length before reading anything), so an oversized video is
+    rejected after the first megabytes rather than after being buffered
+  - the real type is sniffed from the first bytes (the client's
+    Content-Type and extension are not trusted)
+  - a SHA-256 is computed on the fly
+  - bytes go to a temp file in the destination directory (writes in the
+    threadpool) that is handed to the media storage at the end: renamed
+    into place on local disk, uploaded for the "minio" backend
+
+Large videos can also be sent in pieces through app.utils.upload_sessions.
+"""
+import hashlib
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+import multipart
+from fastapi import HTTPException, Request, status
+from multipart.multipart import parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.utils.media_storage import get_media_storage, url_for_key
+
+UPLOAD_DIR = Path(settings.UPLOAD_DIR).resolve()
+
+IMAGE_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+VIDEO_TYPES = {"video/mp4": ".mp4", "video/webm": ".webm", "video/quicktime": ".mov"}
+
+# ISO-BMFF major brands ("ftyp" box) of MP4 video; HEIC/AVIF still images use
+# the same container with their own brands (heic, mif1, avif...) and are refused
+MP4_VIDEO_BRANDS = {
+    b"isom", b"iso2", b"iso4", b"iso5", b"iso6", b"mp41", b"mp42", b"avc1",
+    b"M4V ", b"M4VH", b"M4VP", b"MSNV", b"dash", b"3gp4", b"3gp5", b"3gp6", b"3g2a",
+}
+
+# Bytes needed to recognise every type above
+SNIFF_BYTES = 16
+# Non-file form fields are small; anything bigger is not one of our forms
+MAX_FIELD_SIZE = 64 * 1024
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Content type from magic bytes, for the types uploads accept."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand == b"qt  ":
+            return "video/quicktime"
+        return "video/mp4" if brand in MP4_VIDEO_BRANDS else None
+    return None
+
+
+def max_size_for(allowed_types: Dict[str, str]) -> int:
+    """Per-kind limit: MAX_VIDEO_UPLOAD_SIZE for videos, MAX_UPLOAD_SIZE otherwise."""
+    return settings.MAX_VIDEO_UPLOAD_SIZE if allowed_types == VIDEO_TYPES else settings.MAX_UPLOAD_SIZE
+
+
+def too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large. Maximum size is {max_size / 1024 / 1024:g}MB"
+    )
+
+
+def unsupported_type(allowed_types: Dict[str, str]) -> HTTPException:
+    names = ", ".join(ext.lstrip(".").upper() for ext in allowed_types.values())
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Invalid file type. Only {names} files are allowed."
+    )
+
+
+def key_for(path: Path) -> str:
+    """Storage key of a path under UPLOAD_DIR."""
+    return path.resolve().relative_to(UPLOAD_DIR).as_posix()
+
+
+def url_for(path: Path) -> str:
+    return url_for_key(key_for(path))
+
+
+@dataclass
+class StoredUpload:
+    key: str  # In the media storage (app.utils.media_storage)
+    url: str
+    size: int
+    sha256: Optional[str]  # None for direct uploads that are not hashed (videos)
+    content_type: str
+    filename: Optional[str] = None  # As sent by the client
+
+
+class FileSink:
+    """Receives one file's bytes: limit, sniffing and hashing inline, disk writes in the threadpool."""
+
+    def __init__(self, directory: Path, allowed_types: Dict[str, str], max_size: int):
+        self.directory = directory
+        self.allowed_types = allowed_types
+        self.max_size = max_size
+        self.size = 0
+        self.content_type: Optional[str] = None
+        self._head = b""
+        self._hash = hashlib.sha256()
+        directory.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = directory / f".{uuid.uuid4().hex}.part"
+        self._file = open(self.tmp_path, "wb")
+
+    async def write(self, data: bytes):
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise too_large(self.max_size)
+        if self.content_type is None:
+            self._head += data[:SNIFF_BYTES]
+            if len(self._head) >= SNIFF_BYTES:
+                self._check_type()
+        self._hash.update(data)
+        await run_in_threadpool(self._file.write, data)
+
+    def _check_type(self):
+        content_type = sniff_content_type(self._head)
+        if content_type not in self.allowed_types:
+            raise unsupported_type(self.allowed_types)
+        self.content_type = content_type
+
+    async def finish(self):
+        """Close the temp file once the whole file arrived."""
+        if self.content_type is None:
+            self._check_type()  # Files shorter than SNIFF_BYTES
+        await run_in_threadpool(self._file.close)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def extension(self) -> str:
+        return self.allowed_types[self.content_type]
+
+    def stored(self, key: str, filename: Optional[str] = None) -> StoredUpload:
+        return StoredUpload(
+            key=key, url=url_for_key(key), size=self.size, sha256=self.sha256,
+            content_type=self.content_type, filename=filename
+        )
+
+    async def commit(self, stem: str, filename: Optional[str] = None) -> StoredUpload:
+        """Store as `<directory>/<stem><extension of the sniffed type>`."""
+        await self.finish()
+        key = key_for(self.directory / f"{stem}{self.extension}")
+        await run_in_threadpool(get_media_storage().put_file, key, self.tmp_path, self.content_type)
+        return self.stored(key, filename)
+
+    def discard(self):
+        self._file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+def upload_stem(doctor_id: int, file_type: str) -> str:
+    # Random suffix: two uploads in the same second must not overwrite each other
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{doctor_id}_{file_type}_{timestamp}_{uuid.uuid4().hex[:8]}"
+
+
+class _MultipartReceiver:
+    """python-multipart callbacks that only collect events; receive_upload() acts on them."""
+
+    def __init__(self, field: str):
+        self.field = field
+        self.events = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._field_size = 0
+        self.is_target = False
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._field_size = 0
+        self.is_target = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        self.is_target = name == self.field and b"filename" in options
+        if self.is_target:
+            self.events.append(("begin", options[b"filename"].decode("utf-8", "replace")))
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.is_target:
+            self.events.append(("data", data[start:end]))
+            return
+        # Other form fields are ignored, but not unbounded
+        self._field_size += end - start
+        if self._field_size > MAX_FIELD_SIZE:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Form field too large")
+
+    def on_part_end(self):
+        if self.is_target:
+            self.events.append(("end", None))
+            self.is_target = False
+
+    def callbacks(self) -> dict:
+        return {
+            name: getattr(self, name) for name in (
+                "on_part_begin", "on_part_data", "on_part_end", "on_header_field",
+                "on_header_value", "on_header_end", "on_headers_finished",
+            )
+        }
+
+
+async def receive_upload(
+    request: Request,
+    directory: Path,
+    doctor_id: int,
+    file_type: str,
+    allowed_types: Dict[str, str] = IMAGE_TYPES,
+    field: str = "file",
+    commit: Optional[Callable[[FileSink, Optional[str]], Awaitable[StoredUpload]]] = None,
+) -> StoredUpload:
+    """
+    Stream the multipart field `field` of the request into `directory` as
+    `{doctor_id}_{file_type}_{timestamp}_{random}.<ext>`. Raises 413/400 as soon as
+    the limit or the type check fails; nothing is left on disk then.
+
+    `commit(sink, filename)` replaces the final rename, for stores that name
+    files by their content (app.services.media_store).
+    """
+    max_size = max_size_for(allowed_types)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + MAX_FIELD_SIZE:
+        raise too_large(max_size)
+
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a multipart/form-data upload")
+
+    receiver = _MultipartReceiver(field)
+    parser = multipart.MultipartParser(boundary, receiver.callbacks())
+    sink: Optional[FileSink] = None
+    stored: Optional[StoredUpload] = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, value in receiver.events:
+                if kind == "begin" and sink is None and stored is None:
+                    sink = FileSink(directory, allowed_types, max_size)
+                    filename = value
+                elif kind == "data" and sink is not None:
+                    await sink.write(value)
+                elif kind == "end" and sink is not None:
+                    if commit is not None:
+                        stored = await commit(sink, filename)
+                    else:
+                        stored = await sink.commit(upload_stem(doctor_id, file_type), filename)
+                    sink = None
+            receiver.events.clear()
+        parser.finalize()
+    finally:
+        if sink is not None:
+            sink.discard()
+
+    if stored is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'Missing file field "{field}"')
+    return stored
@@ -5,6 +5,8 @@ Temporary script to run the server
 import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
+# uvicorn.run() in-process: the command line alone reads as a script (see app.db.pool)
+os.environ.setdefault("DB_POOL_ROLE", "api")
 
 from app.main import app
 import uvicorn
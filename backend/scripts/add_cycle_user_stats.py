@@ -0,0 +1,26 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The table and index come from the 20261018_cycle_stats Alembic revision (alembic upgrade head)
+from app.db.base import SessionLocal
+from app.db.models.cycle_user import CycleUser
+from app.cycle_predictor.stats import rebuild_cycle_stats
+
+def backfill():
+    """Optional: build every user's stats now instead of on their first dashboard load."""
+    db = SessionLocal()
+    try:
+        user_ids = [uid for (uid,) in db.query(CycleUser.id).all()]
+        for i, uid in enumerate(user_ids, 1):
+            rebuild_cycle_stats(db, uid)
+            if i % 500 == 0:
+                db.commit()
+                print(f"{i}/{len(user_ids)} users")
+        db.commit()
+        print(f"Backfilled {len(user_ids)} users")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill()
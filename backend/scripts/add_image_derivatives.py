@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The table comes from the 20261018_img_derivs Alembic revision (alembic upgrade head)
+from app.db.base import SessionLocal
+from app.db.models.doctor import Doctor
+from app.db.models.gallery import GalleryImage
+from app.db.models.image_derivative import ImageDerivative
+from app.db.models.location import Location
+from app.db.models.recommendation import Recommendation
+from app.db.models.service import Service
+from app.db.models.testimonial import Testimonial
+from app.blog.models import BlogPost
+from app.services.image_derivatives import DONE, build_derivatives, crop_key, source_key
+from app.utils.media_storage import get_media_storage
+
+def existing_images(db):
+    """(doctor_id, url, crop) of every stored public image."""
+    for image in db.query(GalleryImage).all():
+        yield image.doctor_id, image.image_url, image.crop
+    for doctor in db.query(Doctor).all():
+        yield doctor.id, doctor.logo_url, None
+        yield doctor.id, doctor.photo_url, None
+    for post in db.query(BlogPost).all():
+        yield post.doctor_id, post.cover_image, None
+    for model, column, owner in (
+        (Service, "image_url", "doctor_id"),
+        (Testimonial, "photo_url", "doctor_id"),
+        (Location, "image_url", "doctor_id"),
+        (Recommendation, "image_url", "tenant_id"),
+    ):
+        for row in db.query(model).all():
+            yield getattr(row, owner), getattr(row, column), None
+
+def backfill(force: bool = False):
+    """Build variants for images uploaded before the pipeline existed (inline, not queued)."""
+    db = SessionLocal()
+    storage = get_media_storage()
+    try:
+        done = {
+            (url, key) for url, key in db.query(ImageDerivative.source_url, ImageDerivative.crop_key)
+            .filter(ImageDerivative.status == DONE).all()
+        }
+        jobs = {}
+        for doctor_id, url, crop in existing_images(db):
+            key = source_key(url)
+            if key is None or not storage.exists(key):
+                continue
+            if force or (url, crop_key(crop)) not in done:
+                jobs[(url, crop_key(crop))] = (doctor_id, url, crop)
+    finally:
+        db.close()
+
+    failed = 0
+    for i, (doctor_id, url, crop) in enumerate(jobs.values(), 1):
+        if build_derivatives(doctor_id, url, crop, force=force) != DONE:
+            failed += 1
+        if i % 50 == 0:
+            print(f"{i}/{len(jobs)} images")
+    print(f"Built variants for {len(jobs) - failed} images ({failed} failed)")
+
+if __name__ == "__main__":
+    backfill(force="--force" in sys.argv)
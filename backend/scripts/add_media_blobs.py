@@ -0,0 +1,77 @@
+import sys
+import os
+import hashlib
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The table comes from the 20261018_media_blobs Alembic revision (alembic upgrade head)
+from app.db.base import SessionLocal
+from app.services.image_derivatives import source_key
+from app.services.media_store import (
+    JSON_REFERENCES, MEDIA_REFERENCES, blob_key, collect_garbage, is_media_url, reference_models,
+    register_blob,
+)
+from app.utils.media_storage import get_media_storage, url_for_key
+from app.utils.upload_stream import IMAGE_TYPES, SNIFF_BYTES, sniff_content_type
+
+def import_file(url, imported):
+    """Copy a legacy upload into the store; returns its store URL (None if not a stored image)."""
+    if url in imported:
+        return imported[url]
+    storage = get_media_storage()
+    key = source_key(url)
+    store_url = None
+    if key is not None and storage.exists(key):
+        content_type = sniff_content_type(storage.read_head(key, SNIFF_BYTES))
+        if content_type in IMAGE_TYPES:
+            digest = hashlib.sha256()
+            for block in storage.iter_chunks(key):
+                digest.update(block)
+            target = blob_key(digest.hexdigest(), IMAGE_TYPES[content_type])
+            store_url = url_for_key(target)
+            register_blob(digest.hexdigest(), store_url, content_type, storage.size(key))
+            if not storage.exists(target):
+                storage.copy(key, target)
+    imported[url] = store_url
+    return store_url
+
+def backfill():
+    """Point existing records at store copies of their files (counted by the flush hook)."""
+    db = SessionLocal()
+    imported = {}
+    moved = 0
+    try:
+        models = reference_models()
+        for name, attrs in MEDIA_REFERENCES.items():
+            for row in db.query(models[name]).all():
+                for attr in attrs:
+                    value = getattr(row, attr)
+                    if attr in JSON_REFERENCES:
+                        if not isinstance(value, dict):
+                            continue
+                        value = dict(value)
+                        for key in JSON_REFERENCES[attr]:
+                            if value.get(key) and not is_media_url(value[key]):
+                                store_url = import_file(value[key], imported)
+                                if store_url:
+                                    value[key] = store_url
+                                    moved += 1
+                        setattr(row, attr, value)
+                    elif value and not is_media_url(value):
+                        store_url = import_file(value, imported)
+                        if store_url:
+                            setattr(row, attr, store_url)
+                            moved += 1
+            db.commit()
+    finally:
+        db.close()
+    stored = len({url for url in imported.values() if url})
+    print(f"Moved {moved} references to {stored} store blobs ({len(imported)} legacy files)")
+    print("Legacy files were left in place; run scripts/add_image_derivatives.py for variants")
+
+if __name__ == "__main__":
+    if "--backfill" not in sys.argv and "--gc" not in sys.argv:
+        print("Usage: add_media_blobs.py [--backfill] [--gc]")
+    if "--backfill" in sys.argv:
+        backfill()
+    if "--gc" in sys.argv:
+        print(collect_garbage())
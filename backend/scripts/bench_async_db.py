@@ -0,0 +1,191 @@
+"""
+Load test: sync Session vs AsyncSession inside `async def` endpoints.
+
+Starts one uvicorn worker serving two copies of the public gallery handler:
+  1. /sync/{slug}:  the old pattern, `async def` + the sync Session
+     (every query blocks the event loop)
+  2. /async/{slug}: get_async_db (asyncpg / aiosqlite)
+Every --slow-every-th request also runs one slow query (--slow-ms), like a
+cold cache or a lock wait. Reports requests/sec and latency percentiles of
+the fast requests, which is what a slow query stalls when the loop blocks.
+
+Uses DATABASE_URL (seeds a bench doctor with --images gallery images). Run it
+against Postgres: on SQLite the slow query burns the worker's own CPU, so
+there is no waiting for async to overlap.
+
+Usage (from backend/):
+    python scripts/bench_async_db.py [--concurrency 32] [--duration 10] [--slow-every 20] [--slow-ms 200]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import asc, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.base import Base, SessionLocal, engine, get_async_db
+from app.db.models.doctor import Doctor
+from app.db.models.gallery import GalleryImage
+
+BENCH_SLUG = "bench-async-db"
+PORT = 8765
+
+
+def slow_query(ms: int):
+    """A query that takes about `ms` on the server side."""
+    if engine.dialect.name == "postgresql":
+        return text("SELECT pg_sleep(:s)").bindparams(s=ms / 1000)
+    # SQLite has no sleep: count through a recursive CTE sized at start-up
+    rows = int(os.environ.get("BENCH_SQLITE_ROWS_PER_MS", "2000")) * ms
+    return text(
+        "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :n) SELECT count(*) FROM c"
+    ).bindparams(n=rows)
+
+
+def gallery_query(doctor_id: int):
+    return select(GalleryImage).where(
+        GalleryImage.doctor_id == doctor_id, GalleryImage.is_active == True
+    ).order_by(asc(GalleryImage.display_order), asc(GalleryImage.created_at))
+
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/sync/{slug}")
+async def sync_gallery(slug: str, slow_ms: int = 0):
+    db = SessionLocal()
+    try:
+        if slow_ms:
+            db.execute(slow_query(slow_ms))
+        doctor_id = db.execute(select(Doctor.id).where(Doctor.slug_url == slug)).scalar_one_or_none()
+        if doctor_id is None:
+            raise HTTPException(status_code=404)
+        return [image.image_url for image in db.execute(gallery_query(doctor_id)).scalars()]
+    finally:
+        db.close()
+
+
+@bench_app.get("/async/{slug}")
+async def async_gallery(slug: str, slow_ms: int = 0, db: AsyncSession = Depends(get_async_db)):
+    if slow_ms:
+        await db.execute(slow_query(slow_ms))
+    doctor_id = (await db.execute(select(Doctor.id).where(Doctor.slug_url == slug))).scalar_one_or_none()
+    if doctor_id is None:
+        raise HTTPException(status_code=404)
+    return [image.image_url for image in (await db.execute(gallery_query(doctor_id))).scalars()]
+
+
+def seed(images: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        doctor = db.query(Doctor).filter(Doctor.slug_url == BENCH_SLUG).first()
+        if doctor is None:
+            doctor = Doctor(
+                email=f"{BENCH_SLUG}@example.com", nombre_completo="Bench", slug_url=BENCH_SLUG,
+                password_hash="x", is_active=True
+            )
+            db.add(doctor)
+            db.flush()
+            for i in range(images):
+                db.add(GalleryImage(doctor_id=doctor.id, image_url=f"/uploads/gallery/{i}.jpg", display_order=i, is_active=True))
+            db.commit()
+    finally:
+        db.close()
+
+
+def calibrate_sqlite() -> int:
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        conn.execute(slow_query(10).bindparams(n=200_000)).scalar()
+        return max(1, int(200_000 / ((time.perf_counter() - start) * 1000)))
+
+
+async def load(path: str, concurrency: int, duration: float, slow_every: int, slow_ms: int):
+    fast, slow, errors = [], [], 0
+    counter = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(http: httpx.AsyncClient):
+        nonlocal counter, errors
+        while time.perf_counter() < deadline:
+            counter += 1
+            is_slow = slow_every and counter % slow_every == 0
+            start = time.perf_counter()
+            response = await http.get(path, params={"slow_ms": slow_ms if is_slow else 0})
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                errors += 1
+            (slow if is_slow else fast).append(elapsed)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=60) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return fast, slow, errors, elapsed
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0
+
+
+def report(label: str, fast, slow, errors, elapsed):
+    total = len(fast) + len(slow)
+    print(
+        f"{label:<8} {total / elapsed:8.1f} req/s   fast p50 {statistics.median(fast) * 1000:6.1f} ms  "
+        f"p95 {percentile(fast, 0.95):7.1f} ms  p99 {percentile(fast, 0.99):7.1f} ms   "
+        f"slow p50 {statistics.median(slow) * 1000 if slow else 0:6.0f} ms   errors {errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per variant")
+    parser.add_argument("--slow-every", type=int, default=20, help="Every Nth request runs a slow query (0 = never)")
+    parser.add_argument("--slow-ms", type=int, default=200)
+    parser.add_argument("--images", type=int, default=24)
+    args = parser.parse_args()
+
+    seed(args.images)
+    env = dict(os.environ)
+    if engine.dialect.name == "sqlite":
+        env["BENCH_SQLITE_ROWS_PER_MS"] = str(calibrate_sqlite())
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench_async_db:bench_app", "--app-dir", current_dir,
+         "--port", str(PORT), "--workers", "1", "--log-level", "warning"],
+        cwd=os.path.dirname(current_dir), env=env
+    )
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{PORT}/async/{BENCH_SLUG}")
+                break
+            except httpx.TransportError:
+                time.sleep(0.2)
+        slow = f"1 in {args.slow_every} requests with a {args.slow_ms} ms query" if args.slow_every else "no slow queries"
+        print(f"{engine.dialect.name}, 1 uvicorn worker, {args.concurrency} clients, {slow}")
+        for label in ("sync", "async"):
+            asyncio.run(load(f"/{label}/{BENCH_SLUG}", args.concurrency, 1, 0, 0))  # warm up
+            report(label, *asyncio.run(load(
+                f"/{label}/{BENCH_SLUG}", args.concurrency, args.duration, args.slow_every, args.slow_ms
+            )))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: inline PDF rendering vs the off-request process pool.
+
+Simulates --clients concurrent users each downloading --requests medical
+histories of --consultations consultations (no DB, no cache) and reports
+renders/sec and latency percentiles for
+  1. inline: ReportLab runs in the request thread, as the download
+     endpoints do (threads share the GIL, so renders serialize)
+  2. pool: the request thread only waits on a render job in a
+     --workers process pool (PDF_RENDER_BACKEND="process")
+
+Usage (from backend/):
+    python scripts/bench_pdf_render.py [--clients 8] [--requests 4] [--consultations 40] [--workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from app.services.consultation_pdf import render_report
+from app.utils.pdf_cache import HISTORY
+
+PARAGRAPH = (
+    "Paciente refiere evolución satisfactoria, sin sangrado anormal ni dolor pélvico. "
+    "Se revisan resultados de laboratorio y se ajusta el tratamiento indicado."
+)
+
+
+def build_history(consultations: int) -> dict:
+    start = datetime(2020, 1, 1)
+    return {
+        "full_name": "paciente de prueba",
+        "ci": "12345678",
+        "age": "34",
+        "phone": "04120000000",
+        "reason_for_visit": "Control ginecológico",
+        "personal_history": "Hipotiroidismo\nAsma",
+        "summary_gyn_obstetric": PARAGRAPH,
+        "summary_functional_exam": PARAGRAPH,
+        "summary_habits": PARAGRAPH,
+        "history_number": "H-0001",
+        "all_consultations": [
+            {
+                "created_at": start + timedelta(days=45 * i),
+                "physical_exam": PARAGRAPH * 2,
+                "ultrasound": PARAGRAPH,
+                "diagnosis": "Quiste ovárico simple\nMioma uterino",
+                "plan": "Control en 3 meses\nEcografía transvaginal\nLaboratorio",
+                "observations": "Sin observaciones adicionales",
+            }
+            for i in range(consultations)
+        ],
+    }
+
+
+def timed_inline(data: dict) -> float:
+    start = time.perf_counter()
+    render_report(HISTORY, data, None)
+    return time.perf_counter() - start
+
+
+def timed_pool(pool: ProcessPoolExecutor, data: dict) -> float:
+    start = time.perf_counter()
+    pool.submit(render_report, HISTORY, data, None).result()
+    return time.perf_counter() - start
+
+
+def run(label: str, request, clients: int, requests: int):
+    with ThreadPoolExecutor(max_workers=clients) as threads:
+        start = time.perf_counter()
+        latencies = list(threads.map(lambda _: request(), range(clients * requests)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{label:<20} {len(latencies):>5} renders  {elapsed:7.2f}s  "
+        f"{len(latencies) / elapsed:7.2f} renders/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.0f} ms  p95 {p95 * 1000:7.0f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=4, help="Renders per client")
+    parser.add_argument("--consultations", type=int, default=40, help="Consultations in each history")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    data = build_history(args.consultations)
+    size = len(render_report(HISTORY, data, None))
+    print(f"History PDF: {args.consultations} consultations, {size / 1024:.0f} KiB, {os.cpu_count()} CPUs")
+
+    run("inline", lambda: timed_inline(data), args.clients, args.requests)
+
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        # Warm the workers up so process start-up is not measured
+        list(pool.map(render_report, [HISTORY] * args.workers, [build_history(1)] * args.workers, [None] * args.workers))
+        run(f"pool ({args.workers} procs)", lambda: timed_pool(pool, data), args.clients, args.requests)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
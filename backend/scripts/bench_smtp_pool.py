@@ -0,0 +1,120 @@
+"""
+Benchmark: one SMTP connection per email vs the pooled SMTP sessions.
+
+Starts a local stand-in SMTP server (aiosmtpd) and measures messages/sec for
+  1. the old pattern (connect + send + quit per message)
+  2. SMTPConnectionPool.send (session reused between calls)
+  3. SMTPConnectionPool.send_many (whole batch through one session)
+
+Usage (from backend/):
+    pip install aiosmtpd
+    python scripts/bench_smtp_pool.py [--messages 500] [--latency-ms 5]
+
+--latency-ms adds an artificial delay to each new connection to mimic the
+TCP + STARTTLS + AUTH round trips of a real provider.
+"""
+import argparse
+import os
+import smtplib
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    print("aiosmtpd is required for this benchmark: pip install aiosmtpd")
+    sys.exit(1)
+
+from app.core.smtp_pool import SMTPConnectionPool
+from app.tasks.email_tasks import _build_email_message
+
+HOST = "127.0.0.1"
+PORT = 8025
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+class SlowConnectSMTP(smtplib.SMTP):
+    """smtplib.SMTP that pays a fixed handshake cost on connect."""
+    latency = 0.0
+
+    def connect(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().connect(*args, **kwargs)
+
+
+def build_messages(count: int) -> list:
+    return [
+        _build_email_message(f"user{i}@example.com", f"Benchmark {i}", "<p>Hola</p>")
+        for i in range(count)
+    ]
+
+
+def bench_per_message(messages: list) -> float:
+    start = time.perf_counter()
+    for msg in messages:
+        server = SlowConnectSMTP(HOST, PORT)
+        server.send_message(msg)
+        server.quit()
+    return time.perf_counter() - start
+
+
+def bench_pool_send(messages: list) -> float:
+    pool = SMTPConnectionPool(HOST, PORT, use_tls=False, max_size=1)
+    start = time.perf_counter()
+    for msg in messages:
+        pool.send(msg)
+    elapsed = time.perf_counter() - start
+    pool.close_all()
+    return elapsed
+
+
+def bench_pool_send_many(messages: list) -> float:
+    pool = SMTPConnectionPool(HOST, PORT, use_tls=False, max_size=1)
+    start = time.perf_counter()
+    pool.send_many(messages)
+    elapsed = time.perf_counter() - start
+    pool.close_all()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    SlowConnectSMTP.latency = args.latency_ms / 1000
+    # The pool connects through smtplib.SMTP; give it the same handshake cost
+    smtplib.SMTP = SlowConnectSMTP
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname=HOST, port=PORT)
+    controller.start()
+    try:
+        messages = build_messages(args.messages)
+        for label, bench in [
+            ("connection per message", bench_per_message),
+            ("pool.send", bench_pool_send),
+            ("pool.send_many", bench_pool_send_many),
+        ]:
+            before = handler.received
+            elapsed = bench(messages)
+            delivered = handler.received - before
+            print(f"{label:<24} {delivered:>6} msgs  {elapsed:7.2f}s  {delivered / elapsed:9.1f} msg/s")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
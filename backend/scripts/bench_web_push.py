@@ -0,0 +1,145 @@
+"""
+Benchmark: serial pywebpush.webpush calls vs WebPushEngine.send_many.
+
+Starts a local stand-in push service (HTTP, answers 201, or 410 for every
+--expired-every'th endpoint) and measures pushes/sec for
+  1. the old pattern (webpush() per subscription: VAPID re-signed and a new
+     connection for every send)
+  2. WebPushEngine.send_many (cached VAPID header, keep-alive session,
+     concurrent encryption + POST)
+
+Usage (from backend/):
+    python scripts/bench_web_push.py [--subscriptions 500] [--latency-ms 20] [--workers 16]
+
+--latency-ms delays every response to mimic the round trip to FCM/Mozilla.
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from py_vapid import Vapid
+from pywebpush import webpush, WebPushException
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from app.core.push import DELIVERED, EXPIRED, WebPushEngine
+
+HOST = "127.0.0.1"
+PORT = 8089
+CLAIM_EMAIL = "bench@gynsys.local"
+
+
+class PushServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    latency = 0.0
+    expired_every = 0
+    received = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        index = int(self.path.rsplit("/", 1)[-1])
+        status = 410 if self.expired_every and index % self.expired_every == 0 else 201
+        with self.lock:
+            PushServiceHandler.received += 1
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def build_subscriptions(count: int) -> list:
+    subscriptions = []
+    for i in range(count):
+        key = ec.generate_private_key(ec.SECP256R1())
+        p256dh = key.public_key().public_bytes(
+            serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+        )
+        subscriptions.append({
+            "endpoint": f"http://{HOST}:{PORT}/push/{i}",
+            "keys": {"p256dh": b64(p256dh), "auth": b64(os.urandom(16))},
+        })
+    return subscriptions
+
+
+def bench_serial(private_key: str, subscriptions: list, payload: str) -> tuple:
+    delivered = expired = 0
+    start = time.perf_counter()
+    for sub in subscriptions:
+        try:
+            webpush(
+                subscription_info=sub,
+                data=payload,
+                vapid_private_key=private_key,
+                vapid_claims={"sub": f"mailto:{CLAIM_EMAIL}"},
+                timeout=10,
+            )
+            delivered += 1
+        except WebPushException as e:
+            if e.response is not None and e.response.status_code in [404, 410]:
+                expired += 1
+    return time.perf_counter() - start, delivered, expired
+
+
+def bench_engine(private_key: str, subscriptions: list, payload: str, workers: int) -> tuple:
+    engine = WebPushEngine(private_key, CLAIM_EMAIL, max_workers=workers)
+    start = time.perf_counter()
+    results = engine.send_many([(sub, payload) for sub in subscriptions])
+    elapsed = time.perf_counter() - start
+    engine.close()
+    delivered = sum(1 for status, _ in results if status == DELIVERED)
+    expired = sum(1 for status, _ in results if status == EXPIRED)
+    return elapsed, delivered, expired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscriptions", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--expired-every", type=int, default=10)
+    args = parser.parse_args()
+
+    PushServiceHandler.latency = args.latency_ms / 1000
+    PushServiceHandler.expired_every = args.expired_every
+    server = ThreadingHTTPServer((HOST, PORT), PushServiceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    vapid = Vapid()
+    vapid.generate_keys()
+    private_key = b64(vapid.private_key.private_numbers().private_value.to_bytes(32, "big"))
+
+    subscriptions = build_subscriptions(args.subscriptions)
+    payload = json.dumps({"title": "Benchmark", "body": "Hola", "url": "/cycle/dashboard"})
+    try:
+        for label, bench in [
+            ("serial webpush()", lambda: bench_serial(private_key, subscriptions, payload)),
+            (f"engine ({args.workers} workers)", lambda: bench_engine(private_key, subscriptions, payload, args.workers)),
+        ]:
+            elapsed, delivered, expired = bench()
+            total = delivered + expired
+            print(
+                f"{label:<22} {delivered:>6} ok {expired:>5} expired  "
+                f"{elapsed:7.2f}s  {total / elapsed:9.1f} push/s"
+            )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import sys
+import os
+import argparse
+import mimetypes
+import shutil
+import tempfile
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.media_storage import create_media_storage
+
+# Not uploads: chat media shares the bucket, incoming/ holds unfinished direct uploads
+SKIP_PREFIXES = ("chat/", "incoming/")
+
+def migrate(source_backend, target_backend, delete_source=False, dry_run=False):
+    """Copy every upload to the other backend (records keep their /uploads/<key> URLs)."""
+    source = create_media_storage(source_backend)
+    target = create_media_storage(target_backend)
+    copied = skipped = failed = 0
+    with tempfile.TemporaryDirectory(prefix="media-migrate-") as tmp_dir:
+        for key in source.keys():
+            if key.startswith(SKIP_PREFIXES):
+                continue
+            size = source.size(key)
+            if target.size(key) == size:
+                skipped += 1
+            elif dry_run:
+                print(f"would copy {key} ({size} bytes)")
+                copied += 1
+                continue
+            else:
+                try:
+                    with source.local_file(key) as path:
+                        # put_file() consumes its source: hand it a copy
+                        tmp = Path(tmp_dir) / "object"
+                        shutil.copyfile(path, tmp)
+                    target.put_file(key, tmp, mimetypes.guess_type(key)[0])
+                except Exception as e:
+                    print(f"FAILED {key}: {e}")
+                    failed += 1
+                    continue
+                if target.size(key) != size:
+                    print(f"FAILED {key}: size mismatch after copy")
+                    failed += 1
+                    continue
+                copied += 1
+            if delete_source and not dry_run:
+                source.delete(key)
+            if (copied + skipped) % 500 == 0:
+                print(f"{copied} copied, {skipped} already there")
+    print(f"Done: {copied} copied, {skipped} already there, {failed} failed")
+    if not dry_run and not failed:
+        print(f"Set MEDIA_STORAGE_BACKEND={target_backend} and restart the API and workers")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy uploads between media storage backends")
+    parser.add_argument("--to", choices=["local", "minio"], required=True)
+    parser.add_argument("--delete-source", action="store_true", help="Delete each object once it is verified")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    migrate("minio" if args.to == "local" else "local", args.to, args.delete_source, args.dry_run)
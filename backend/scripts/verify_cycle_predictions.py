@@ -0,0 +1,74 @@
+"""
+Check calculate_predictions_batch element-wise against the scalar
+calculate_predictions and time both.
+
+Random cohorts cover the CycleUser constraints (cycle 21-45, period 1-15),
+last periods up to two years back and a few in the future, and several
+reference days.
+
+Usage (from backend/):
+    python scripts/verify_cycle_predictions.py [--users 20000] [--days 10]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from app.cycle_predictor.logic import (
+    calculate_predictions,
+    calculate_predictions_batch,
+    iter_batch_predictions,
+)
+
+
+def random_cohort(count: int, today: date, rng: random.Random) -> tuple:
+    starts = [today - timedelta(days=rng.randint(-10, 730)) for _ in range(count)]
+    cycles = [rng.randint(21, 45) for _ in range(count)]
+    periods = [rng.randint(1, 15) for _ in range(count)]
+    return starts, cycles, periods
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mismatches = 0
+    scalar_time = batch_time = 0.0
+
+    for offset in range(args.days):
+        today = date.today() + timedelta(days=rng.randint(-400, 400) if offset else 0)
+        starts, cycles, periods = random_cohort(args.users, today, rng)
+
+        t = time.perf_counter()
+        expected = [calculate_predictions(s, c, p, today=today) for s, c, p in zip(starts, cycles, periods)]
+        scalar_time += time.perf_counter() - t
+
+        t = time.perf_counter()
+        batch = calculate_predictions_batch(starts, cycles, periods, today=today)
+        batch_time += time.perf_counter() - t
+
+        for i, (want, got) in enumerate(zip(expected, iter_batch_predictions(batch))):
+            if want != got:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"MISMATCH today={today} start={starts[i]} cycle={cycles[i]} period={periods[i]}")
+                    print(f"  scalar: {want}")
+                    print(f"  batch:  {got}")
+
+    total = args.users * args.days
+    print(f"{total} predictions compared, {mismatches} mismatches")
+    print(f"scalar: {scalar_time * 1000:8.1f} ms   batch: {batch_time * 1000:8.1f} ms")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
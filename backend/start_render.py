@@ -1,5 +1,10 @@
 import os
 import subprocess
+
+# Serves the API in this process (uvicorn.run): size the DB pool for it, the
+# command line alone reads as a script. Must be set before the app is imported.
+os.environ.setdefault("DB_POOL_ROLE", "api")
+
 import uvicorn
 from alembic.config import Config
 from alembic import command